@@ -2,40 +2,40 @@ import sqlite3
 import json
 import os
 from dotenv import load_dotenv
-from llama_index.llms.gemini import Gemini
+import db
+import llm_provider
+import llm_scheduler
+import llm_cache
 
 # --- Configuration ---
 DB_NAME = "scout_activities.db"
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+PARSING_MODEL_NAME = "models/gemini-1.5-flash-latest"
+PARSE_PROMPT_VERSION = "peulatodb-v1"  # Bump when the prompt below changes, so cached parses aren't reused
 
 
 # --- Database Functions ---
 def setup_database():
     """Creates the database and scout_activities table if they don't exist."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scout_activities (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic TEXT NOT NULL,
-            description TEXT,
-            games_and_methods TEXT NOT NULL,
-            age_group TEXT,
-            duration TEXT,
-            materials TEXT,
-            tags TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with db.transaction(DB_NAME) as cursor:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scout_activities (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                description TEXT,
+                games_and_methods TEXT NOT NULL,
+                age_group TEXT,
+                duration TEXT,
+                materials TEXT,
+                tags TEXT
+            )
+        ''')
     print(f"Database '{DB_NAME}' checked/created successfully.")
 
 
 def add_activity_to_db(activity_data: dict):
     """Adds an activity to the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
         games_and_methods_text = activity_data.get("games_and_methods", "")
 
@@ -51,16 +51,14 @@ def add_activity_to_db(activity_data: dict):
 
         print(f"  DEBUG (DB Insert): games_and_methods: ---BEGIN---\n{db_values['games_and_methods']}\n---END---")
 
-        cursor.execute('''
-            INSERT INTO scout_activities (topic, description, games_and_methods, age_group, duration, materials, tags)
-            VALUES (:topic, :description, :games_and_methods, :age_group, :duration, :materials, :tags)
-        ''', db_values)
-        conn.commit()
+        with db.transaction(DB_NAME) as cursor:
+            cursor.execute('''
+                INSERT INTO scout_activities (topic, description, games_and_methods, age_group, duration, materials, tags)
+                VALUES (:topic, :description, :games_and_methods, :age_group, :duration, :materials, :tags)
+            ''', db_values)
         print(f"Activity (Topic: '{db_values['topic']}') added to the database.")
     except sqlite3.Error as e:
         print(f"Database error: {e}")
-    finally:
-        conn.close()
 
 
 # --- AI Parsing Function ---
@@ -69,14 +67,19 @@ def parse_activity_with_gemini(full_activity_input: str) -> dict | None:
     Sends the user's full activity plan to Gemini for parsing metadata.
     Returns a dictionary with parsed metadata or None if an error occurs.
     """
-    if not GEMINI_API_KEY:
+    cached = llm_cache.get_cached_parse(PARSING_MODEL_NAME, PARSE_PROMPT_VERSION, full_activity_input, db_name=DB_NAME)
+    if cached is not None:
+        print("\nUsing cached metadata for this activity plan (already parsed before).")
+        return cached
+
+    if not llm_provider.is_configured():
         print("Error: GOOGLE_API_KEY not found. Please set it in your .env file.")
         return None
 
     try:
         # The DeprecationWarning is noted, but not the cause of the current JSON error.
         # You can update to llama-index-llms-google-genai later if desired.
-        llm = Gemini(api_key=GEMINI_API_KEY, model_name="models/gemini-1.5-flash-latest")
+        llm = llm_provider.get_llm(PARSING_MODEL_NAME)
     except Exception as e:
         print(f"Error initializing Gemini LLM: {e}")
         return None
@@ -113,7 +116,7 @@ def parse_activity_with_gemini(full_activity_input: str) -> dict | None:
 
     print("\nSending full activity plan to Gemini for parsing metadata...")
     try:
-        response = llm.complete(prompt)
+        response = llm_scheduler.get_scheduler().complete(llm, prompt)
         response_text = response.text.strip()
 
         if response_text.startswith("```json"):
@@ -126,6 +129,9 @@ def parse_activity_with_gemini(full_activity_input: str) -> dict | None:
 
         parsed_data = json.loads(response_text)
         print("\nSuccessfully parsed metadata from Gemini.")
+        if isinstance(parsed_data, dict):
+            llm_cache.store_parse(PARSING_MODEL_NAME, PARSE_PROMPT_VERSION, full_activity_input, parsed_data,
+                                  db_name=DB_NAME)
         return parsed_data
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON from Gemini: {e}")
@@ -0,0 +1,188 @@
+import re
+import db
+
+# --- Configuration ---
+DURATION_TOLERANCE_MINUTES = 20  # An activity within this much (or 25%) of the requested duration still matches
+DURATION_TOLERANCE_RATIO = 0.25
+UPPER_AGE_GROUP = (16, 18)  # "שכבה בוגרת"
+DB_NAME = "scout_activities.db"
+
+# Grade letters -> typical age at the start of the school year (כיתה א = 6)
+GRADE_AGES = {"א": 6, "ב": 7, "ג": 8, "ד": 9, "ה": 10, "ו": 11, "ז": 12, "ח": 13, "ט": 14, "י": 15,
+              "יא": 16, "יב": 17}
+
+NUMBER_RANGE_PATTERN = re.compile(r'(\d{1,3})\s*[-–]\s*(\d{1,3})')
+NUMBER_PATTERN = re.compile(r'\d{1,3}')
+# A duration number or range with the unit word after it, if any: "35-40 דקות", "1.5 שעות", "2 שעות וחצי"
+DURATION_NUMBER = r'\d{1,3}(?:\.\d+)?'
+DURATION_QUANTITY_PATTERN = re.compile(
+    rf'({DURATION_NUMBER})(?:\s*[-–]\s*({DURATION_NUMBER}))?\s*(?:(שעות|שעה)(\s+וחצי)?|(דקות|דק[\'׳]?))?')
+GRADE_RANGE_PATTERN = re.compile(r'כיתות?\s+(י[אב]|[א-י])[\'"׳]?\s*[-–]\s*(י[אב]|[א-י])[\'"׳]?')
+GRADE_PATTERN = re.compile(r'כיתה\s+(י[אב]|[א-י])[\'"׳]?(?![א-ת])')
+# Spelled-out durations, longest phrases first so "שעה וחצי" isn't read as "שעה"
+HOUR_PHRASES = (("שעתיים וחצי", 150), ("שעה ושלושת רבעי", 105), ("שעה וחצי", 90), ("שעה ורבע", 75),
+                ("שלושת רבעי שעה", 45), ("חצי שעה", 30), ("רבע שעה", 15), ("שעתיים", 120), ("שעה", 60))
+HOUR_PHRASE_PATTERN = re.compile("|".join(phrase for phrase, _ in HOUR_PHRASES))
+HOUR_PHRASE_MINUTES = dict(HOUR_PHRASES)
+
+
+# --- Parsing ---
+# Both parsers return an inclusive (low, high) range, or None when the text gives no usable value
+# (e.g. "כל הגילאים", "זמן משתנה"); None means "no constraint" when filtering.
+
+def parse_age_range(age_group):
+    """'גילאי 10-14' -> (10, 14); 'כיתות ז-ח' -> (12, 13); 'כיתה ו' -> (11, 11); 'שכבה בוגרת' -> (16, 18)."""
+    if not age_group:
+        return None
+    match = NUMBER_RANGE_PATTERN.search(age_group)
+    if match:
+        low, high = sorted((int(match.group(1)), int(match.group(2))))
+        return low, high
+    match = GRADE_RANGE_PATTERN.search(age_group)
+    if match:
+        low, high = sorted((GRADE_AGES[match.group(1)], GRADE_AGES[match.group(2)]))
+        return low, high
+    match = GRADE_PATTERN.search(age_group)
+    if match:
+        return GRADE_AGES[match.group(1)], GRADE_AGES[match.group(1)]
+    if "בוגרת" in age_group:
+        return UPPER_AGE_GROUP
+    numbers = [int(n) for n in NUMBER_PATTERN.findall(age_group) if 5 <= int(n) <= 25]
+    if numbers:
+        return min(numbers), max(numbers)
+    return None
+
+
+def _duration_parts(duration):
+    """
+    [(low, high)] minutes of each number / range / spelled-out duration in the text. A number is scaled by the
+    unit word right after it; a bare number takes the unit of the next number that has one ("1 או 2 שעות"),
+    or minutes.
+    """
+    quantities = []  # [low, high, is_hours or None]
+    for match in DURATION_QUANTITY_PATTERN.finditer(duration):
+        low = float(match.group(1))
+        high = float(match.group(2)) if match.group(2) else low
+        is_hours = True if match.group(3) else (False if match.group(5) else None)
+        if match.group(4):  # "2 שעות וחצי"
+            low, high = low + 0.5, high + 0.5
+        quantities.append([low, high, is_hours])
+    next_is_hours = False
+    for quantity in reversed(quantities):
+        if quantity[2] is None:
+            quantity[2] = next_is_hours
+        next_is_hours = quantity[2]
+    parts = [(round(low * 60), round(high * 60)) if is_hours else (round(low), round(high))
+             for low, high, is_hours in quantities]
+    # Spelled-out durations in what is left once the numbers (and their unit words) are taken out
+    remainder = DURATION_QUANTITY_PATTERN.sub(" ", duration)
+    parts += [(HOUR_PHRASE_MINUTES[phrase],) * 2 for phrase in HOUR_PHRASE_PATTERN.findall(remainder)]
+    return [(low, high) for low, high in parts if 0 < low <= high <= 600]
+
+
+def parse_duration_range(duration):
+    """
+    '60 דקות' -> (60, 60); '35-40 דקות' -> (35, 40); '1 שעה' -> (60, 60); '1.5 שעות' -> (90, 90);
+    'כ-2 שעות (120 דקות)' -> (120, 120); 'שעה עד שעה וחצי' -> (60, 90); 'שבוע' -> None.
+    Parts joined with '+' are added: '45 דקות + 15 דקות הכנה' -> (60, 60).
+    """
+    if not duration:
+        return None
+    if isinstance(duration, (int, float)):
+        return int(duration), int(duration)
+    parts = _duration_parts(duration)
+    if not parts:
+        return None
+    if "+" in duration:
+        return sum(low for low, _ in parts), sum(high for _, high in parts)
+    return min(low for low, _ in parts), max(high for _, high in parts)
+
+
+def normalized_columns(age_group, duration):
+    """The age_min / age_max / duration_minutes column values for an activity (None = unknown)."""
+    age_range = parse_age_range(age_group)
+    duration_range = parse_duration_range(duration)
+    return {
+        "age_min": age_range[0] if age_range else None,
+        "age_max": age_range[1] if age_range else None,
+        # A range ("60-90 דקות") is stored as its midpoint; filters allow a tolerance around the request
+        "duration_minutes": round(sum(duration_range) / 2) if duration_range else None,
+        PARSED_MARKER_COLUMN: PARSER_VERSION,
+    }
+
+
+# --- Storage ---
+NORMALIZED_COLUMNS = ("age_min", "age_max", "duration_minutes")
+# The parser version a row's columns were computed with, so rows with nothing parseable aren't re-parsed on
+# every startup, and rows parsed by an older parser are re-parsed once
+PARSED_MARKER_COLUMN = "attributes_parsed"
+PARSER_VERSION = 2  # Bump when parse_age_range / parse_duration_range change
+
+
+def setup_columns(cursor):
+    """Adds the normalized integer columns and their B-tree indexes to scout_activities if missing."""
+    cursor.execute("PRAGMA table_info(scout_activities)")
+    existing = {row[1] for row in cursor.fetchall()}
+    for column in NORMALIZED_COLUMNS + (PARSED_MARKER_COLUMN,):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE scout_activities ADD COLUMN {column} INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scout_activities_age ON scout_activities (age_min, age_max)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scout_activities_duration ON scout_activities (duration_minutes)")
+
+
+def backfill_columns(cursor, only_missing=True):
+    """
+    Parses age_group/duration into the normalized columns. By default only rows not parsed by the current
+    PARSER_VERSION (rows from before the columns existed or from an older parser, or written by tools that
+    don't fill them) are parsed; each parsed row is marked, so unparseable ones are skipped next time.
+    Returns the number of rows that got at least one value.
+    """
+    where = f"{PARSED_MARKER_COLUMN} IS NULL OR {PARSED_MARKER_COLUMN} < {PARSER_VERSION}" if only_missing else "1"
+    cursor.execute(f"SELECT id, age_group, duration FROM scout_activities WHERE {where}")
+    updates = [{**normalized_columns(age_group, duration), "id": activity_id}
+               for activity_id, age_group, duration in cursor.fetchall()]
+    cursor.executemany(f'''
+        UPDATE scout_activities SET age_min = :age_min, age_max = :age_max, duration_minutes = :duration_minutes,
+                                    {PARSED_MARKER_COLUMN} = :{PARSED_MARKER_COLUMN}
+        WHERE id = :id
+    ''', updates)
+    return sum(any(update[column] is not None for column in NORMALIZED_COLUMNS) for update in updates)
+
+
+def backfill(db_name=DB_NAME, only_missing=True):
+    """One-off (and idempotent) backfill of the normalized columns for an existing DB."""
+    with db.transaction(db_name) as cursor:
+        setup_columns(cursor)
+        updated = backfill_columns(cursor, only_missing)
+    print(f"Attributes: Normalized age/duration of {updated} activities.")
+    return updated
+
+
+# --- Filtering ---
+def wanted_duration_range(wanted_minutes):
+    """The duration_minutes range that counts as matching a requested duration."""
+    tolerance = max(DURATION_TOLERANCE_MINUTES, wanted_minutes * DURATION_TOLERANCE_RATIO)
+    return round(wanted_minutes - tolerance), round(wanted_minutes + tolerance)
+
+
+def filter_sql(user_age_pref=None, user_duration_minutes=None, table_alias="scout_activities"):
+    """
+    SQL conditions (to AND into a WHERE clause) and their parameters that keep activities whose age range
+    overlaps the requested age group and whose duration is near the requested one. Activities with an
+    unknown age or duration are kept. Returns ("", []) when nothing is requested.
+    The conditions are range lookups on idx_scout_activities_age / idx_scout_activities_duration.
+    """
+    conditions, params = [], []
+    wanted_age = parse_age_range(user_age_pref)
+    if wanted_age:
+        conditions.append(f"({table_alias}.age_min <= ? OR {table_alias}.age_min IS NULL)")
+        conditions.append(f"({table_alias}.age_max >= ? OR {table_alias}.age_max IS NULL)")
+        params += [wanted_age[1], wanted_age[0]]
+    if user_duration_minutes:
+        conditions.append(f"({table_alias}.duration_minutes BETWEEN ? AND ? OR {table_alias}.duration_minutes IS NULL)")
+        params += list(wanted_duration_range(user_duration_minutes))
+    return " AND ".join(conditions), params
+
+
+if __name__ == "__main__":
+    backfill(only_missing=False)
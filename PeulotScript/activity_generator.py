@@ -2,7 +2,6 @@ import sqlite3
 import json
 import os
 from dotenv import load_dotenv
-from llama_index.llms.gemini import Gemini  # Or your preferred Gemini SDK
 # For embeddings, you might use:
 # from llama_index.embeddings.gemini import GeminiEmbedding
 # from sentence_transformers import SentenceTransformer # For open-source models
@@ -11,11 +10,16 @@ from llama_index.llms.gemini import Gemini  # Or your preferred Gemini SDK
 # import numpy as np
 import random
 import re
+import db
+import activity_index
+import llm_provider
+import context_builder
 
 # --- Configuration ---
 DB_NAME = "scout_activities.db"
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+GENERATION_MODEL_NAME = "models/gemini-2.0-flash"  # Use a powerful model
 
 
 # EMBEDDING_MODEL_NAME = "models/embedding-001" # Example for Gemini embedding
@@ -24,58 +28,36 @@ GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 # --- Database Interaction ---
 def get_all_activities_from_db():
     """Fetches all activities for embedding or initial retrieval pool."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row  # Access columns by name
-    cursor = conn.cursor()
+    cursor = db.get_connection(DB_NAME).cursor()
+    cursor.row_factory = sqlite3.Row  # Access columns by name
     cursor.execute(
         "SELECT id, topic, description, games_and_methods, age_group, duration, materials, tags, source_url FROM scout_activities")
-    activities = cursor.fetchall()
-    conn.close()
-    return activities
+    return cursor.fetchall()
+
+
+def count_activities_in_db():
+    cursor = db.get_connection(DB_NAME).cursor()
+    cursor.execute("SELECT COUNT(*) FROM scout_activities")
+    return cursor.fetchone()[0]
 
 
 def get_activity_by_id(activity_id):
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    cursor = db.get_connection(DB_NAME).cursor()
+    cursor.row_factory = sqlite3.Row
     cursor.execute("SELECT * FROM scout_activities WHERE id = ?", (activity_id,))
-    activity = cursor.fetchone()
-    conn.close()
-    return activity
+    return cursor.fetchone()
 
 
 # --- Similarity/Retrieval (Conceptual - needs an embedding strategy) ---
-# This section is simplified. In a real app, you'd pre-compute and store embeddings.
-# For this example, we'll do a very basic keyword-based retrieval.
+# Keyword-based retrieval backed by the SQLite FTS5 index in activity_index.py (BM25, Hebrew prefixes).
 # A proper implementation would use vector embeddings.
 
-def get_relevant_activities_keyword_based(user_prompt, all_activities, num_to_retrieve=3):
+def get_relevant_activities_keyword_based(user_prompt, num_to_retrieve=3):
     """
-    Simplified keyword-based retrieval.
-    A proper RAG would use semantic search with embeddings.
+    Keyword-based retrieval: one FTS5 query ranked by BM25, where Hebrew words also match their
+    prefixed forms (e.g. "משחק" matches "המשחק").
     """
-    scores = []
-    prompt_keywords = set(re.findall(r'\b\w+\b', user_prompt.lower()))  # Simple keyword extraction
-
-    for activity in all_activities:
-        score = 0
-        # Combine text from various fields for matching
-        search_text = f"{activity['topic']} {activity['description']} {activity['games_and_methods']} {' '.join(json.loads(activity['tags'] or '[]'))}"
-        activity_keywords = set(re.findall(r'\b\w+\b', search_text.lower()))
-
-        common_keywords = prompt_keywords.intersection(activity_keywords)
-        score = len(common_keywords)
-
-        # Bonus for topic match
-        if activity['topic'] and any(kw in activity['topic'] for kw in user_prompt.split()):
-            score += 5
-
-        scores.append((score, activity))
-
-    # Sort by score descending
-    scores.sort(key=lambda x: x[0], reverse=True)
-
-    retrieved = [activity for score, activity in scores[:num_to_retrieve] if score > 0]
+    retrieved = activity_index.search_activities(user_prompt, num_to_retrieve=num_to_retrieve, db_name=DB_NAME)
     print(f"Generator: Retrieved {len(retrieved)} activities based on keywords.")
     return retrieved
 
@@ -83,11 +65,11 @@ def get_relevant_activities_keyword_based(user_prompt, all_activities, num_to_re
 # --- LLM Interaction ---
 def generate_activity_with_llm(user_prompt, user_duration_minutes=None, user_age_pref=None,
                                relevant_activities_context=""):
-    if not GEMINI_API_KEY:
+    if not llm_provider.is_configured():
         print("Generator: Error - GOOGLE_API_KEY not found.")
         return None
     try:
-        llm = Gemini(api_key=GEMINI_API_KEY, model_name="models/gemini-2.0-flash")  # Use a powerful model
+        llm = llm_provider.get_llm(GENERATION_MODEL_NAME)
     except Exception as e:
         print(f"Generator: Error initializing Gemini LLM: {e}")
         return None
@@ -152,12 +134,13 @@ def main():
     print("מחולל פעולות לצופים (מבוסס מאגר קיים ו-AI)")
     print("--------------------------------------------")
 
-    all_db_activities = get_all_activities_from_db()
-    if not all_db_activities:
+    activities_count = count_activities_in_db()
+    if not activities_count:
         print("שגיאה: לא נמצאו פעילויות במאגר הנתונים. המחולל לא יכול לעבוד ללא מאגר.")
         return
 
-    print(f"טען {len(all_db_activities)} פעילויות מהמאגר.")
+    activity_index.ensure_index(DB_NAME)  # Builds the full-text index once; triggers keep it in sync
+    print(f"טען {activities_count} פעילויות מהמאגר.")
 
     while True:
         user_input_prompt = input(
@@ -184,17 +167,20 @@ def main():
         user_age_pref = None  # Placeholder
 
         # 1. Retrieve relevant activities from DB (simplified keyword search for now)
-        relevant_activities = get_relevant_activities_keyword_based(user_input_prompt, all_db_activities,
-                                                                    num_to_retrieve=3)
+        relevant_activities = get_relevant_activities_keyword_based(user_input_prompt, num_to_retrieve=3)
 
         context_for_llm = ""
         if relevant_activities:
             context_for_llm += "להלן מספר פעולות דומות מהמאגר שיכולות לשמש כהשראה:\n\n"
-            for i, act in enumerate(relevant_activities):
+            excerpts = context_builder.pack_excerpts(
+                user_input_prompt, [act['games_and_methods'] for act in relevant_activities],
+                token_budget=context_builder.CONTEXT_TOKEN_BUDGET)  # Most relevant stages/games of each activity
+            for i, (act, excerpt) in enumerate(zip(relevant_activities, excerpts)):
                 context_for_llm += f"--- דוגמה {i + 1} (מקור: {act['source_url'] or 'לא ידוע'}) ---\n"
                 context_for_llm += f"נושא: {act['topic']}\n"
                 context_for_llm += f"תיאור קצר: {act['description']}\n"
-                context_for_llm += f"משחקים ומתודות עיקריים:\n{act['games_and_methods'][:500]}...\n"  # Truncate for brevity
+                if excerpt:
+                    context_for_llm += f"משחקים ומתודות עיקריים:\n{excerpt}\n"
                 context_for_llm += f"קבוצת גיל: {act['age_group']}\n"
                 context_for_llm += f"משך: {act['duration']}\n"
                 context_for_llm += "---------------------------------\n\n"
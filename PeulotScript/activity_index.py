@@ -0,0 +1,158 @@
+import sqlite3
+import db
+import hebrew_text
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+# BM25 column weights, in activity_fts column order; a match in the topic counts most
+BM25_WEIGHTS = {"topic": 5.0, "description": 2.0, "games_and_methods": 1.0, "tags": 2.0}
+FTS_COLUMNS = tuple(BM25_WEIGHTS)
+
+
+# --- Index Storage ---
+# activity_fts is a contentless FTS5 table (rowid = scout_activities.id) over the hebrew_normalize()d
+# text of each column, so a query's prefix-stripped variants match the stored ones. Triggers keep it
+# in sync with scout_activities inside the writer's own transaction.
+
+def _normalized_values(prefix):
+    return ", ".join(f"hebrew_normalize({prefix}.{column})" for column in FTS_COLUMNS)
+
+
+def setup_index(cursor):
+    """Creates the FTS5 table and its sync triggers; fills it on first creation. Returns True if it was built."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'activity_fts'")
+    exists = cursor.fetchone() is not None
+    columns = ", ".join(FTS_COLUMNS)
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS activity_fts USING fts5({columns}, content='')")
+    _create_trigger(cursor, "scout_activities_fts_insert", f'''
+        CREATE TRIGGER scout_activities_fts_insert AFTER INSERT ON scout_activities BEGIN
+            INSERT INTO activity_fts (rowid, {columns}) VALUES (new.id, {_normalized_values("new")});
+        END
+    ''')
+    _create_trigger(cursor, "scout_activities_fts_delete", f'''
+        CREATE TRIGGER scout_activities_fts_delete AFTER DELETE ON scout_activities BEGIN
+            INSERT INTO activity_fts (activity_fts, rowid, {columns}) VALUES ('delete', old.id, {_normalized_values("old")});
+        END
+    ''')
+    # Only the indexed columns re-index a row (so e.g. the age/duration backfill doesn't touch the FTS table);
+    # replaces the trigger of older DBs, which fired on any UPDATE
+    _create_trigger(cursor, "scout_activities_fts_update", f'''
+        CREATE TRIGGER scout_activities_fts_update AFTER UPDATE OF {columns} ON scout_activities BEGIN
+            INSERT INTO activity_fts (activity_fts, rowid, {columns}) VALUES ('delete', old.id, {_normalized_values("old")});
+            INSERT INTO activity_fts (rowid, {columns}) VALUES (new.id, {_normalized_values("new")});
+        END
+    ''')
+    # The Python-evaluated inverted index this table replaces
+    cursor.execute("DROP TABLE IF EXISTS activity_terms")
+    cursor.execute("DROP TABLE IF EXISTS activity_index_docs")
+    if not exists:
+        _populate(cursor)
+    return not exists
+
+
+def _create_trigger(cursor, name, create_sql):
+    """
+    Creates the trigger, replacing a stored one whose definition differs. An unchanged trigger is left
+    alone, so opening the DB doesn't rewrite the schema (and invalidate every connection's cached schema).
+    """
+    create_sql = create_sql.strip()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+    row = cursor.fetchone()
+    if row is not None and row[0] == create_sql:
+        return
+    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute(create_sql)
+
+
+def _populate(cursor):
+    cursor.execute(f'''
+        INSERT INTO activity_fts (rowid, {", ".join(FTS_COLUMNS)})
+        SELECT id, {_normalized_values("scout_activities")} FROM scout_activities
+    ''')
+
+
+def build_index(db_name=DB_NAME):
+    """Rebuilds the full-text index from scratch (e.g. after hebrew_text normalization changes)."""
+    with db.transaction(db_name) as cursor:
+        if not setup_index(cursor):
+            cursor.execute("INSERT INTO activity_fts (activity_fts) VALUES ('delete-all')")
+            _populate(cursor)
+        cursor.execute("SELECT COUNT(*) FROM scout_activities")
+        indexed = cursor.fetchone()[0]
+    print(f"Index: Built full-text index over {indexed} activities.")
+    return indexed
+
+
+def ensure_index(db_name=DB_NAME):
+    """Creates the index (and fills it) if this DB doesn't have it yet. Later inserts are indexed by triggers."""
+    with db.transaction(db_name) as cursor:
+        built = setup_index(cursor)
+    if built:
+        print("Index: Built full-text index.")
+    return built
+
+
+# --- Retrieval ---
+def build_match_query(user_prompt):
+    """
+    FTS5 MATCH expression: each prompt word is a group of its prefix-stripped variants, and the groups
+    are OR-ed, so an activity matching more of the words ranks higher (via BM25) without all being required.
+    """
+    groups = []
+    for token in dict.fromkeys(hebrew_text.tokenize(user_prompt)):
+        variants = " OR ".join(f'"{variant}"' for variant in hebrew_text.token_variants(token))
+        groups.append(f"({variants})")
+    return " OR ".join(groups)
+
+
+_BM25 = f"bm25(activity_fts, {', '.join(str(weight) for weight in BM25_WEIGHTS.values())})"
+
+
+def search_activity_ids(user_prompt, num_to_retrieve=3, db_name=DB_NAME, filter_clause="", filter_params=()):
+    """
+    Returns [(score, activity_id)] for the best matching activities, best first (score = -BM25).
+    filter_clause/filter_params (activity_attributes.filter_sql on alias `a`) restrict the matches to
+    scout_activities rows meeting the condition.
+    """
+    match_query = build_match_query(user_prompt)
+    if not match_query:
+        return []
+    cursor = db.get_connection(db_name).cursor()
+    if not filter_clause:
+        cursor.execute(f'''
+            SELECT -{_BM25} AS score, rowid FROM activity_fts
+            WHERE activity_fts MATCH ?
+            ORDER BY {_BM25}
+            LIMIT ?
+        ''', (match_query, num_to_retrieve))
+        return cursor.fetchall()
+    cursor.execute(f'''
+        SELECT -{_BM25} AS score, activity_fts.rowid
+        FROM activity_fts JOIN scout_activities AS a ON a.id = activity_fts.rowid
+        WHERE activity_fts MATCH ? AND {filter_clause}
+        ORDER BY {_BM25}
+        LIMIT ?
+    ''', (match_query, *filter_params, num_to_retrieve))
+    return cursor.fetchall()
+
+
+def search_activities(user_prompt, num_to_retrieve=3, db_name=DB_NAME):
+    """Returns the best matching activities as sqlite3.Row objects (with a `score` column), best first."""
+    match_query = build_match_query(user_prompt)
+    if not match_query:
+        return []
+    cursor = db.get_connection(db_name).cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f'''
+        SELECT a.id, a.topic, a.description, a.games_and_methods, a.age_group, a.duration, a.materials,
+               a.tags, a.source_url, -{_BM25} AS score
+        FROM activity_fts JOIN scout_activities AS a ON a.id = activity_fts.rowid
+        WHERE activity_fts MATCH ?
+        ORDER BY {_BM25}
+        LIMIT ?
+    ''', (match_query, num_to_retrieve))
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    build_index()
@@ -228,6 +228,15 @@ function showCopyFeedback(message, success, elementId) {
 """
 st.components.v1.html(copy_js_script, height=0)
 
+# Prepares the retrieval indexes once per process: Streamlit reruns this script on every interaction,
+# and cache_resource keeps the call from repeating (retrieval itself picks up newer vector exports)
+@st.cache_resource
+def prepare_retrieval():
+    generator_backend.prepare_retrieval()
+
+
+prepare_retrieval()
+
 # --- Main Application ---
 st.title("מחולל פעולות לצופים")  # CSS Selector for H1 title applies
 st.markdown("<p>הזן בקשה ותן ל-AI ליצור עבורך פעולה מותאמת!</p>", unsafe_allow_html=True)  # CSS for p applies
@@ -236,6 +245,17 @@ if 'generated_activity_text' not in st.session_state:
     st.session_state.generated_activity_text = ""
 if 'show_activity' not in st.session_state:
     st.session_state.show_activity = False
+if 'last_request' not in st.session_state:
+    st.session_state.last_request = None  # (prompt, duration, age) of the activity on screen
+if 'served_from_cache' not in st.session_state:
+    st.session_state.served_from_cache = False
+if 'generation_failed' not in st.session_state:
+    st.session_state.generation_failed = False
+
+
+def request_regeneration():
+    # Runs before the rerun, so the handler below sees the flag in the same run
+    st.session_state.regenerate_requested = True
 
 with st.form(key="activity_form"):
     prompt_text = st.text_area(
@@ -268,36 +288,67 @@ with st.form(key="activity_form"):
 
     submit_button = st.form_submit_button(label="🚀 צור לי פעולה!")  # Uses .stButton button[kind="formSubmit"] style
 
-if submit_button:
+regenerate_requested = st.session_state.pop("regenerate_requested", False)
+if regenerate_requested and st.session_state.last_request:
+    # "Regenerate" bypasses the cache and asks Gemini again for the request on screen
+    prompt_text, user_duration_minutes, user_age_pref = st.session_state.last_request
+
+if submit_button or regenerate_requested:
     if not prompt_text.strip():
         st.warning("אנא הזן תיאור לבקשת הפעולה.")
         st.session_state.show_activity = False
     else:
         st.session_state.show_activity = True
         st.session_state.generated_activity_text = ""  # Clear previous activity
-        # Using placeholders for spinner messages for better control
-        spinner_placeholder = st.empty()
-        with spinner_placeholder.status("מעבד את הבקשה...", expanded=True) as status_main:
-            st.write("מחפש פעילויות דומות במאגר...")
-            relevant_context = generator_backend.get_relevant_activities_for_frontend(prompt_text)
-            st.write("הקסם קורה... Gemini חושב על פעולה מושלמת! 🧙‍♂️")
-            generated_activity = generator_backend.generate_activity_with_llm_for_frontend(
-                user_prompt=prompt_text,
-                user_duration_minutes=user_duration_minutes,
-                user_age_pref=user_age_pref,
-                relevant_activities_context=relevant_context
-            )
+        st.session_state.last_request = (prompt_text, user_duration_minutes, user_age_pref)
+        cached_activity = None
+        if not regenerate_requested:
+            cached_activity = generator_backend.get_cached_activity(prompt_text, user_duration_minutes, user_age_pref)
+        st.session_state.served_from_cache = cached_activity is not None
+        st.session_state.generation_failed = False
+
+        if cached_activity is not None:
+            # Same (or nearly the same) request was answered recently: show it instantly
+            st.session_state.generated_activity_text = cached_activity
+        else:
+            # Using placeholders for spinner messages for better control
+            spinner_placeholder = st.empty()
+            with spinner_placeholder.status("מעבד את הבקשה...", expanded=True) as status_main:
+                st.write("מחפש פעילויות דומות במאגר...")
+                relevant_context = generator_backend.get_relevant_activities_for_frontend(
+                    prompt_text, user_age_pref=user_age_pref, user_duration_minutes=user_duration_minutes)
+                st.write("הקסם קורה... Gemini חושב על פעולה מושלמת! 🧙‍♂️")
+                status_main.update(label="Gemini כותב את הפעולה...", state="running", expanded=False)
+
+            # Render the activity as it streams in, instead of waiting for the whole plan
+            streaming_placeholder = st.empty()
+            generated_activity = ""
+            for chunk in generator_backend.stream_activity_with_llm_for_frontend(
+                    user_prompt=prompt_text,
+                    user_duration_minutes=user_duration_minutes,
+                    user_age_pref=user_age_pref,
+                    relevant_activities_context=relevant_context
+            ):
+                if isinstance(chunk, generator_backend.GenerationError):
+                    st.session_state.generation_failed = True
+                generated_activity += chunk
+                streaming_placeholder.markdown(f"<div class='output-container'>{generated_activity}</div>",
+                                               unsafe_allow_html=True)
+            streaming_placeholder.empty()  # Replaced by the final output (with the copy button) below
             status_main.update(label="הפעולה מוכנה!", state="complete", expanded=False)
 
-        st.session_state.generated_activity_text = generated_activity
+            st.session_state.generated_activity_text = generated_activity
 
 if st.session_state.show_activity:
     activity_text_to_display = st.session_state.generated_activity_text
     if activity_text_to_display:
-        if "שגיאה:" in activity_text_to_display:  # Check for error messages from backend
+        if st.session_state.generation_failed:  # The backend yielded a GenerationError
             st.error(activity_text_to_display)
         else:
-            st.success("הפעולה נוצרה בהצלחה! 🎉")  # Alert type affected by CSS
+            if st.session_state.served_from_cache:
+                st.info("הפעולה נשלפה מבקשה זהה או דומה מאוד שנענתה לאחרונה. לחץ על \"צור גרסה חדשה\" לפעולה אחרת.")
+            else:
+                st.success("הפעולה נוצרה בהצלחה! 🎉")  # Alert type affected by CSS
             output_div_id = "generatedActivityOutput"
             copy_feedback_id = "copyFeedback"
 
@@ -313,7 +364,9 @@ if st.session_state.show_activity:
                 <span id="{copy_feedback_id}" style="margin-right: 10px; display: none;"></span> 
                 """, unsafe_allow_html=True
             )  # Feedback span style updated in JS
-    elif submit_button:  # Only show general error if submit was pressed and no specific error from backend
+
+            st.button("🔄 צור גרסה חדשה", on_click=request_regeneration)  # Skips the cache
+    elif submit_button or regenerate_requested:  # Only show general error if submit was pressed and no specific error from backend
         st.error("אופס! משהו השתבש ביצירת הפעולה. נסה שוב או שנה את הבקשה.")
 
 st.markdown("---")
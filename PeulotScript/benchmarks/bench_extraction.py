@@ -0,0 +1,76 @@
+"""
+Benchmarks topic-page extraction on the saved NodeBB pages in benchmarks/fixtures:
+the old path (charset detection + full BeautifulSoup tree) vs the fast path (declared UTF-8 +
+streaming FirstPostParser). Also checks that both paths extract the same text.
+
+Run from PeulotScript/:  python benchmarks/bench_extraction.py [--repeat N]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import topic_extractor  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _response(body):
+    """A requests.Response as scraper_http receives it for a NodeBB page."""
+    response = requests.Response()
+    response._content = body
+    response.status_code = 200
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)  # As HTTPAdapter sets it
+    return response
+
+
+def old_path(body):
+    response = _response(body)
+    response.encoding = response.apparent_encoding
+    return topic_extractor.extract_first_post_text(response.text, extractor="bs4")
+
+
+def fast_path(body):
+    return topic_extractor.extract_first_post_text(_response(body).text, extractor="fast")
+
+
+def _median_ms(function, body, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(body)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks topic-page extraction (old vs fast path) on the "
+                                                 "saved NodeBB pages in benchmarks/fixtures.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+    print(f"{'fixture':<22}{'KB':>8}{'old ms':>10}{'fast ms':>10}{'speedup':>9}")
+    total_old = total_fast = 0.0
+    for path in paths:
+        with open(path, "rb") as f:
+            body = f.read()
+        if old_path(body) != fast_path(body):
+            print(f"{os.path.basename(path)}: fast path extracted different text!")
+            sys.exit(1)
+        old_ms = _median_ms(old_path, body, args.repeat)
+        fast_ms = _median_ms(fast_path, body, args.repeat)
+        total_old += old_ms
+        total_fast += fast_ms
+        print(f"{os.path.basename(path):<22}{len(body) / 1024:>8.1f}{old_ms:>10.2f}{fast_ms:>10.2f}{old_ms / fast_ms:>8.1f}x")
+    if paths:
+        print(f"{'total':<22}{'':>8}{total_old:>10.2f}{total_fast:>10.2f}{total_old / total_fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
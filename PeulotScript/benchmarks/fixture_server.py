@@ -0,0 +1,104 @@
+"""
+Local NodeBB stand-in for the benchmarks and tests: serves the saved topic pages in benchmarks/fixtures at
+/topic/<tid>/<fixture name>, and their JSON API counterparts at /api/topic/<tid>/<fixture name>
+(the page's embedded ajaxify-data, which is what NodeBB's API returns for it). /category/<cid>?page=N
+(and /api/category/...) lists CATEGORY_TOPICS topics cycling through the fixtures, CATEGORY_PAGE_SIZE per page.
+"""
+import os
+import re
+import html
+import json
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+AJAXIFY_DATA_PATTERN = re.compile(r'<script id="ajaxify-data" type="application/json">(.*?)</script>', re.DOTALL)
+CATEGORY_TOPICS = 12
+CATEGORY_PAGE_SIZE = 5
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """{fixture name: (page bytes, API JSON bytes)} for every .html file in directory."""
+    fixtures = {}
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".html"):
+            continue
+        with open(os.path.join(directory, file_name), "rb") as f:
+            page = f.read()
+        match = AJAXIFY_DATA_PATTERN.search(page.decode("utf-8"))
+        api_json = html.unescape(match.group(1)).encode("utf-8") if match else b"{}"
+        fixtures[file_name[:-len(".html")]] = (page, api_json)
+    return fixtures
+
+
+def category_topics(names, page):
+    """[(tid, fixture name)] on a category page (1-based), and whether a next page exists."""
+    tids = range((page - 1) * CATEGORY_PAGE_SIZE, min(page * CATEGORY_PAGE_SIZE, CATEGORY_TOPICS))
+    return [(tid, names[tid % len(names)]) for tid in tids], page * CATEGORY_PAGE_SIZE < CATEGORY_TOPICS
+
+
+def category_json(names, page):
+    topics, has_next = category_topics(names, page)
+    return json.dumps({
+        "topics": [{"tid": tid, "slug": f"{tid}/{name}", "title": name} for tid, name in topics],
+        "pagination": {"currentPage": page, "next": {"page": page + 1, "active": has_next}},
+    }).encode("utf-8")
+
+
+def category_html(names, page):
+    topics, _ = category_topics(names, page)
+    links = "".join(f'<li component="category/topic"><a href="/topic/{tid}/{name}">{name}</a></li>'
+                    for tid, name in topics)
+    return f'<!DOCTYPE html><html><body><ul component="category">{links}</ul></body></html>'.encode("utf-8")
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real forum behind scraper_http's session
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't hold the body for a delayed ACK
+    fixtures = {}
+    serve_api = True  # False: every /api/ URL is a 404, like a forum without the JSON API
+    requested_paths = []  # Every path (with query) requested, in order
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        parts = urlsplit(self.path)
+        path = parts.path
+        is_api = path.startswith("/api/")
+        page = int(parse_qs(parts.query).get("page", ["1"])[0])
+        fixture = self.fixtures.get(path.rstrip("/").rsplit("/", 1)[-1])
+        if is_api and not self.serve_api:
+            body, status, content_type = b"Not found", 404, "text/plain; charset=utf-8"
+        elif re.match(r'^(?:/api)?/category/\d+', path):
+            names = sorted(self.fixtures)
+            if is_api:
+                body, status, content_type = category_json(names, page), 200, "application/json; charset=utf-8"
+            else:
+                body, status, content_type = category_html(names, page), 200, "text/html; charset=utf-8"
+        elif fixture is None or "/topic/" not in path:
+            body, status, content_type = b"Not found", 404, "text/plain; charset=utf-8"
+        elif is_api:
+            body, status, content_type = fixture[1], 200, "application/json; charset=utf-8"
+        else:
+            body, status, content_type = fixture[0], 200, "text/html; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(directory=FIXTURES_DIR, serve_api=True):
+    """
+    Starts the server on a free localhost port in a daemon thread. Returns (base_url, fixture names, server);
+    server.RequestHandlerClass holds the served fixtures and the requested paths.
+    """
+    handler = type("BoundFixtureHandler", (FixtureHandler,),
+                   {"fixtures": load_fixtures(directory), "serve_api": serve_api, "requested_paths": []})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", sorted(handler.fixtures), server
@@ -0,0 +1,441 @@
+"""
+Benchmark suite for retrieval, ingestion, prompt building, the worthiness filter and topic extraction,
+on synthetic Hebrew corpora (benchmarks/synthetic_corpus.py) with a fake LLM and a local fixture
+HTTP server, so runs are offline and repeatable. Reports latency percentiles, throughput and peak
+traced memory per benchmark, and saves them as JSON in benchmarks/results/ for comparing commits.
+
+Run from PeulotScript/:
+    python benchmarks/run_benchmarks.py                               # 100 and 10k activities
+    python benchmarks/run_benchmarks.py --sizes 100,10000,1000000     # + 1M (the corpus build takes a while; cached)
+    python benchmarks/run_benchmarks.py --compare latest --fail-on-regression
+
+Each group of benchmarks runs in its own process (with its corpus directory as the working directory,
+as the app runs next to its DB), so thread-local connections, loaded indexes and memory figures don't
+carry over between corpus sizes. Corpora are built once per size and cached in CORPUS_CACHE_DIR;
+write benchmarks run on a copy.
+"""
+import os
+import sys
+import json
+import math
+import glob
+import time
+import shutil
+import argparse
+import platform
+import sqlite3
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+import db  # noqa: E402
+import llm_provider  # noqa: E402
+import llm_scheduler  # noqa: E402
+import forum_scraper  # noqa: E402
+import peula_db_manager  # noqa: E402
+import generator_backend  # noqa: E402
+import activity_generator  # noqa: E402
+import process_scraped_activities  # noqa: E402
+import worthiness  # noqa: E402
+import synthetic_corpus  # noqa: E402
+import fixture_server  # noqa: E402
+
+try:
+    import resource  # Unix only; max RSS is left out of the results elsewhere
+except ImportError:
+    resource = None
+
+# --- Configuration ---
+DEFAULT_SIZES = (100, 10_000)
+CORPUS_CACHE_DIR = os.path.join(tempfile.gettempdir(), "peulot_benchmark_corpora")
+CORPUS_VERSION = 1  # Bump when synthetic_corpus changes, so cached corpora are rebuilt
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+BUILD_BATCH_SIZE = 5000  # Activities per add_activities_bulk call while building a corpus
+WARMUP_CALLS = 3  # Untimed calls before each benchmark (imports, prepared statements, page cache)
+QUERY_CALLS = 200
+INGEST_CALLS = 200
+INGEST_BATCHES = 25
+INGEST_BATCH_SIZE = peula_db_manager.MAX_ACTIVITIES_PER_BATCH
+WORTHINESS_POSTS = 2000
+WORTHINESS_BATCH_SIZE = 100
+EXTRACTION_CALLS = 150
+MEMORY_CALLS = 20  # Calls repeated under tracemalloc for the peak figure (tracing slows them several-fold)
+REGRESSION_THRESHOLD = 0.25  # A p50 this much slower than the compared run counts as a regression
+
+
+# --- Measurement ---
+@contextlib.contextmanager
+def quiet():
+    """Swallows the modules' progress prints, which would otherwise dominate the timings."""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def _max_rss_mib():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # Bytes on macOS, KiB elsewhere
+
+
+def measure(name, calls, memory_calls, size=None, items_per_call=1):
+    """
+    Runs WARMUP_CALLS of calls untimed, times the rest one by one, then runs memory_calls under tracemalloc
+    for the peak. Writes can't be repeated, so memory_calls are separate callables (for reads, pass a slice
+    of calls). Returns the benchmark's result dict.
+    """
+    with quiet():
+        for call in calls[:WARMUP_CALLS]:
+            call()
+        timings = []
+        started = time.perf_counter()
+        for call in calls[WARMUP_CALLS:]:
+            call_started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        for call in memory_calls:
+            call()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    timings_ms = sorted(t * 1000 for t in timings)
+    result = {
+        "name": name,
+        "size": size,
+        "calls": len(timings_ms),
+        "items_per_call": items_per_call,
+        "p50_ms": round(_percentile(timings_ms, 0.50), 3),
+        "p90_ms": round(_percentile(timings_ms, 0.90), 3),
+        "p95_ms": round(_percentile(timings_ms, 0.95), 3),
+        "p99_ms": round(_percentile(timings_ms, 0.99), 3),
+        "max_ms": round(timings_ms[-1], 3),
+        "mean_ms": round(sum(timings_ms) / len(timings_ms), 3),
+        "throughput_per_s": round(len(timings_ms) * items_per_call / elapsed, 1),
+        "peak_traced_kib": round(peak / 1024, 1),
+        "max_rss_mib": _max_rss_mib(),
+    }
+    print(f"  {name:<26}{_size_label(size):>7}  p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms  "
+          f"{result['throughput_per_s']:>10.1f}/s  peak {result['peak_traced_kib']:>9.1f} KiB")
+    return result
+
+
+def _size_label(size):
+    if size is None:
+        return "-"
+    return f"{size // 1_000_000}M" if size >= 1_000_000 else f"{size // 1000}k" if size >= 1000 else str(size)
+
+
+# --- Fake LLM ---
+def fake_llm_responder(prompt):
+    """Answers the metadata-parse prompts with valid JSON (one object, or an array for a batch) and anything else with a plan."""
+    if "JSON Array Output" in prompt:
+        urls = [line.split("source_url:", 1)[1].strip(" =") for line in prompt.splitlines()
+                if line.startswith("=== ACTIVITY source_url:")]
+        return json.dumps([dict(_FAKE_METADATA, source_url=url) for url in urls], ensure_ascii=False)
+    if "JSON Output" in prompt:
+        return json.dumps(_FAKE_METADATA, ensure_ascii=False)
+    return _FAKE_PLAN
+
+
+_FAKE_METADATA = {"topic": "פעולה", "description": "תיאור", "age_group": "כיתות ז-ח", "duration": "90 דקות",
+                  "materials": ["כדור"], "tags": ["משחק"]}
+_FAKE_PLAN = synthetic_corpus.activity(-1)["games_and_methods"]
+
+
+def use_fake_llm():
+    llm_provider.use_fake_llm(fake_llm_responder)
+    # No RPM/TPM budget: the benchmarks measure this process, not the Gemini quota
+    llm_scheduler.set_scheduler(llm_scheduler.LLMScheduler(requests_per_minute=None, tokens_per_minute=None))
+
+
+# --- Corpora ---
+def corpus_dir(size):
+    return os.path.join(CORPUS_CACHE_DIR, f"v{CORPUS_VERSION}-{size}")
+
+
+def build_corpus(size):
+    """
+    Builds the corpus of `size` synthetic activities through the ingestion code (bulk inserts with
+    near-duplicate checks, full-text index, normalized columns, embeddings and the vector index export).
+    Returns the build time in seconds.
+    """
+    directory = corpus_dir(size)
+    building = f"{directory}.building-{os.getpid()}"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    os.chdir(building)
+    started = time.perf_counter()
+    with quiet():
+        peula_db_manager.setup_database()
+        for start in range(0, size, BUILD_BATCH_SIZE):
+            peula_db_manager.add_activities_bulk(synthetic_corpus.activities(start, min(BUILD_BATCH_SIZE, size - start)))
+        generator_backend.prepare_retrieval()
+    build_seconds = time.perf_counter() - started
+    connection = db.get_connection(peula_db_manager.DB_NAME)
+    stored = connection.execute("SELECT COUNT(*) FROM scout_activities").fetchone()[0]
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # So the .db file alone can be copied
+    with open("corpus.json", "w", encoding="utf-8") as f:
+        json.dump({"size": size, "stored": stored, "build_seconds": round(build_seconds, 1)}, f)
+    os.chdir(BENCHMARKS_DIR)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(building, directory)
+    print(f"  corpus {_size_label(size)}: {stored} activities stored in {build_seconds:.1f}s")
+    return build_seconds
+
+
+def read_corpus_info(size):
+    try:
+        with open(os.path.join(corpus_dir(size), "corpus.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+# --- Benchmark groups ---
+def run_read_benchmarks(size):
+    """Retrieval and prompt building against the corpus (read-only)."""
+    os.chdir(corpus_dir(size))
+    with quiet():
+        generator_backend.prepare_retrieval()
+    use_fake_llm()
+    prompts = synthetic_corpus.user_prompts(WARMUP_CALLS + QUERY_CALLS)
+    with quiet():
+        contexts = [generator_backend.get_relevant_activities_for_frontend(prompt, 2, age_group, duration_minutes)
+                    for prompt, age_group, duration_minutes in prompts]
+
+    def end_to_end(prompt, age_group, duration_minutes):
+        context = generator_backend.get_relevant_activities_for_frontend(prompt, 2, age_group, duration_minutes)
+        return generator_backend.generate_activity_with_llm_for_frontend(prompt, duration_minutes, age_group, context,
+                                                                         use_cache=False)
+
+    keyword_calls = [lambda p=p: activity_generator.get_relevant_activities_keyword_based(p, 3) for p, _, _ in prompts]
+    frontend_calls = [lambda p=p, a=a, d=d: generator_backend.get_relevant_activities_for_frontend(p, 2, a, d)
+                      for p, a, d in prompts]
+    prompt_calls = [lambda p=p, a=a, d=d, c=c: generator_backend.build_generation_prompt(p, d, a, c)
+                    for (p, a, d), c in zip(prompts, contexts)]
+    end_to_end_calls = [lambda p=p, a=a, d=d: end_to_end(p, a, d) for p, a, d in prompts]
+    memory = slice(WARMUP_CALLS, WARMUP_CALLS + MEMORY_CALLS)
+    return [
+        measure("retrieval.keyword", keyword_calls, keyword_calls[memory], size),
+        measure("retrieval.frontend", frontend_calls, frontend_calls[memory], size),
+        measure("prompt.build", prompt_calls, prompt_calls[memory], size),
+        measure("generation.end_to_end", end_to_end_calls, end_to_end_calls[memory], size),
+    ]
+
+
+def run_write_benchmarks(size):
+    """Single and batched ingestion (fake LLM parse + insert) into a copy of the corpus."""
+    work_dir = tempfile.mkdtemp(prefix="peulot_benchmark_")
+    try:
+        shutil.copy(os.path.join(corpus_dir(size), peula_db_manager.DB_NAME), work_dir)
+        os.chdir(work_dir)
+        with quiet():
+            peula_db_manager.setup_database()
+        use_fake_llm()
+        next_index = size  # New activities continue the corpus' numbering, so none are stored yet
+
+        def new_activities(count):
+            nonlocal next_index
+            items = synthetic_corpus.activities(next_index, count)
+            next_index += count
+            return items
+
+        def ingest_batch(items):
+            parsed = peula_db_manager.parse_activities_batch_with_gemini(
+                [(item["source_url"], item["games_and_methods"]) for item in items])
+            peula_db_manager.add_activities_bulk([dict(parsed[item["source_url"]] or {}, source_url=item["source_url"],
+                                                       games_and_methods=item["games_and_methods"])
+                                                  for item in items])
+
+        single_calls = [lambda item=item: peula_db_manager.add_activity_to_db(item)
+                        for item in new_activities(WARMUP_CALLS + INGEST_CALLS + MEMORY_CALLS)]
+        batch_calls = [lambda items=items: ingest_batch(items)
+                       for items in (new_activities(INGEST_BATCH_SIZE)
+                                     for _ in range(WARMUP_CALLS + INGEST_BATCHES + MEMORY_CALLS))]
+        return [
+            measure("ingest.single", single_calls[:-MEMORY_CALLS], single_calls[-MEMORY_CALLS:], size),
+            measure("ingest.batch", batch_calls[:-MEMORY_CALLS], batch_calls[-MEMORY_CALLS:], size,
+                    items_per_call=INGEST_BATCH_SIZE),
+        ]
+    finally:
+        os.chdir(BENCHMARKS_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_standalone_benchmarks():
+    """Corpus-independent stages: the worthiness filter and topic extraction from the fixture server."""
+    work_dir = tempfile.mkdtemp(prefix="peulot_benchmark_")
+    try:
+        os.chdir(work_dir)  # No worthiness_model.json here: the heuristic rules are measured
+        posts = synthetic_corpus.forum_posts(WARMUP_CALLS + WORTHINESS_POSTS)
+        worthy_calls = [lambda url=url, text=text: process_scraped_activities.is_activity_worthy(text, url)
+                        for url, text in posts]
+        texts = [text for _, text in posts]
+        batch_calls = [lambda chunk=texts[start:start + WORTHINESS_BATCH_SIZE]: worthiness.score_many(chunk)
+                       for start in range(0, len(texts), WORTHINESS_BATCH_SIZE)]
+
+        base_url, fixture_names, server = fixture_server.start()
+        forum_scraper.REQUESTS_PER_SECOND_PER_HOST = forum_scraper.RATE_LIMIT_BURST = 1e9  # No politeness delay locally
+        topic_urls = [f"{base_url}/topic/{i}/{fixture_names[i % len(fixture_names)]}"
+                      for i in range(WARMUP_CALLS + EXTRACTION_CALLS)]
+        html_calls = [lambda url=url: forum_scraper.extract_activity_from_topic_page(url) for url in topic_urls]
+        api_calls = [lambda url=url: forum_scraper.extract_activity_from_topic_api(url) for url in topic_urls]
+        memory = slice(WARMUP_CALLS, WARMUP_CALLS + MEMORY_CALLS)
+        try:
+            return [
+                measure("worthiness.single", worthy_calls, worthy_calls[memory]),
+                measure("worthiness.batch", batch_calls, batch_calls[:2], items_per_call=WORTHINESS_BATCH_SIZE),
+                measure("extraction.html", html_calls, html_calls[memory]),
+                measure("extraction.api", api_calls, api_calls[memory]),
+            ]
+        finally:
+            server.shutdown()
+    finally:
+        os.chdir(BENCHMARKS_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_worker(group, size, output_path):
+    if group == "build":
+        results = {"build_seconds": build_corpus(size)}
+    elif group == "read":
+        results = run_read_benchmarks(size)
+    elif group == "write":
+        results = run_write_benchmarks(size)
+    else:
+        results = run_standalone_benchmarks()
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+def _spawn_worker(group, size=None):
+    """Runs one benchmark group in a fresh interpreter and returns what it reported."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output_path = f.name
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", group, "--output", output_path]
+        if size is not None:
+            command += ["--size", str(size)]
+        subprocess.run(command, check=True)
+        with open(output_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(output_path)
+
+
+# --- Results ---
+def _git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BENCHMARKS_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _latest_results():
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    return paths[-1] if paths else None
+
+
+def compare(current, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """Prints the p50 change of every benchmark also in the baseline run. Returns the regressed ones."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_by_key = {(result["name"], result["size"]): result for result in baseline["results"]}
+    print(f"\nCompared with {os.path.basename(baseline_path)} ({baseline['meta']['revision']}):")
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_by_key.get((result["name"], result["size"]))
+        if previous is None or not previous["p50_ms"]:
+            continue
+        change = result["p50_ms"] / previous["p50_ms"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        print(f"  {result['name']:<26}{_size_label(result['size']):>7}  p50 {previous['p50_ms']:>9.3f} -> "
+              f"{result['p50_ms']:>9.3f} ms ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])  # The first paragraph
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated corpus sizes (activities)")
+    parser.add_argument("--skip", default="", help="Comma-separated groups to skip: read, write, standalone")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>-<revision>.json)")
+    parser.add_argument("--compare", help="Results file to compare with, or 'latest' for the newest saved run")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help=f"Exit with status 1 if a p50 is more than {REGRESSION_THRESHOLD * 100:.0f}%% slower than --compare")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the cached corpora")
+    parser.add_argument("--worker", choices=("build", "read", "write", "standalone"), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.size, args.output)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    skipped = {group for group in args.skip.split(",") if group}
+    revision = _git_revision()
+    baseline_path = _latest_results() if args.compare == "latest" else args.compare
+    run = {
+        "meta": {
+            "revision": revision,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sizes": sizes,
+        },
+        "corpora": [],
+        "results": [],
+    }
+    for size in sizes:
+        if {"read", "write"} <= skipped:
+            break
+        print(f"\nCorpus of {_size_label(size)} activities:")
+        info = None if args.rebuild else read_corpus_info(size)
+        if info is None:
+            _spawn_worker("build", size)
+            info = dict(read_corpus_info(size), cached=False)
+        else:
+            info = dict(info, cached=True)
+        run["corpora"].append(info)
+        for group in ("read", "write"):
+            if group not in skipped:
+                run["results"] += _spawn_worker(group, size)
+    if "standalone" not in skipped:
+        print("\nCorpus-independent stages:")
+        run["results"] += _spawn_worker("standalone")
+
+    output_path = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+    if baseline_path:
+        regressions = compare(run, baseline_path)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Deterministic synthetic Hebrew forum data for the benchmarks: activity plans shaped like the scraped
+ones (title, goal, timed numbered stages, equipment), non-activity posts, and user prompts.
+Word choice follows a Zipf-like distribution over a fixed vocabulary, so BM25 sees common and rare
+terms, and every activity draws its own word sequence, so none of them are near-duplicates.
+"""
+import random
+
+SEED = 1729
+
+VOCABULARY = (
+    "משחק", "פעילות", "חניכים", "מדריך", "קבוצה", "שבט", "גדוד", "מעגל", "כדור", "חבל", "דגל", "מפה",
+    "מצפן", "שטח", "יער", "מדורה", "אוהל", "תרמיל", "מים", "לילה", "בוקר", "ערב", "שביל", "גבעה",
+    "נחל", "סלע", "עץ", "ענף", "עלה", "פרח", "אבן", "חול", "ים", "חוף", "גשר", "מגדל", "קשר", "לולאה",
+    "יתד", "פנס", "שריקה", "משרוקית", "כרטיס", "פתק", "חידה", "רמז", "אוצר", "מסלול", "תחנה", "משימה",
+    "אתגר", "שיתוף", "אמון", "אחריות", "מנהיגות", "חברות", "ערכים", "זהות", "שייכות", "סבלנות", "כבוד",
+    "הקשבה", "דמיון", "יצירתיות", "תקשורת", "החלטה", "בחירה", "דילמה", "שאלה", "תשובה", "סיפור", "שיר",
+    "ריקוד", "הצגה", "תחפושת", "ציור", "בריסטול", "טושים", "מספריים", "דבק", "נייר", "עיתון", "בלונים",
+    "כוסות", "צלחות", "מגבת", "כיסוי", "עיניים", "שעון", "עצר", "ריצה", "קפיצה", "זחילה", "טיפוס",
+    "איזון", "זריקה", "תפיסה", "מסירה", "שער", "נקודה", "ניקוד", "סיבוב", "שלב", "תור", "זוגות",
+    "שלשות", "צוות", "נציג", "שופט", "מנצח", "פרס", "צ'ופר", "ממתקים", "עוגיות", "שוקולד", "ארטיק",
+    "טבע", "סביבה", "מחזור", "פסולת", "אנרגיה", "אקלים", "בעלי", "חיים", "ציפורים", "חרקים", "פרפרים",
+    "כוכבים", "ירח", "שמש", "עננים", "גשם", "רוח", "קור", "חום", "צל", "אור", "חושך", "רעש", "שקט",
+    "ארץ", "מדינה", "עיר", "כפר", "קיבוץ", "מושב", "שכונה", "בית", "משפחה", "הורים", "אחים", "סבים",
+    "חג", "פסח", "סוכות", "חנוכה", "פורים", "עצמאות", "זיכרון", "מורשת", "היסטוריה", "עתיד", "חלום",
+    "פחד", "שמחה", "עצב", "כעס", "גאווה", "בושה", "הצלחה", "כישלון", "טעות", "ניסיון", "למידה", "ידע",
+    "מדע", "ניסוי", "טכנולוגיה", "מחשב", "טלפון", "מסך", "רשת", "חדשות", "פרסומת", "צרכנות", "כסף",
+    "עבודה", "התנדבות", "תרומה", "עזרה", "קהילה", "שכנים", "זקנים", "ילדים", "נוער", "בוגרים", "צעירים",
+    "מעבר", "שינוי", "התחלה", "סוף", "סיכום", "דיון", "שיחה", "משוב", "רפלקציה", "תובנה", "מסקנה",
+    "להתחלק", "לרוץ", "לעמוד", "לשבת", "לזרוק", "לתפוס", "לחפש", "למצוא", "לבנות", "לפרק", "לצייר",
+    "לכתוב", "לקרוא", "לשיר", "לרקוד", "להציג", "להסביר", "לשאול", "לענות", "לבחור", "להחליט", "לנצח",
+    "מהר", "לאט", "ביחד", "לבד", "בשקט", "בקול", "בעיניים", "עצומות", "פתוחות", "מסביב", "בשורה",
+    "במעגל", "בזוגות", "בקבוצות", "לפי", "הוראות", "הסבר", "כללים", "חוקים", "בטיחות", "זהירות",
+)
+STAGE_NAMES = ("משחק פתיחה", "הסבר המשחק", "חלוקה לקבוצות", "משימה מרכזית", "מתודה", "סיפור", "דיון",
+               "משחק שטח", "תחרות", "הפסקה", "משחק סיום", "סיכום ומשוב")
+AGE_GROUPS = ("כיתות ד-ו", "כיתות ז-ח", "כיתה ט", "גילאי 10-12", "גילאי 12-14", "גילאי 14-15", "שכבה בוגרת",
+              "כיתות ה-ו", "גילאי 16-18")
+DURATIONS = ("45 דקות", "60 דקות", "90 דקות", "שעה וחצי", "שעתיים", "35-40 דקות", "75 דקות", "120 דקות")
+QUESTION_OPENERS = ("מישהו מכיר משחק על", "שאלה: יש למישהו רעיון ל", "מחפש/ת פעולה בנושא", "מה דעתכם על",
+                    "דיון: איך מעבירים", "רעיון ל")
+PROMPT_OPENERS = ("פעולה על", "משחק בנושא", "פעולה לחניכים על", "מתודה ל", "פעולת שטח עם", "ערב בנושא")
+
+ZIPF_EXPONENT = 0.7  # The k-th word is drawn with probability proportional to 1 / (k + 1) ** ZIPF_EXPONENT
+
+_WORD_WEIGHTS = [1.0 / (rank + 1) ** ZIPF_EXPONENT for rank in range(len(VOCABULARY))]
+_CUMULATIVE_WEIGHTS = [sum(_WORD_WEIGHTS[:i + 1]) for i in range(len(_WORD_WEIGHTS))]
+
+
+def _words(rng, count):
+    return " ".join(rng.choices(VOCABULARY, cum_weights=_CUMULATIVE_WEIGHTS, k=count))
+
+
+def _sentence(rng, low=6, high=16):
+    return _words(rng, rng.randint(low, high)) + "."
+
+
+def activity(index, rng=None):
+    """A synthetic activity dict as peula_db_manager stores it (metadata already parsed)."""
+    rng = rng or random.Random(SEED * 1_000_003 + index)
+    topic = f"{rng.choice(PROMPT_OPENERS)} {_words(rng, rng.randint(1, 3))}"
+    age_group = rng.choice(AGE_GROUPS)
+    duration = rng.choice(DURATIONS)
+    materials = rng.sample(VOCABULARY[75:100], rng.randint(1, 4))
+    lines = [topic, f"מטרה: {_sentence(rng)}", f"גיל: {age_group} | משך: {duration}",
+             f"ציוד: {', '.join(materials)}", ""]
+    for stage in range(1, rng.randint(3, 9) + 1):
+        lines.append(f"{stage}. {rng.choice(STAGE_NAMES)} ({rng.choice((5, 10, 15, 20, 25, 30))} דקות)")
+        lines.extend(_sentence(rng) for _ in range(rng.randint(2, 5)))
+        lines.append("")
+    lines.append(f"סיכום: {_sentence(rng)}")
+    return {
+        "topic": topic,
+        "description": _sentence(rng, 10, 24),
+        "games_and_methods": "\n".join(lines),
+        "age_group": age_group,
+        "duration": duration,
+        "materials": materials,
+        "tags": rng.sample(VOCABULARY[:60], 3),
+        "source_url": f"https://forum.example/topic/{index}/synthetic-{index}",
+    }
+
+
+def activities(start, count):
+    """activity(start), ..., activity(start + count - 1): the same items on every run."""
+    return [activity(index) for index in range(start, start + count)]
+
+
+def non_activity_post(index):
+    """A question/discussion post of the kind the worthiness filter should reject."""
+    rng = random.Random(SEED * 2_000_003 + index)
+    lines = [f"{rng.choice(QUESTION_OPENERS)} {_words(rng, rng.randint(1, 3))}?"]
+    lines.extend(_sentence(rng, 4, 12) for _ in range(rng.randint(0, 6)))
+    return "\n".join(lines)
+
+
+def forum_posts(count, activity_share=0.6):
+    """[(source_url, text)] mixing activity plans and other posts, as the scraper hands them to the filter."""
+    rng = random.Random(SEED)
+    posts = []
+    for index in range(count):
+        if rng.random() < activity_share:
+            item = activity(10_000_000 + index)
+            posts.append((item["source_url"], item["games_and_methods"]))
+        else:
+            posts.append((f"https://forum.example/topic/post-{index}", non_activity_post(index)))
+    return posts
+
+
+def user_prompts(count):
+    """[(prompt, age_group or None, duration_minutes or None)] as typed into the frontend."""
+    rng = random.Random(SEED + 1)
+    prompts = []
+    for _ in range(count):
+        prompt = f"{rng.choice(PROMPT_OPENERS)} {_words(rng, rng.randint(1, 4))}"
+        age_group = rng.choice(AGE_GROUPS) if rng.random() < 0.5 else None
+        duration_minutes = rng.choice((45, 60, 90, 120)) if rng.random() < 0.5 else None
+        prompts.append((prompt, age_group, duration_minutes))
+    return prompts
@@ -0,0 +1,147 @@
+import re
+import math
+import hebrew_text
+import llm_scheduler  # Shared token estimate
+
+# --- Configuration ---
+# Estimated tokens of activity text (excerpts) put into one generation prompt; below the ~500 tokens
+# (3 x 500 characters) the prompts took before excerpting
+CONTEXT_TOKEN_BUDGET = 450
+MIN_CHUNK_CHARS = 60  # Shorter pieces (a lone heading, a one-word bullet) are merged into the previous chunk
+MAX_CHUNK_TOKENS = 150  # Longer chunks are split at line / word boundaries
+POSITION_PRIOR = 0.3  # Score bonus of an activity's opening chunk (usually the game explanation), decaying after it
+TIMED_CHUNK_BONUS = 0.2  # Chunks with a time estimate ("15 דקות", "10:00") are the stage plan the model should see
+GAP_MARKER = "..."
+
+# A line that starts a new stage/game: "1." / "א." / "10:00" / "15 דקות" / "- " bullets / "שלב" / "משחק 2"
+STAGE_START_PATTERN = re.compile(
+    r'^\s*(?:\d{1,2}[.)]\s|[א-י][.)]\s|\d{1,2}:\d{2}|\d{1,3}\s*דק|[-*•]\s|שלב\b|משחק\s*\d|מתודה\b)')
+TIMED_PATTERN = re.compile(r'\d{1,3}\s*דק|\d{1,2}:\d{2}|שעה|חצי שעה|רבע שעה')
+
+
+# --- Chunking ---
+def _split_long(chunk, max_chunk_tokens=MAX_CHUNK_TOKENS):
+    """Splits a chunk above max_chunk_tokens at line, then word, boundaries."""
+    max_chars = max_chunk_tokens * llm_scheduler.CHARS_PER_TOKEN_ESTIMATE
+    pieces, current = [], ""
+    for word in re.split(r'(\s+)', chunk):
+        if current and len(current) + len(word) > max_chars and not word.isspace():
+            pieces.append(current.strip())
+            current = ""
+        current += word
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+
+def split_into_chunks(text, max_chunk_tokens=MAX_CHUNK_TOKENS):
+    """
+    Splits an activity's games_and_methods text into stage/game chunks, in their original order.
+    A chunk starts at a blank line, a numbered/timed/bulleted line (the structure is_activity_worthy
+    looks for) or a heading line ending with ':'. Chunks above max_chunk_tokens are split further.
+    """
+    if not text:
+        return []
+    chunks, current = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        starts_stage = not stripped or STAGE_START_PATTERN.match(stripped) or (current and current[-1].endswith(":"))
+        if starts_stage and current:
+            chunks.append("\n".join(current))
+            current = []
+        if stripped:
+            current.append(stripped)
+    if current:
+        chunks.append("\n".join(current))
+
+    merged = []
+    for chunk in chunks:
+        if merged and len(merged[-1]) < MIN_CHUNK_CHARS:
+            merged[-1] += "\n" + chunk
+        else:
+            merged.append(chunk)
+    return [piece for chunk in merged
+            for piece in (_split_long(chunk, max_chunk_tokens)
+                          if llm_scheduler.estimate_tokens(chunk) > max_chunk_tokens else [chunk])]
+
+
+# --- Scoring ---
+def _chunk_terms(chunk):
+    return set(hebrew_text.normalize_text(chunk).split())
+
+
+def score_chunks(user_prompt, chunked_texts):
+    """
+    [[chunk, ...] per activity] -> [[score, ...] per activity]. A chunk scores the IDF (over all the
+    candidate chunks) of each prompt word it contains, in any prefixed form, plus small bonuses for
+    being an activity's opening and for carrying a time estimate.
+    """
+    query_groups = [set(hebrew_text.token_variants(token))
+                    for token in dict.fromkeys(hebrew_text.tokenize(user_prompt))]
+    terms = [[_chunk_terms(chunk) for chunk in chunks] for chunks in chunked_texts]
+    chunk_count = sum(len(chunks) for chunks in chunked_texts)
+    idf = []
+    for group in query_groups:
+        document_frequency = sum(1 for chunks in terms for chunk_terms in chunks if group & chunk_terms)
+        idf.append(math.log(1 + chunk_count / (1 + document_frequency)))
+
+    scores = []
+    for chunks, chunks_terms in zip(chunked_texts, terms):
+        activity_scores = []
+        for position, (chunk, chunk_terms) in enumerate(zip(chunks, chunks_terms)):
+            score = sum(weight for group, weight in zip(query_groups, idf) if group & chunk_terms)
+            score += POSITION_PRIOR / (1 + position)
+            if TIMED_PATTERN.search(chunk):
+                score += TIMED_CHUNK_BONUS
+            activity_scores.append(score)
+        scores.append(activity_scores)
+    return scores
+
+
+# --- Packing ---
+def pack_excerpts(user_prompt, texts, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Picks the chunks of the given activity texts (best retrieved activity first) most relevant to the
+    prompt that fit token_budget, and returns one excerpt per text: its chosen chunks in their original
+    order, with GAP_MARKER where chunks were left out ("" if nothing of it fit).
+    Every activity first gets its best chunk (so each example is represented), then the remaining
+    budget goes to the highest scoring chunks of any activity. Chunks are kept to an even share of a
+    small budget, so that first chunk always fits.
+    """
+    max_chunk_tokens = max(1, min(MAX_CHUNK_TOKENS, token_budget // max(len(texts), 1)))
+    chunked_texts = [split_into_chunks(text, max_chunk_tokens) for text in texts]
+    scores = score_chunks(user_prompt, chunked_texts)
+    costs = [[llm_scheduler.estimate_tokens(chunk) for chunk in chunks] for chunks in chunked_texts]
+    chosen = [set() for _ in texts]
+    remaining = token_budget
+
+    def take(activity, position):
+        nonlocal remaining
+        if position not in chosen[activity] and costs[activity][position] <= remaining:
+            chosen[activity].add(position)
+            remaining -= costs[activity][position]
+
+    for activity, activity_scores in enumerate(scores):
+        if activity_scores:
+            take(activity, max(range(len(activity_scores)), key=lambda position: activity_scores[position]))
+    ranked = sorted(((score, activity, position) for activity, activity_scores in enumerate(scores)
+                     for position, score in enumerate(activity_scores)),
+                    key=lambda item: (-item[0], item[1], item[2]))
+    for _, activity, position in ranked:
+        take(activity, position)
+
+    excerpts = []
+    for chunks, positions in zip(chunked_texts, chosen):
+        parts, previous = [], -1
+        for position in sorted(positions):
+            if position != previous + 1:
+                parts.append(GAP_MARKER)
+            parts.append(chunks[position])
+            previous = position
+        if parts and previous != len(chunks) - 1:
+            parts.append(GAP_MARKER)
+        excerpts.append("\n".join(parts))
+    total_chunks = sum(len(chunks) for chunks in chunked_texts)
+    print(f"Context: Packed {sum(len(positions) for positions in chosen)} of {total_chunks} chunks "
+          f"({token_budget - remaining}/{token_budget} tokens) from {len(texts)} activities.")
+    return excerpts
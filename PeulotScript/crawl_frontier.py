@@ -0,0 +1,124 @@
+import threading
+from datetime import datetime, timezone
+import db
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+MAX_FETCH_ATTEMPTS = 3  # A URL that failed this many times is left in state 'failed' and not retried
+
+# States: 'pending' (to fetch/process), 'done' (fully handled), 'failed' (gave up after MAX_FETCH_ATTEMPTS)
+KIND_FORUM_PAGE = "forum_page"
+KIND_TOPIC = "topic"
+
+_ready_dbs = set()  # DBs whose frontier table was already created by this process
+_ready_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _connect(db_name):
+    conn = db.get_connection(db_name)
+    if db_name not in _ready_dbs:
+        with _ready_lock:
+            setup_frontier(conn.cursor())
+            conn.commit()
+            _ready_dbs.add(db_name)
+    return conn
+
+
+def setup_frontier(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_frontier (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_fetched TEXT,
+            last_error TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_frontier_kind_state ON crawl_frontier (kind, state)")
+
+
+def add_urls(urls, kind, state="pending", db_name=DB_NAME):
+    """Adds URLs that aren't in the frontier yet. Returns how many were new."""
+    _connect(db_name)
+    with db.transaction(db_name) as cursor:
+        cursor.executemany("INSERT OR IGNORE INTO crawl_frontier (url, kind, state) VALUES (?, ?, ?)",
+                           [(url, kind, state) for url in urls])
+        return cursor.rowcount
+
+
+def mark_urls_done(urls, kind, db_name=DB_NAME):
+    """Records URLs as done, adding the ones that aren't in the frontier yet and switching pending ones."""
+    _connect(db_name)
+    with db.transaction(db_name) as cursor:
+        cursor.executemany('''
+            INSERT INTO crawl_frontier (url, kind, state) VALUES (?, ?, 'done')
+            ON CONFLICT (url) DO UPDATE SET state = 'done', last_error = NULL
+        ''', [(url, kind) for url in urls])
+
+
+def get_state(url, db_name=DB_NAME):
+    cursor = _connect(db_name).cursor()
+    cursor.execute("SELECT state FROM crawl_frontier WHERE url = ?", (url,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def get_pending_urls(kind, limit=None, db_name=DB_NAME):
+    """Pending URLs of a kind, oldest first. Includes work left over from interrupted runs."""
+    cursor = _connect(db_name).cursor()
+    cursor.execute("SELECT url FROM crawl_frontier WHERE kind = ? AND state = 'pending' ORDER BY rowid LIMIT ?",
+                   (kind, -1 if limit is None else limit))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _record_failure(cursor, url, error):
+    cursor.execute('''
+        UPDATE crawl_frontier
+        SET attempts = attempts + 1,
+            last_error = ?,
+            state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+        WHERE url = ?
+    ''', (error, MAX_FETCH_ATTEMPTS, url))
+
+
+def record_fetch(url, error=None, db_name=DB_NAME):
+    """
+    Records a fetch. A failed fetch keeps the URL pending until MAX_FETCH_ATTEMPTS failures, then marks it
+    'failed'. A successful fetch leaves the state alone: the URL only becomes 'done' once its content has
+    been processed (mark_done), so a crash in between just refetches it on the next run.
+    """
+    _connect(db_name)
+    with db.transaction(db_name) as cursor:
+        cursor.execute("UPDATE crawl_frontier SET last_fetched = ? WHERE url = ?", (_now(), url))
+        if error is not None:
+            _record_failure(cursor, url, error)
+
+
+def mark_done(url, db_name=DB_NAME):
+    _connect(db_name)
+    with db.transaction(db_name) as cursor:
+        cursor.execute("UPDATE crawl_frontier SET state = 'done', last_error = NULL WHERE url = ?", (url,))
+
+
+def mark_failed(url, error, db_name=DB_NAME):
+    """Processing failed (e.g. Gemini parse); retried on later runs until MAX_FETCH_ATTEMPTS failures."""
+    _connect(db_name)
+    with db.transaction(db_name) as cursor:
+        _record_failure(cursor, url, error)
+
+
+def get_stats(db_name=DB_NAME):
+    """{(kind, state): count} for progress reporting."""
+    cursor = _connect(db_name).cursor()
+    cursor.execute("SELECT kind, state, COUNT(*) FROM crawl_frontier GROUP BY kind, state")
+    return {(kind, state): count for kind, state, count in cursor.fetchall()}
+
+
+if __name__ == "__main__":
+    for (kind, state), count in sorted(get_stats().items()):
+        print(f"{kind:<12} {state:<8} {count}")
@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+import contextlib
+import hebrew_text
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+BUSY_TIMEOUT_SECONDS = 30  # How long a writer waits for another writer's lock before failing
+CACHE_SIZE_KIB = 32768  # Page cache per connection
+MMAP_SIZE_BYTES = 256 * 1024 * 1024  # Reads go through the OS page cache instead of copies
+
+_local = threading.local()  # .connections: {db_name: sqlite3.Connection} for the current thread
+
+
+# --- Connections ---
+def _open(db_name):
+    conn = sqlite3.connect(db_name, timeout=BUSY_TIMEOUT_SECONDS)
+    # WAL lets readers (the Streamlit app) run while the ingest pipeline writes, and makes each
+    # commit an append to the log instead of a rewrite of the journal.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes; WAL only syncs at checkpoints
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Used by the full-text index triggers (activity_index.py), so every writer must have it
+    conn.create_function("hebrew_normalize", 1, hebrew_text.normalize_text, deterministic=True)
+    return conn
+
+
+def get_connection(db_name=DB_NAME):
+    """
+    Returns this thread's long-lived connection to db_name, opening it on first use.
+    Callers must not close it. Set cursor.row_factory (not conn.row_factory) when a query needs
+    sqlite3.Row, since the connection is shared by every module running on this thread.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_name)
+    if conn is None:
+        conn = connections[db_name] = _open(db_name)
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(db_name=DB_NAME):
+    """Yields a cursor; commits when the block ends, rolls back if it raises."""
+    conn = get_connection(db_name)
+    try:
+        yield conn.cursor()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+@contextlib.contextmanager
+def snapshot(db_name=DB_NAME):
+    """
+    Yields a cursor whose queries all see the same state of the DB, even while another process
+    commits (a WAL read transaction). Use it when a COUNT(*) sizes a buffer for a following SELECT.
+    """
+    conn = get_connection(db_name)
+    if conn.in_transaction:  # Already inside the caller's transaction, which is consistent anyway
+        yield conn.cursor()
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn.cursor()
+    finally:
+        conn.commit()
+
+
+def close_connection(db_name=DB_NAME):
+    """Closes this thread's connection to db_name (e.g. before the DB file is replaced)."""
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(db_name, None)
+    if conn is not None:
+        conn.close()
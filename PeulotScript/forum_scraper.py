@@ -1,10 +1,81 @@
-import requests
+import scraper_http  # Shared keep-alive session, retries and conditional-GET cache
+import crawl_frontier  # Persistent crawl state (which pages/topics are pending, done or failed)
+import topic_extractor  # First-post text of a topic page (streaming fast path, BeautifulSoup fallback)
 from bs4 import BeautifulSoup
+import requests
 import time
 import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
 
 BASE_URL = "https://xn--8dbbvwj.net"
-FORUM_URL = BASE_URL + "/forum/20?start=150"  # FINISHED 0-150
+FORUM_URL = BASE_URL + "/forum/20"  # Progress is tracked in the crawl_frontier table, not here
+FORUM_PAGE_URL_TEMPLATE = "{forum_url}?page={page}"  # NodeBB category pagination; page 1 is the forum URL itself
+FORUM_BACKEND = "api"  # "api": NodeBB's JSON API (falls back to HTML per host when unavailable), or "html"
+API_UNAVAILABLE_STATUS_CODES = (401, 403, 404, 405, 501)  # API answers that mean "use the HTML pages instead"
+
+# --- Politeness / Concurrency ---
+MAX_CONCURRENT_FETCHES = 4  # Topic pages fetched in parallel
+REQUESTS_PER_SECOND_PER_HOST = 1.0  # Sustained request rate allowed against a single host
+RATE_LIMIT_BURST = 2  # Requests that may start back-to-back before the rate applies
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may start."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)  # Sleep outside the lock so other hosts/threads aren't blocked
+
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+
+def wait_for_host_slot(url):
+    """Blocks until the per-host rate limit allows another request to url's host."""
+    host = urlsplit(url).netloc
+    with _host_buckets_lock:
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(REQUESTS_PER_SECOND_PER_HOST, RATE_LIMIT_BURST)
+            _host_buckets[host] = bucket
+    bucket.acquire()
+
+
+def topic_url_key(url):
+    """
+    Canonical key of a topic URL, so the same topic matches however its link was written:
+    host-independent, without query/fragment (normalize_href) and without the trailing slug.
+    """
+    path = normalize_href(urlsplit(url).path if url.startswith('http') else url)
+    if not path:
+        return None
+    topic_match = re.search(r'/topic/(\d+)', path)
+    return f"/topic/{topic_match.group(1)}" if topic_match else path.rstrip('/')
+
+
+def get_base_url(page_url):
+    """scheme://host of a page, used to resolve the relative topic links found on it."""
+    parts = urlsplit(page_url)
+    return f"{parts.scheme}://{parts.netloc}" if parts.netloc else BASE_URL
 
 
 def normalize_href(href_path):
@@ -24,12 +95,9 @@ def get_topic_links_from_page(forum_page_url):
     topic_links = []
     try:
         print(f"Scraper: Fetching topic list from: {forum_page_url}")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(forum_page_url, headers=headers, timeout=20)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding
-        soup = BeautifulSoup(response.text, "html.parser")
+        wait_for_host_slot(forum_page_url)
+        page_html = scraper_http.fetch_text(forum_page_url)
+        soup = BeautifulSoup(page_html, "html.parser")
 
         all_page_links = soup.select('a[href*="/topic/"]')
         temp_topic_elements = []
@@ -42,11 +110,12 @@ def get_topic_links_from_page(forum_page_url):
                     link_tag.get_text(strip=True)):
                 temp_topic_elements.append(link_tag)
 
+        base_url = get_base_url(forum_page_url)
         for link_tag in temp_topic_elements:
             raw_href = link_tag.get('href')
             cleaned_href_path = normalize_href(raw_href)
             if cleaned_href_path:
-                full_url = BASE_URL + cleaned_href_path if not cleaned_href_path.startswith(
+                full_url = base_url + cleaned_href_path if not cleaned_href_path.startswith(
                     'http') else cleaned_href_path
                 if full_url not in topic_links:
                     topic_links.append(full_url)
@@ -61,96 +130,245 @@ def get_topic_links_from_page(forum_page_url):
 def extract_activity_from_topic_page(topic_url):
     try:
         print(f"Scraper: Fetching activity from: {topic_url}")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(topic_url, headers=headers, timeout=20)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        first_post_content_div = None
-        all_post_lis = soup.select('li[component="post"]')
-        if all_post_lis:
-            first_post_li = all_post_lis[0]
-            first_post_content_div = first_post_li.select_one('div.content[component="post/content"]')
-            if not first_post_content_div:
-                first_post_content_div = first_post_li.select_one('div.content')
-
-        if not first_post_content_div:
-            first_post_content_div = soup.select_one('div.content[component="post/content"]')
-        if not first_post_content_div:
-            first_post_content_div = soup.select_one('div.content')
-
-        if first_post_content_div:
-            for quote in first_post_content_div.select(
-                    'blockquote.inline-quote, div.quote-container, blockquote[data-username]'):
-                quote.decompose()
-            text_segments = list(first_post_content_div.stripped_strings)
-            activity_text = "\n".join(text_segments)
-            activity_text = re.sub(r'\n\s*\n', '\n\n', activity_text).strip()
-            if len(activity_text) < 50 and ("loading" in activity_text.lower() or "טוען" in activity_text.lower()):
-                return None
-            return activity_text
-        else:
+        wait_for_host_slot(topic_url)
+        page_html = scraper_http.fetch_text(topic_url)
+        activity_text = topic_extractor.extract_first_post_text(page_html)
+        if activity_text is None:
             # For debugging, save the HTML content received by requests
             # filename = "debug_scraper_page_" + topic_url.split("/")[-1].split("?")[0] + ".html"
             # with open(filename, "w", encoding='utf-8') as f_debug:
-            #     f_debug.write(soup.prettify())
+            #     f_debug.write(page_html)
             # print(f"Scraper: Saved HTML for {topic_url} to {filename} due to no content found.")
             print(f"Scraper: Could not find activity content in {topic_url}.")
-            return None
+        return activity_text
     except Exception as e:
         print(f"Scraper: Error fetching/parsing activity from {topic_url}: {e}")
         return None
 
 
-def scrape_forum_for_activities(start_forum_url=FORUM_URL, max_pages=1):
+# --- NodeBB JSON API ---
+# NodeBB serves every page as JSON under /api (/api/category/<cid>, /api/topic/<tid>/<slug>): a fraction of
+# the rendered page's size, with the topic list, the posts' HTML and the category's pagination links.
+
+class ApiUnavailable(Exception):
+    """The host doesn't serve the JSON API (or answers in an unexpected shape); the HTML pages are used instead."""
+
+
+_api_unavailable_hosts = set()
+_api_unavailable_lock = threading.Lock()
+
+
+def api_enabled(url):
+    return FORUM_BACKEND == "api" and urlsplit(url).netloc not in _api_unavailable_hosts
+
+
+def _disable_api(url, error):
+    host = urlsplit(url).netloc
+    with _api_unavailable_lock:
+        if host in _api_unavailable_hosts:
+            return
+        _api_unavailable_hosts.add(host)
+    print(f"Scraper: JSON API unavailable on {host} ({error}), falling back to HTML pages.")
+
+
+def api_url(page_url):
+    """The JSON API URL of a forum page or topic URL (/forum/20?page=2 -> /api/category/20?page=2)."""
+    parts = urlsplit(page_url)
+    path = re.sub(r'^/(?:forum|category)/', '/category/', parts.path)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{get_base_url(page_url)}/api{path}{query}"
+
+
+def fetch_json(page_url):
+    """GETs the API counterpart of page_url. Raises ApiUnavailable if the API isn't served there."""
+    wait_for_host_slot(page_url)
+    try:
+        return json.loads(scraper_http.fetch_text(api_url(page_url)))
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code in API_UNAVAILABLE_STATUS_CODES:
+            raise ApiUnavailable(f"HTTP {e.response.status_code}") from e
+        raise
+    except json.JSONDecodeError as e:
+        raise ApiUnavailable("response is not JSON") from e
+
+
+def get_topic_links_from_api(forum_page_url):
     """
-    Scrapes the forum for activities.
-    Returns a list of tuples: (url, activity_text)
+    Lists a category page through the API. Returns (topic_links, next_page_num): next_page_num is taken from
+    the category's pagination.next link, or None on the last page, so pagination stops without probing
+    past the end.
     """
-    print(f"Scraper: Starting activity extraction from: {start_forum_url}")
-    all_extracted_activities = []  # List of (url, text)
-
-    # Get links from the first page
-    all_topic_urls = get_topic_links_from_page(start_forum_url)
-
-    # Basic pagination attempt (example: /forum/20, /forum/20/page/2 ...)
-    # NodeBB often uses /page/N for pagination
-    if max_pages > 1:
-        for page_num in range(2, max_pages + 1):
-            # Adjust this URL pattern based on actual site pagination
-            paginated_forum_url = f"{start_forum_url}/page/{page_num}"
-            print(f"\nScraper: Fetching topics from paginated URL: {paginated_forum_url}")
-            new_links = get_topic_links_from_page(paginated_forum_url)
-            if not new_links:
-                print(f"Scraper: No new links found on {paginated_forum_url}, stopping pagination.")
-                break
-            for link in new_links:
-                if link not in all_topic_urls:
-                    all_topic_urls.append(link)
-            all_topic_urls = list(set(all_topic_urls))  # Keep unique
-            time.sleep(0.5)  # Be respectful when paginating
+    print(f"Scraper: Fetching topic list (API) from: {forum_page_url}")
+    data = fetch_json(forum_page_url)
+    if not isinstance(data, dict) or not isinstance(data.get("topics"), list):
+        raise ApiUnavailable("no topic list in the category response")
+    base_url = get_base_url(forum_page_url)
+    topic_links = [f"{base_url}/topic/{topic['slug']}" for topic in data["topics"]
+                   if topic.get("slug") and not topic.get("deleted")]
+    next_link = (data.get("pagination") or {}).get("next") or {}
+    next_page_num = next_link.get("page") if next_link.get("active") else None
+    print(f"Scraper: Found {len(topic_links)} topic links on {forum_page_url}")
+    return topic_links, next_page_num
+
+
+def extract_activity_from_topic_api(topic_url):
+    """The first post's text from the topic's JSON (its rendered HTML content), or None if it has none."""
+    print(f"Scraper: Fetching activity (API) from: {topic_url}")
+    data = fetch_json(topic_url)
+    posts = data.get("posts") if isinstance(data, dict) else None
+    if not isinstance(posts, list):
+        raise ApiUnavailable("no posts in the topic response")
+    first_post = next((post for post in posts if post.get("index") == 0 or post.get("pid") == data.get("mainPid")),
+                      posts[0] if posts else None)
+    if not first_post or first_post.get("deleted") or not first_post.get("content"):
+        print(f"Scraper: Could not find activity content in {topic_url}.")
+        return None
+    return topic_extractor.extract_post_content_text(first_post["content"])
+
+
+def list_forum_page(forum_page_url, page_num):
+    """(topic_links, next_page_num) of a forum page, from the API when the host serves it, else from the HTML."""
+    if api_enabled(forum_page_url):
+        try:
+            return get_topic_links_from_api(forum_page_url)
+        except ApiUnavailable as e:
+            _disable_api(forum_page_url, e)
+        except Exception as e:
+            print(f"Scraper: Error fetching topic list (API) from {forum_page_url}: {e}")
+            return [], None
+    topic_links = get_topic_links_from_page(forum_page_url)
+    return topic_links, page_num + 1 if topic_links else None
 
+
+def fetch_topic_activity(topic_url):
+    """The activity text of a topic, from the API when the host serves it, else from the rendered page."""
+    if api_enabled(topic_url):
+        try:
+            return extract_activity_from_topic_api(topic_url)
+        except ApiUnavailable as e:
+            _disable_api(topic_url, e)
+        except Exception as e:
+            print(f"Scraper: Error fetching activity (API) from {topic_url}: {e}")
+            return None
+    return extract_activity_from_topic_page(topic_url)
+
+
+def get_forum_page_url(start_forum_url, page_num):
+    if page_num == 1:
+        return start_forum_url
+    return FORUM_PAGE_URL_TEMPLATE.format(forum_url=start_forum_url, page=page_num)
+
+
+def discover_topics(start_forum_url=FORUM_URL, max_pages=1, known_urls=None, db_name=crawl_frontier.DB_NAME):
+    """
+    Lists up to max_pages forum pages that weren't listed in earlier runs and adds their topics to the
+    crawl frontier. Page 1 is always re-listed (new topics appear there) without counting against max_pages.
+    Topics in known_urls (already in the DB) are recorded as done so they are never fetched.
+    Returns the number of new topics added.
+    """
+    known_keys = {topic_url_key(url) for url in known_urls or []}
+    new_topics = 0
+    listed_pages = 0
+    page_num = 1
+    while page_num and listed_pages < max_pages:
+        page_url = get_forum_page_url(start_forum_url, page_num)
+        already_listed = crawl_frontier.get_state(page_url, db_name) == "done"
+        if already_listed and page_num > 1:
+            page_num += 1
+            continue  # Listed in an earlier run
+        if not already_listed:
+            listed_pages += 1
+        crawl_frontier.add_urls([page_url], crawl_frontier.KIND_FORUM_PAGE, db_name=db_name)
+
+        print(f"\nScraper: Listing topics from forum page {page_num}: {page_url}")
+        page_links, next_page_num = list_forum_page(page_url, page_num)
+        if not page_links:
+            crawl_frontier.record_fetch(page_url, error="no topic links", db_name=db_name)
+            print(f"Scraper: No links found on {page_url}, stopping pagination.")
+            break
+        known_links = [link for link in page_links if topic_url_key(link) in known_keys]
+        crawl_frontier.mark_urls_done(known_links, crawl_frontier.KIND_TOPIC, db_name=db_name)
+        new_topics += crawl_frontier.add_urls([link for link in page_links if link not in known_links],
+                                              crawl_frontier.KIND_TOPIC, db_name=db_name)
+        crawl_frontier.record_fetch(page_url, db_name=db_name)
+        crawl_frontier.mark_done(page_url, db_name=db_name)
+        if next_page_num is None:
+            print(f"Scraper: {page_url} is the last forum page.")
+        page_num = next_page_num
+
+    print(f"Scraper: Added {new_topics} new topics to the crawl frontier.")
+    return new_topics
+
+
+def _fetch_topic(topic_url, db_name):
+    activity_text = fetch_topic_activity(topic_url)
+    crawl_frontier.record_fetch(topic_url, error=None if activity_text else "no activity text", db_name=db_name)
+    return activity_text
+
+
+def iter_forum_activities(start_forum_url=FORUM_URL, max_pages=1, max_concurrency=MAX_CONCURRENT_FETCHES,
+                          known_urls=None, db_name=crawl_frontier.DB_NAME):
+    """
+    Scrapes the forum for activities, resuming from the crawl frontier stored in the DB, and yields
+    (url, activity_text) as soon as each topic page is fetched (in completion order).
+    New forum pages are listed first (discover_topics), then every pending topic is fetched, including
+    topics left over from an interrupted run. Topics stay pending until the caller marks them done
+    (crawl_frontier.mark_done) after processing, so the crawl is safe to kill at any point.
+    Up to max_concurrency fetches run in parallel, and at most 2 * max_concurrency results are held while
+    the consumer is busy, so a slow consumer slows the crawl down instead of filling memory.
+    The per-host token bucket (REQUESTS_PER_SECOND_PER_HOST) keeps the total request rate polite.
+    """
+    print(f"Scraper: Starting activity extraction from: {start_forum_url}")
+    discover_topics(start_forum_url, max_pages, known_urls, db_name)
+    all_topic_urls = crawl_frontier.get_pending_urls(crawl_frontier.KIND_TOPIC, db_name=db_name)
+    # A pending topic can already be stored (e.g. a run stopped between the insert and mark_done): never refetch it
+    known_keys = {topic_url_key(url) for url in known_urls or []}
+    known_pending = [url for url in all_topic_urls if topic_url_key(url) in known_keys]
+    if known_pending:
+        crawl_frontier.mark_urls_done(known_pending, crawl_frontier.KIND_TOPIC, db_name=db_name)
+        all_topic_urls = [url for url in all_topic_urls if topic_url_key(url) not in known_keys]
     if not all_topic_urls:
-        print("Scraper: No topic URLs found. Exiting.")
-        return all_extracted_activities
+        print("Scraper: No pending topic URLs. Exiting.")
+        return
+
+    max_concurrency = max(1, max_concurrency)
+    print(f"\nScraper: Total pending topic URLs to process: {len(all_topic_urls)} "
+          f"(up to {max_concurrency} concurrent fetches)")
+    extracted_count = 0
+    pending_urls = iter(all_topic_urls)
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="scraper") as executor:
+        in_flight = {}  # future -> url
 
-    print(f"\nScraper: Total unique topic URLs to process: {len(all_topic_urls)}")
-    for i, url in enumerate(all_topic_urls):
-        print(f"\nScraper: Processing URL {i + 1}/{len(all_topic_urls)}: {url}")
-        activity_text = extract_activity_from_topic_page(url)
-        if activity_text:
-            all_extracted_activities.append((url, activity_text))
-        else:
-            print(f"Scraper: No activity text extracted from {url}")
+        def submit_next():
+            url = next(pending_urls, None)
+            if url is not None:
+                in_flight[executor.submit(_fetch_topic, url, db_name)] = url
 
-        if i < len(all_topic_urls) - 1:
-            time.sleep(1)  # Be respectful to the server
+        for _ in range(2 * max_concurrency):
+            submit_next()
+        while in_flight:
+            done_futures, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                url = in_flight.pop(future)
+                submit_next()
+                activity_text = future.result()
+                if activity_text:
+                    extracted_count += 1
+                    yield url, activity_text
+                else:
+                    print(f"Scraper: No activity text extracted from {url}")
 
     print(
-        f"\nScraper: Finished processing. Found {len(all_extracted_activities)} potential activities from {len(all_topic_urls)} topics.")
-    return all_extracted_activities
+        f"\nScraper: Finished processing. Found {extracted_count} potential activities from {len(all_topic_urls)} topics.")
+
+
+def scrape_forum_for_activities(start_forum_url=FORUM_URL, max_pages=1, max_concurrency=MAX_CONCURRENT_FETCHES,
+                                known_urls=None, db_name=crawl_frontier.DB_NAME):
+    """
+    Scrapes the forum for activities (see iter_forum_activities).
+    Returns a list of tuples: (url, activity_text)
+    """
+    return list(iter_forum_activities(start_forum_url, max_pages, max_concurrency, known_urls, db_name))
 
 
 if __name__ == "__main__":
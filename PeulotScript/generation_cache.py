@@ -0,0 +1,105 @@
+import re
+import time
+import threading
+import collections
+import numpy as np
+import vector_store
+
+# --- Configuration ---
+GENERATION_CACHE_MAX_ENTRIES = 256  # Least recently used answers beyond this are dropped
+GENERATION_CACHE_TTL_SECONDS = 6 * 3600
+# Near-duplicate lookup is off: the lexical HashingEmbedder scores "...שתהיה מאתגרת" and "...שלא תהיה מאתגרת"
+# at 0.93. Enable it only with a semantic embedder and a threshold validated on real prompts.
+NEAR_DUPLICATE_MIN_SIMILARITY = None  # Cosine similarity of the prompts; None means exact-key lookups only
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def normalize_prompt(user_prompt):
+    """Case/whitespace/punctuation-insensitive form of the prompt, used for exact matches."""
+    return " ".join(re.findall(r'\w+', (user_prompt or "").lower()))
+
+
+class GenerationCache:
+    """
+    In-process cache of generated activities, keyed by (prompt, duration, age).
+    A lookup tries the exact (normalized) prompt; with min_similarity and a semantic embedder
+    (vector_store embedder interface) it then tries the most similar cached prompt with the same duration
+    and age. Entries expire after ttl_seconds, and the least recently used ones are dropped beyond
+    max_entries.
+    """
+
+    def __init__(self, max_entries=GENERATION_CACHE_MAX_ENTRIES, ttl_seconds=GENERATION_CACHE_TTL_SECONDS,
+                 min_similarity=NEAR_DUPLICATE_MIN_SIMILARITY, embedder=None):
+        if min_similarity is not None and (embedder is None or isinstance(embedder, vector_store.HashingEmbedder)):
+            raise ValueError("Near-duplicate lookup needs a semantic embedder; lexical similarity ignores negation.")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._embedder = embedder if min_similarity is not None else None
+        self._entries = collections.OrderedDict()  # key -> (created_at, text, prompt_vector), LRU order
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "near_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(user_prompt, user_duration_minutes, user_age_pref):
+        return normalize_prompt(user_prompt), user_duration_minutes, user_age_pref
+
+    def _expire(self, now):
+        expired = [key for key, (created_at, _, _) in self._entries.items() if now - created_at > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, user_prompt, user_duration_minutes=None, user_age_pref=None):
+        """Returns the cached activity text for this request (or a near-identical one), or None."""
+        key = self._key(user_prompt, user_duration_minutes, user_age_pref)
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry[1]
+            candidates = [(k, e) for k, e in self._entries.items() if k[1:] == key[1:]]
+        if self._embedder is not None and candidates and key[0]:
+            query_vector = self._embedder.embed([key[0]])[0]
+            similarities = np.stack([e[2] for _, e in candidates]) @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.min_similarity:
+                best_key, best_entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.stats["near_hits"] += 1
+                print(f"GenerationCache: Near-duplicate hit (similarity {similarities[best]:.3f}).")
+                return best_entry[1]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, user_prompt, user_duration_minutes, user_age_pref, generated_text):
+        key = self._key(user_prompt, user_duration_minutes, user_age_pref)
+        prompt_vector = self._embedder.embed([key[0]])[0] if self._embedder is not None else None
+        with self._lock:
+            self._entries[key] = (time.time(), generated_text, prompt_vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_generation_cache():
+    """Returns the process-wide cache (shared by all Streamlit sessions in this server process)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GenerationCache()
+    return _cache
@@ -2,15 +2,20 @@ import sqlite3
 import json
 import os
 from dotenv import load_dotenv
-from llama_index.llms.gemini import Gemini  # Or your preferred Gemini SDK
 import random
 import re
 import time  # For simulating delay
+import db
+import retrieval
+import llm_provider
+import generation_cache
+import context_builder
 
 # --- Configuration ---
 DB_NAME = "scout_activities.db"  # Make sure this path is correct relative to where you run streamlit
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+GENERATION_MODEL_NAME = "models/gemini-2.0-flash"
 
 
 # --- Database Interaction (Simplified for frontend example) ---
@@ -22,71 +27,56 @@ def get_all_activities_from_db_simplified():
     if not os.path.exists(DB_NAME):
         print("Backend: Database file not found. Cannot retrieve activities.")
         return []
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    cursor = db.get_connection(DB_NAME).cursor()
+    cursor.row_factory = sqlite3.Row
     # Fetch a few random activities for demo context
     cursor.execute(
         "SELECT id, topic, description, games_and_methods, age_group, duration, source_url FROM scout_activities ORDER BY RANDOM() LIMIT 3")
     activities = cursor.fetchall()
-    conn.close()
     if activities:
         print(f"Backend: Loaded {len(activities)} sample activities for context.")
     return activities
 
 
-def get_relevant_activities_for_frontend(user_prompt, num_to_retrieve=2):
+def prepare_retrieval():
+    """Builds/opens the retrieval indexes once per process (see retrieval.prepare_retrieval)."""
+    return retrieval.prepare_retrieval(DB_NAME)
+
+
+def get_relevant_activities_for_frontend(user_prompt, num_to_retrieve=2, user_age_pref=None,
+                                         user_duration_minutes=None):
     """
-    Placeholder for RAG. Returns a formatted string of context.
-    In a real app, this would use your actual RAG implementation.
+    Retrieves the best matching activities with the hybrid ranker (BM25 + embeddings, fused), restricted
+    to the requested age group and duration when given. Returns a formatted string of context.
     """
-    # This is a MOCK RAG. Replace with your actual retrieval.
     print(f"Backend: Getting relevant activities for prompt: '{user_prompt[:50]}...'")
-    # For now, let's just get a couple of random activities from the DB as context
-    # Ideally, you'd use your keyword-based or embedding-based retrieval here.
-    all_activities = get_all_activities_from_db_simplified()
-    if not all_activities:
+    if not os.path.exists(DB_NAME):
         return "לא נמצאו דוגמאות רלוונטיות במאגר."
 
-    # Very basic keyword matching for demo
-    prompt_keywords = set(user_prompt.lower().split())
-    scored_activities = []
-    for act in all_activities:
-        activity_text = f"{act['topic']} {act['description']} {act['games_and_methods']}"
-        activity_keywords = set(activity_text.lower().split())
-        common = len(prompt_keywords.intersection(activity_keywords))
-        scored_activities.append((common, act))
-
-    scored_activities.sort(key=lambda x: x[0], reverse=True)
-
-    relevant_ones = [act for score, act in scored_activities[:num_to_retrieve] if score > 0]
-    if not relevant_ones and all_activities:  # if no good match, take some random ones
-        relevant_ones = random.sample(all_activities, min(num_to_retrieve, len(all_activities)))
+    relevant_ones = retrieval.retrieve(user_prompt, k=num_to_retrieve, user_age_pref=user_age_pref,
+                                       user_duration_minutes=user_duration_minutes, db_name=DB_NAME)
+    if not relevant_ones:  # if no good match, take some random ones
+        relevant_ones = get_all_activities_from_db_simplified()[:num_to_retrieve]
 
     context_str = "להלן מספר פעולות מהמאגר שיכולות לשמש כהשראה:\n\n"
     if relevant_ones:
-        for i, act in enumerate(relevant_ones):
+        # The stages/games most relevant to the prompt, instead of the first N characters of each activity
+        # 130 tokens keeps the frontend's prompt at its old size (2 x 200 characters were ~133)
+        excerpts = context_builder.pack_excerpts(user_prompt, [act['games_and_methods'] for act in relevant_ones],
+                                                 token_budget=130)
+        for i, (act, excerpt) in enumerate(zip(relevant_ones, excerpts)):
             context_str += f"--- דוגמה {i + 1} ---\n"
             context_str += f"נושא: {act['topic']}\n"
             # context_str += f"תיאור קצר: {act['description']}\n"
-            context_str += f"תקציר משחקים:\n{act['games_and_methods'][:200]}...\n"
+            if excerpt:
+                context_str += f"תקציר משחקים:\n{excerpt}\n"
             context_str += "---------------------------------\n\n"
         return context_str
     return "לא סופקו דוגמאות קונקרטיות מהמאגר (או שלא נמצאו רלוונטיות)."
 
 
-def generate_activity_with_llm_for_frontend(user_prompt, user_duration_minutes=None, user_age_pref=None,
-                                            relevant_activities_context=""):
-    print(f"Backend: Called generate_activity_with_llm_for_frontend for prompt: '{user_prompt[:50]}...'")
-    if not GEMINI_API_KEY:
-        return "שגיאה: מפתח ה-API של Gemini אינו מוגדר."
-    try:
-        # Ensure LlamaIndex's Gemini is used if that's your setup
-        from llama_index.llms.gemini import Gemini
-        llm = Gemini(api_key=GEMINI_API_KEY, model_name="models/gemini-2.0-flash")
-    except Exception as e:
-        return f"שגיאה ביצירת חיבור ל-Gemini: {e}"
-
+def build_generation_prompt(user_prompt, user_duration_minutes=None, user_age_pref=None,
+                            relevant_activities_context=""):
     target_duration_text = f"{user_duration_minutes} דקות" if user_duration_minutes else "כ-120 דקות (שעתיים)"
     target_age_text = user_age_pref if user_age_pref else "גילאי 14-15 (כיתות ט-י)"
 
@@ -122,6 +112,44 @@ def generate_activity_with_llm_for_frontend(user_prompt, user_duration_minutes=N
 
     **תוכנית הפעולה המפורטת:**
     """
+    return prompt
+
+
+class GenerationError(str):
+    """
+    An error message returned (or yielded) in place of activity text. Still a str, so it can be shown as is;
+    callers tell it apart with isinstance, never by its wording, and it is never cached.
+    """
+
+
+def get_cached_activity(user_prompt, user_duration_minutes=None, user_age_pref=None):
+    """A previously generated activity for the same (or a near-identical) request, or None."""
+    return generation_cache.get_generation_cache().get(user_prompt, user_duration_minutes, user_age_pref)
+
+
+def _cache_generated_activity(user_prompt, user_duration_minutes, user_age_pref, generated_text):
+    """Stores a successfully generated activity (callers never pass a GenerationError)."""
+    if generated_text:
+        generation_cache.get_generation_cache().put(user_prompt, user_duration_minutes, user_age_pref,
+                                                    generated_text)
+
+
+def generate_activity_with_llm_for_frontend(user_prompt, user_duration_minutes=None, user_age_pref=None,
+                                            relevant_activities_context="", use_cache=True):
+    print(f"Backend: Called generate_activity_with_llm_for_frontend for prompt: '{user_prompt[:50]}...'")
+    if use_cache:
+        cached_text = get_cached_activity(user_prompt, user_duration_minutes, user_age_pref)
+        if cached_text is not None:
+            print("Backend: Serving activity from the generation cache.")
+            return cached_text
+    if not llm_provider.is_configured():
+        return GenerationError("שגיאה: מפתח ה-API של Gemini אינו מוגדר.")
+    try:
+        llm = llm_provider.get_llm(GENERATION_MODEL_NAME)  # Shared client, reused across sessions
+    except Exception as e:
+        return GenerationError(f"שגיאה ביצירת חיבור ל-Gemini: {e}")
+
+    prompt = build_generation_prompt(user_prompt, user_duration_minutes, user_age_pref, relevant_activities_context)
     print(f"Backend: Sending prompt to Gemini (length: {len(prompt)} chars)")
     try:
         # Simulate network delay for LLM call for better UX in Streamlit
@@ -129,10 +157,48 @@ def generate_activity_with_llm_for_frontend(user_prompt, user_duration_minutes=N
         response = llm.complete(prompt)
         generated_text = response.text.strip()
         print(f"Backend: Received response from Gemini (length: {len(generated_text)} chars)")
+        _cache_generated_activity(user_prompt, user_duration_minutes, user_age_pref, generated_text)
         return generated_text
     except Exception as e:
         print(f"Backend: Gemini API call error: {e}")
-        return f"שגיאה במהלך יצירת הפעולה מול Gemini: {e}"
+        return GenerationError(f"שגיאה במהלך יצירת הפעולה מול Gemini: {e}")
+
+
+def stream_activity_with_llm_for_frontend(user_prompt, user_duration_minutes=None, user_age_pref=None,
+                                          relevant_activities_context=""):
+    """
+    Same as generate_activity_with_llm_for_frontend, but yields the text in chunks as Gemini produces them
+    (via the LLM's stream_complete), so the UI can render from the first token.
+    Errors are yielded as a GenerationError chunk, like the non-streaming version returns them.
+    Only a completed stream is stored in the generation cache; callers check get_cached_activity() first.
+    """
+    print(f"Backend: Called stream_activity_with_llm_for_frontend for prompt: '{user_prompt[:50]}...'")
+    if not llm_provider.is_configured():
+        yield GenerationError("שגיאה: מפתח ה-API של Gemini אינו מוגדר.")
+        return
+    try:
+        llm = llm_provider.get_llm(GENERATION_MODEL_NAME)
+    except Exception as e:
+        yield GenerationError(f"שגיאה ביצירת חיבור ל-Gemini: {e}")
+        return
+
+    prompt = build_generation_prompt(user_prompt, user_duration_minutes, user_age_pref, relevant_activities_context)
+    print(f"Backend: Streaming prompt to Gemini (length: {len(prompt)} chars)")
+    chunks = []
+    try:
+        for response in llm.stream_complete(prompt):
+            chunk = response.delta or ""
+            if not chunks:
+                chunk = chunk.lstrip()  # Match the .strip() of the non-streaming result
+            if chunk:
+                chunks.append(chunk)
+                yield chunk
+        generated_text = "".join(chunks).strip()
+        print(f"Backend: Finished streaming response from Gemini (length: {len(generated_text)} chars)")
+        _cache_generated_activity(user_prompt, user_duration_minutes, user_age_pref, generated_text)
+    except Exception as e:
+        print(f"Backend: Gemini API streaming error: {e}")
+        yield GenerationError(f"\n\nשגיאה במהלך יצירת הפעולה מול Gemini: {e}")
 
 
 # You can add simplified versions of other functions if needed by the orchestrator
@@ -0,0 +1,37 @@
+import re
+
+# --- Configuration ---
+TOKEN_PATTERN = re.compile(r'\w+')
+NIQQUD_PATTERN = re.compile(r'[֑-ׇ]')  # Cantillation marks and vowel points
+HEBREW_LETTERS = re.compile(r'^[א-ת]+$')
+PREFIX_LETTERS = frozenset("והבלמשכ")  # ו/ה/ב/ל/מ/ש/כ attach to the next word ("והמשחק" = "and the game")
+MIN_STEM_LENGTH = 3  # Never strip a word below this, so short roots ("בית") are left alone
+
+
+def token_variants(token):
+    """
+    The token plus each form with 1..n leading prefix letters removed (Hebrew words only):
+    "והמשחק" -> ["והמשחק", "המשחק", "משחק", "שחק"]. Indexing and querying with the same variants lets
+    "משחק" match "המשחק"/"במשחק" without knowing which leading letters really are prefixes.
+    """
+    variants = [token]
+    if HEBREW_LETTERS.match(token):
+        while len(token) > MIN_STEM_LENGTH and token[0] in PREFIX_LETTERS:
+            token = token[1:]
+            variants.append(token)
+    return variants
+
+
+def tokenize(text):
+    """Lowercase word tokens with niqqud removed."""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(NIQQUD_PATTERN.sub("", text.lower()))
+
+
+def normalize_text(text):
+    """
+    Space-separated tokens and their prefix-stripped variants; this is what the full-text index stores.
+    Registered as the SQL function hebrew_normalize() on every db connection.
+    """
+    return " ".join(variant for token in tokenize(text) for variant in token_variants(token))
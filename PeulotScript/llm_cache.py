@@ -0,0 +1,166 @@
+import sqlite3
+import json
+import time
+import hashlib
+import threading
+import db
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+LLM_CACHE_MAX_ENTRIES = 20000  # Least recently used entries beyond this are evicted
+LLM_CACHE_MAX_AGE_DAYS = 180  # Older entries are ignored on lookup and evicted
+EVICT_EVERY_N_STORES = 100
+TOUCH_FLUSH_EVERY_N_ENTRIES = 50  # Hit entries whose hits/last_used_at updates are written in one transaction
+
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}  # For this process
+_counters_lock = threading.Lock()
+_ready_dbs = set()  # DBs whose cache table was already created by this process
+_ready_lock = threading.Lock()
+# Lookups don't write: hits are collected here, {db_name: {key: [hits, last_used_at]}}, and written by
+# flush_touches() in batches, before a store, eviction or stats read. Touches not flushed when the process
+# exits are lost, which only leaves the LRU order and hit counts slightly stale.
+_pending_touches = {}
+_touches_lock = threading.Lock()
+
+
+def _count(key, amount=1):
+    with _counters_lock:
+        _counters[key] += amount
+        return _counters[key]
+
+
+def _connect(db_name):
+    conn = db.get_connection(db_name)
+    if db_name not in _ready_dbs:
+        with _ready_lock:
+            setup_cache(conn.cursor())
+            conn.commit()
+            _ready_dbs.add(db_name)
+    return conn
+
+
+def setup_cache(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_parse_cache (
+            model_name TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            input_sha256 TEXT NOT NULL,
+            response_json TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (model_name, prompt_version, input_sha256)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_parse_cache_last_used ON llm_parse_cache (last_used_at)")
+
+
+def input_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+# --- Lookup / Store ---
+def get_cached_parse(model_name, prompt_version, full_activity_input, db_name=DB_NAME):
+    """Returns the cached parsed metadata dict for this exact input, model and prompt version, or None."""
+    key = (model_name, prompt_version, input_hash(full_activity_input))
+    min_created_at = time.time() - LLM_CACHE_MAX_AGE_DAYS * 86400
+    try:
+        cursor = _connect(db_name).cursor()
+        cursor.execute('''
+            SELECT response_json FROM llm_parse_cache
+            WHERE model_name = ? AND prompt_version = ? AND input_sha256 = ? AND created_at >= ?
+        ''', (*key, min_created_at))
+        row = cursor.fetchone()
+        if row is None:
+            _count("misses")
+            return None
+        _touch(key, db_name)
+        _count("hits")
+        return json.loads(row[0])
+    except (sqlite3.Error, json.JSONDecodeError) as e:
+        print(f"LLMCache: Lookup failed: {e}")
+        _count("misses")
+        return None
+
+
+def _touch(key, db_name):
+    with _touches_lock:
+        touches = _pending_touches.setdefault(db_name, {})
+        touch = touches.setdefault(key, [0, 0.0])
+        touch[0] += 1
+        touch[1] = time.time()
+        flush = len(touches) >= TOUCH_FLUSH_EVERY_N_ENTRIES
+    if flush:
+        flush_touches(db_name)
+
+
+def flush_touches(db_name=DB_NAME):
+    """Writes the hits and last-used times collected by lookups since the last flush."""
+    with _touches_lock:
+        touches = _pending_touches.pop(db_name, {})
+    if not touches:
+        return
+    try:
+        with db.transaction(db_name) as cursor:
+            cursor.executemany('''
+                UPDATE llm_parse_cache SET hits = hits + ?, last_used_at = MAX(last_used_at, ?)
+                WHERE model_name = ? AND prompt_version = ? AND input_sha256 = ?
+            ''', [(hits, last_used_at, *key) for key, (hits, last_used_at) in touches.items()])
+    except sqlite3.Error as e:
+        print(f"LLMCache: Could not record {len(touches)} cache hits: {e}")
+
+
+def store_parse(model_name, prompt_version, full_activity_input, parsed_data, db_name=DB_NAME):
+    """Stores a successful parse. Every EVICT_EVERY_N_STORES stores, old/excess entries are evicted."""
+    now = time.time()
+    _connect(db_name)
+    flush_touches(db_name)
+    try:
+        with db.transaction(db_name) as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO llm_parse_cache
+                    (model_name, prompt_version, input_sha256, response_json, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (model_name, prompt_version, input_hash(full_activity_input),
+                  json.dumps(parsed_data, ensure_ascii=False), now, now))
+    except sqlite3.Error as e:
+        print(f"LLMCache: Store failed: {e}")
+        return
+    if _count("stores") % EVICT_EVERY_N_STORES == 0:
+        evict(db_name=db_name)
+
+
+# --- Eviction ---
+def evict(max_entries=LLM_CACHE_MAX_ENTRIES, max_age_days=LLM_CACHE_MAX_AGE_DAYS, db_name=DB_NAME):
+    """Deletes entries older than max_age_days, then the least recently used beyond max_entries."""
+    _connect(db_name)
+    flush_touches(db_name)
+    with db.transaction(db_name) as cursor:
+        cursor.execute("DELETE FROM llm_parse_cache WHERE created_at < ?", (time.time() - max_age_days * 86400,))
+        evicted = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM llm_parse_cache WHERE rowid IN (
+                SELECT rowid FROM llm_parse_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+        evicted += cursor.rowcount
+    if evicted:
+        _count("evicted", evicted)
+        print(f"LLMCache: Evicted {evicted} cache entries.")
+    return evicted
+
+
+def get_stats(db_name=DB_NAME):
+    """This process's hit/miss/store/evict counters, plus the entry count and lifetime hits in the DB."""
+    with _counters_lock:
+        stats = dict(_counters)
+    cursor = _connect(db_name).cursor()
+    flush_touches(db_name)
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_parse_cache")
+    stats["entries"], stats["lifetime_hits"] = cursor.fetchone()
+    return stats
+
+
+if __name__ == "__main__":
+    for key, value in get_stats().items():
+        print(f"{key:<14} {value}")
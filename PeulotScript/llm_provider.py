@@ -0,0 +1,138 @@
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+
+# --- Configuration ---
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini", or "fake" for offline runs/tests
+
+_clients = {}  # (model_name, api_key) -> client, one per model for the whole process
+_clients_lock = threading.Lock()
+_backend_factory = None  # Set by set_llm_backend(); None means the LLM_BACKEND default
+
+
+# --- Backends ---
+def _gemini_factory(model_name, api_key):
+    # Imported lazily so the fake backend works without llama-index installed
+    from llama_index.llms.gemini import Gemini
+    return Gemini(api_key=api_key, model_name=model_name)
+
+
+class FakeCompletion:
+    """Mimics the fields of LlamaIndex's CompletionResponse that this project reads."""
+
+    def __init__(self, text, delta=None):
+        self.text = text
+        self.delta = delta
+
+
+class FakeRateLimitError(Exception):
+    """What FakeLLM raises to simulate an HTTP 429 / quota-exhausted answer."""
+    status_code = 429
+
+    def __init__(self, message="429 Resource has been exhausted (e.g. check quota).", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FakeLLM:
+    """
+    Local stand-in for the Gemini client, for tests and offline runs.
+    `responder(prompt) -> str` produces the answer; `latency_seconds` simulates the network round trip
+    (plus up to `latency_jitter_seconds` at random), and `rate_limit_rate` is the fraction of calls that
+    fail with FakeRateLimitError instead of answering.
+    """
+
+    def __init__(self, model_name="fake", responder=None, latency_seconds=0.0, latency_jitter_seconds=0.0,
+                 rate_limit_rate=0.0, seed=None):
+        self.model_name = model_name
+        self.responder = responder or (lambda prompt: "{}")
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self.rate_limited_calls = 0
+        self._random = random.Random(seed)
+        self._calls_lock = threading.Lock()
+
+    def _respond(self, prompt):
+        with self._calls_lock:
+            self.calls += 1
+            latency = self.latency_seconds + self._random.uniform(0, self.latency_jitter_seconds)
+            rate_limited = self._random.random() < self.rate_limit_rate
+            if rate_limited:
+                self.rate_limited_calls += 1
+        if latency:
+            time.sleep(latency)
+        if rate_limited:
+            raise FakeRateLimitError()
+        return self.responder(prompt)
+
+    def complete(self, prompt, **kwargs):
+        return FakeCompletion(self._respond(prompt))
+
+    def stream_complete(self, prompt, chunk_size=40, **kwargs):
+        text = self._respond(prompt)
+        for end in range(chunk_size, len(text) + chunk_size, chunk_size):
+            yield FakeCompletion(text[:end], delta=text[end - chunk_size:end])
+
+
+def set_llm_backend(factory):
+    """
+    Replaces the client factory, e.g. set_llm_backend(lambda model_name, api_key: FakeLLM(model_name)).
+    Passing None restores the default. Already-created clients are dropped.
+    """
+    global _backend_factory
+    with _clients_lock:
+        _backend_factory = factory
+        _clients.clear()
+
+
+def use_fake_llm(responder=None, latency_seconds=0.0, **fake_options):
+    """
+    Routes every get_llm() call to FakeLLM instances with the given responder.
+    fake_options are passed to FakeLLM (latency_jitter_seconds, rate_limit_rate, seed).
+    """
+    set_llm_backend(lambda model_name, api_key: FakeLLM(model_name, responder, latency_seconds, **fake_options))
+
+
+def is_fake_backend():
+    return _backend_factory is not None or LLM_BACKEND == "fake"
+
+
+def is_configured():
+    """True if get_llm() can produce a working client (an API key is set, or a fake backend is active)."""
+    return bool(GEMINI_API_KEY) or is_fake_backend()
+
+
+# --- Client Access ---
+def get_llm(model_name, api_key=None):
+    """
+    Returns the shared client for model_name, creating it on first use.
+    Reusing one client per model keeps its HTTP/gRPC connections open between calls instead of paying
+    client setup and a new connection on every request. Creation is serialized by a lock; the
+    underlying Gemini transport is safe to use from several threads.
+    """
+    api_key = api_key or GEMINI_API_KEY
+    key = (model_name, api_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            factory = _backend_factory
+            if factory is None:
+                factory = _gemini_factory if LLM_BACKEND != "fake" else (lambda name, _: FakeLLM(name))
+            client = factory(model_name, api_key)
+            _clients[key] = client
+        return client
+
+
+def reset_llm_clients():
+    """Drops all cached clients (they are recreated on the next get_llm call)."""
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,174 @@
+import time
+import random
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+LLM_MAX_IN_FLIGHT = 4  # Concurrent Gemini requests across the whole process
+LLM_REQUESTS_PER_MINUTE = 15  # Gemini free-tier default; None disables the limit
+LLM_TOKENS_PER_MINUTE = 1000000  # Estimated prompt + response tokens; None disables the limit
+RESPONSE_TOKENS_ESTIMATE = 500  # Reserved per request for the answer (metadata JSON is short)
+CHARS_PER_TOKEN_ESTIMATE = 3  # Rough average for Hebrew text
+MAX_RATE_LIMIT_RETRIES = 5
+BACKOFF_BASE_SECONDS = 2.0  # Waits ~2s, 4s, 8s, ... after each quota error (with jitter)
+BACKOFF_MAX_SECONDS = 60.0
+RATE_WINDOW_SECONDS = 60.0
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN_ESTIMATE + 1
+
+
+def is_rate_limit_error(exc):
+    """
+    True for HTTP 429 / RESOURCE_EXHAUSTED errors, whichever client library raised them (also when wrapped
+    by another exception). Matched on the status or the error type only: other errors that merely
+    mention a quota in their message (e.g. an invalid or disabled key) are not worth retrying.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        for attr in ("status_code", "code", "status"):
+            value = getattr(exc, attr, None)
+            if value in (429, "429", "RESOURCE_EXHAUSTED") or getattr(value, "name", None) == "RESOURCE_EXHAUSTED":
+                return True
+        if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls from many threads while keeping the process under the API's limits:
+    at most `max_in_flight` concurrent requests, `requests_per_minute` and `tokens_per_minute` over a
+    sliding one-minute window, and exponential backoff (shared by all callers) when the API still
+    answers with a quota error.
+    """
+
+    def __init__(self, max_in_flight=LLM_MAX_IN_FLIGHT, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=LLM_TOKENS_PER_MINUTE, max_retries=MAX_RATE_LIMIT_RETRIES,
+                 backoff_base_seconds=BACKOFF_BASE_SECONDS, backoff_max_seconds=BACKOFF_MAX_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._cond = threading.Condition()
+        self._window = collections.deque()  # (monotonic start time, reserved tokens) per request
+        self._window_tokens = 0
+        self._pause_until = 0.0  # Set after a quota error; every caller waits it out
+        self._executor = None
+        self.stats = {"requests": 0, "rate_limited": 0, "failed": 0}
+
+    # --- Budgets ---
+    def _reserve(self, tokens):
+        """Blocks until a request of `tokens` fits the per-minute budgets, then records it."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._window and self._window[0][0] <= now - RATE_WINDOW_SECONDS:
+                    self._window_tokens -= self._window.popleft()[1]
+                window_full_at = self._window[0][0] + RATE_WINDOW_SECONDS if self._window else now
+                if self._pause_until > now:
+                    wait = self._pause_until - now
+                elif self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+                    wait = window_full_at - now
+                elif (self.tokens_per_minute and self._window
+                      and self._window_tokens + tokens > self.tokens_per_minute):
+                    wait = window_full_at - now  # A single oversized request still goes through alone
+                else:
+                    self._window.append((now, tokens))
+                    self._window_tokens += tokens
+                    self.stats["requests"] += 1
+                    return
+                self._cond.wait(max(wait, 0.01))
+
+    def _back_off(self, attempt, exc):
+        delay = getattr(exc, "retry_after", None)
+        if not delay:
+            delay = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)
+        with self._cond:
+            self.stats["rate_limited"] += 1
+            self._pause_until = max(self._pause_until, time.monotonic() + delay)
+            self._cond.notify_all()
+        print(f"LLMScheduler: Rate limited ({exc}); backing off {delay:.1f}s (retry {attempt + 1}/{self.max_retries}).")
+
+    # --- Calls ---
+    def call(self, fn, *args, estimated_tokens=0, **kwargs):
+        """
+        Runs fn(*args, **kwargs) once it fits the limits, retrying quota errors with backoff.
+        Any other exception (or a quota error after max_retries) is raised to the caller.
+        """
+        attempt = 0
+        while True:
+            self._reserve(estimated_tokens)
+            with self._in_flight:
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                        with self._cond:
+                            self.stats["failed"] += 1
+                        raise
+                    error = e
+            self._back_off(attempt, error)
+            attempt += 1
+
+    def complete(self, llm, prompt, **kwargs):
+        """llm.complete(prompt) under the scheduler's limits; tokens are estimated from the prompt."""
+        tokens = estimate_tokens(prompt) + RESPONSE_TOKENS_ESTIMATE
+        return self.call(llm.complete, prompt, estimated_tokens=tokens, **kwargs)
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) on the scheduler's worker threads; returns a Future."""
+        if self._executor is None:
+            with self._cond:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                        thread_name_prefix="llm-scheduler")
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def map(self, fn, items):
+        """
+        Applies fn to every item concurrently and yields the results in input order.
+        items may be a live stream: only up to 2 x max_in_flight items are taken ahead of the
+        result being waited for. An exception from fn is raised when its result is reached.
+        """
+        pending = collections.deque()
+        for item in items:
+            pending.append(self.submit(fn, item))
+            if len(pending) >= 2 * self.max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# --- Shared Scheduler ---
+def get_scheduler():
+    """Returns the process-wide scheduler; every Gemini call should go through it to share the quota."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Replaces the shared scheduler (e.g. with different limits for tests). None restores the default."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
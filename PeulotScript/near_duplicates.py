@@ -0,0 +1,234 @@
+import zlib
+import threading
+import numpy as np
+import db
+import hebrew_text
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+SHINGLE_WORDS = 3  # Word n-grams the Jaccard similarity is measured over
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32  # 32 bands x 4 rows: a pair at 0.8 Jaccard shares a bucket with probability 1 - (1 - 0.8**4)**32 > 0.9999
+LSH_ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+NEAR_DUPLICATE_MIN_SIMILARITY = 0.8  # Estimated Jaccard similarity at which a new activity counts as a repost
+MINHASH_SEED = 1729  # Fixed, so signatures stored by earlier runs stay comparable
+LOOKUP_CHUNK_KEYS = 450  # (band, bucket) pairs / activity ids per lookup query, under SQLite's 999-variable limit
+
+_rng = np.random.default_rng(MINHASH_SEED)
+# Each "permutation" is a multiply-add-shift hash of the 32-bit shingle hashes: the high 32 bits of
+# a*x + b (mod 2**64) for random 64-bit a and b, which is 2-universal and needs no modulo.
+_PERMUTATION_A = _rng.integers(1, 1 << 64, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERMUTATION_B = _rng.integers(0, 1 << 64, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+# Odd multipliers of the (wrapping uint64) multiply-add hashes that combine the word hashes of a shingle
+# and the values of an LSH band, so both are numpy operations over the whole text / signature
+_SHINGLE_MULTIPLIERS = _rng.integers(1, 1 << 63, size=SHINGLE_WORDS, dtype=np.uint64) | np.uint64(1)
+_BAND_MULTIPLIERS = _rng.integers(1, 1 << 63, size=LSH_ROWS_PER_BAND, dtype=np.uint64) | np.uint64(1)
+
+
+# --- Signatures ---
+def shingles(text):
+    """
+    The distinct 32-bit hashes (uint64 array) of the word n-grams of the (niqqud-free, lowercased) text:
+    each word is hashed once, and every window of SHINGLE_WORDS word hashes is combined in numpy.
+    """
+    tokens = hebrew_text.tokenize(text)
+    word_hashes = np.array([zlib.crc32(token.encode("utf-8")) for token in tokens], dtype=np.uint64)
+    if len(tokens) < SHINGLE_WORDS:
+        windows = word_hashes[None, :]  # One shingle of all the words (none for an empty text)
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(word_hashes, SHINGLE_WORDS)
+    with np.errstate(over="ignore"):
+        combined = (windows * _SHINGLE_MULTIPLIERS[:windows.shape[1]]).sum(axis=1, dtype=np.uint64)
+    return np.unique(combined >> np.uint64(32)) if tokens else combined[:0]
+
+
+def signature(text):
+    """MinHash signature (uint32 array of MINHASH_PERMUTATIONS values) of the text, or None if it has no words."""
+    values = shingles(text)
+    if not len(values):
+        return None
+    with np.errstate(over="ignore"):
+        permuted = (_PERMUTATION_A[:, None] * values[None, :] + _PERMUTATION_B[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity: the share of permutations whose minimum agrees."""
+    return float(np.mean(signature_a == signature_b))
+
+
+def band_buckets(sig):
+    """[(band, bucket)] LSH keys: each band of LSH_ROWS_PER_BAND signature values hashed to a signed 64-bit integer."""
+    bands = sig.reshape(LSH_BANDS, LSH_ROWS_PER_BAND).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        buckets = (bands * _BAND_MULTIPLIERS).sum(axis=1, dtype=np.uint64)
+    return list(enumerate(buckets.view(np.int64).tolist()))
+
+
+class NearDuplicateIndex:
+    """
+    In-memory LSH index for items not in the DB yet (e.g. the activities of one crawl or one bulk insert),
+    so two copies that arrive together are caught as well. Thread-safe.
+    """
+
+    def __init__(self, min_similarity=NEAR_DUPLICATE_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._buckets = {}
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, sig):
+        with self._lock:
+            self._signatures[key] = sig
+            for band_key in band_buckets(sig):
+                self._buckets.setdefault(band_key, []).append(key)
+
+    def find(self, sig):
+        """Returns (key, similarity) of the most similar indexed item at or above min_similarity, or None."""
+        with self._lock:
+            candidates = {key for band_key in band_buckets(sig) for key in self._buckets.get(band_key, ())}
+            scored = [(similarity(sig, self._signatures[key]), key) for key in candidates]
+        best = max(scored, default=None, key=lambda item: item[0])
+        if best is None or best[0] < self.min_similarity:
+            return None
+        return best[1], best[0]
+
+
+# --- Storage ---
+# activity_minhash holds each stored activity's signature (an empty blob for an activity without words, so it
+# isn't re-read on every run); activity_lsh maps (band, bucket) -> activity ids, so a lookup reads the few rows
+# sharing a bucket instead of comparing against every activity.
+
+def setup_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_minhash (
+            activity_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_lsh (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            activity_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, activity_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_lsh_activity ON activity_lsh (activity_id)")
+    _drop_stale_signatures(cursor)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS scout_activities_minhash_delete AFTER DELETE ON scout_activities BEGIN
+            DELETE FROM activity_minhash WHERE activity_id = old.id;
+            DELETE FROM activity_lsh WHERE activity_id = old.id;
+        END
+    ''')
+
+
+def _drop_stale_signatures(cursor):
+    """
+    Clears the stored signatures if they were computed another way (a changed MINHASH_SEED, shingle or band
+    hash), checked on one stored activity; index_missing() then recomputes them all.
+    """
+    cursor.execute('''
+        SELECT m.activity_id, m.signature, a.games_and_methods FROM activity_minhash AS m
+        JOIN scout_activities AS a ON a.id = m.activity_id WHERE length(m.signature) > 0 LIMIT 1
+    ''')
+    row = cursor.fetchone()
+    current = signature(row[2]) if row else None
+    if current is None:
+        return
+    cursor.execute("SELECT band, bucket FROM activity_lsh WHERE activity_id = ? ORDER BY band", (row[0],))
+    if current.tobytes() != row[1] or cursor.fetchall() != band_buckets(current):
+        print("Dedup: Stored MinHash signatures were computed another way, recomputing them.")
+        cursor.execute("DELETE FROM activity_minhash")
+        cursor.execute("DELETE FROM activity_lsh")
+
+
+def store_signatures(cursor, signatures_by_id):
+    """
+    Stores {activity_id: signature} in the signature and LSH tables. A None signature is stored as an empty
+    blob with no LSH keys: the activity is never a candidate, and index_missing() doesn't select it again.
+    """
+    cursor.executemany("INSERT OR IGNORE INTO activity_minhash (activity_id, signature) VALUES (?, ?)",
+                       [(activity_id, sig.tobytes() if sig is not None else b"")
+                        for activity_id, sig in signatures_by_id.items()])
+    items = [(activity_id, sig) for activity_id, sig in signatures_by_id.items() if sig is not None]
+    cursor.executemany("INSERT OR IGNORE INTO activity_lsh (band, bucket, activity_id) VALUES (?, ?, ?)",
+                       [(band, bucket, activity_id) for activity_id, sig in items
+                        for band, bucket in band_buckets(sig)])
+
+
+def find_near_duplicates(cursor, signatures, min_similarity=NEAR_DUPLICATE_MIN_SIMILARITY):
+    """
+    For each signature (None allowed), (activity_id, similarity) of the most similar stored activity at or
+    above min_similarity, or None. Only activities sharing at least one LSH bucket with a signature are
+    compared; the buckets of all signatures are looked up together, and each candidate is read once.
+    """
+    keys_per_signature = [band_buckets(sig) if sig is not None else [] for sig in signatures]
+    lookup_keys = list({band_key for band_keys in keys_per_signature for band_key in band_keys})
+    ids_by_key = {}
+    for start in range(0, len(lookup_keys), LOOKUP_CHUNK_KEYS):
+        chunk = lookup_keys[start:start + LOOKUP_CHUNK_KEYS]
+        cursor.execute(f'''
+            WITH lookup (band, bucket) AS (VALUES {", ".join(["(?, ?)"] * len(chunk))})
+            SELECT lookup.band, lookup.bucket, l.activity_id
+            FROM lookup JOIN activity_lsh AS l ON l.band = lookup.band AND l.bucket = lookup.bucket
+        ''', [value for band_key in chunk for value in band_key])
+        for band, bucket, activity_id in cursor.fetchall():
+            ids_by_key.setdefault((band, bucket), []).append(activity_id)
+
+    candidate_ids = list({activity_id for ids in ids_by_key.values() for activity_id in ids})
+    stored = {}
+    for start in range(0, len(candidate_ids), LOOKUP_CHUNK_KEYS):
+        chunk = candidate_ids[start:start + LOOKUP_CHUNK_KEYS]
+        cursor.execute(f"SELECT activity_id, signature FROM activity_minhash WHERE activity_id IN "
+                       f"({','.join('?' * len(chunk))})", chunk)
+        stored.update((activity_id, np.frombuffer(blob, dtype=np.uint32)) for activity_id, blob in cursor.fetchall())
+
+    results = []
+    for sig, band_keys in zip(signatures, keys_per_signature):
+        candidates = [activity_id for activity_id in dict.fromkeys(
+            activity_id for band_key in band_keys for activity_id in ids_by_key.get(band_key, ()))
+            if activity_id in stored]
+        best = None
+        if candidates:
+            scores = (np.stack([stored[activity_id] for activity_id in candidates]) == sig).mean(axis=1)
+            position = int(scores.argmax())
+            if scores[position] >= min_similarity:
+                best = (candidates[position], float(scores[position]))
+        results.append(best)
+    return results
+
+
+def find_near_duplicate(cursor, sig, min_similarity=NEAR_DUPLICATE_MIN_SIMILARITY):
+    """
+    Returns (activity_id, similarity) of the most similar stored activity at or above min_similarity, or None.
+    Only activities sharing at least one LSH bucket with the signature are compared.
+    """
+    return find_near_duplicates(cursor, [sig], min_similarity)[0]
+
+
+def index_missing(cursor):
+    """
+    Computes and stores signatures for activities that don't have one yet (including the empty "no words"
+    marker). Returns how many got a real signature.
+    """
+    cursor.execute('''
+        SELECT id, games_and_methods FROM scout_activities
+        WHERE id NOT IN (SELECT activity_id FROM activity_minhash)
+    ''')
+    signatures_by_id = {activity_id: signature(text) for activity_id, text in cursor.fetchall()}
+    store_signatures(cursor, signatures_by_id)
+    return sum(1 for sig in signatures_by_id.values() if sig is not None)
+
+
+def find_near_duplicate_in_db(sig, db_name=DB_NAME, min_similarity=NEAR_DUPLICATE_MIN_SIMILARITY):
+    """Read-only lookup on the calling thread's connection (e.g. before spending a Gemini call on a repost)."""
+    return find_near_duplicate(db.get_connection(db_name).cursor(), sig, min_similarity)
+
+
+if __name__ == "__main__":
+    with db.transaction(DB_NAME) as cursor:
+        setup_tables(cursor)
+        indexed = index_missing(cursor)
+    print(f"Dedup: Computed MinHash signatures for {indexed} activities.")
@@ -2,18 +2,32 @@ import sqlite3
 import json
 import os
 from dotenv import load_dotenv
-# Assuming you are using the LlamaIndex Gemini wrapper
-# If you switched to google.generativeai, adjust imports accordingly
-from llama_index.llms.gemini import Gemini
+import db  # Thread-local WAL connections
+import activity_index
+import activity_attributes  # Age/duration parsing into indexed integer columns
+import near_duplicates  # MinHash/LSH detection of reposted activities
+import worthiness
+import llm_provider  # Shared LlamaIndex Gemini clients (or a fake backend for tests)
+import llm_scheduler  # Concurrency, RPM/TPM budgets and 429 backoff shared by all Gemini calls
+import llm_cache  # Parsed metadata keyed by (model, prompt version, SHA-256 of the input)
 
 # --- Configuration ---
 DB_NAME = "scout_activities.db" # Ensure this matches
 load_dotenv() # Ensure .env file is in the same directory as the new orchestrator script or accessible
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+PARSING_MODEL_NAME = "models/gemini-1.5-flash-latest"
+PARSE_PROMPT_VERSION = "metadata-v1"  # Bump when the parse prompts change, so cached parses aren't reused
+BATCH_PROMPT_TOKEN_BUDGET = 24000  # Estimated activity-text tokens packed into one batch request
+MAX_ACTIVITIES_PER_BATCH = 8
+
+# Per-URL outcomes reported by add_activities_bulk
+INSERT_ADDED = "added"
+INSERT_DUPLICATE = "duplicate"  # source_url already stored, or a near-duplicate of a stored/earlier activity
+INSERT_FAILED = "failed"  # Database error; nothing from the call was stored
 
 # --- Database Functions ---
 def setup_database():
-    conn = sqlite3.connect(DB_NAME)
+    conn = db.get_connection(DB_NAME)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS scout_activities (
@@ -28,48 +42,158 @@ def setup_database():
             source_url TEXT UNIQUE  -- Added to store the URL and prevent duplicates
         )
     ''')
+    activity_index.setup_index(cursor)  # Builds the full-text index on first run; triggers keep it in sync
+    activity_attributes.setup_columns(cursor)  # Normalized age/duration columns, backfilled for older rows
+    activity_attributes.backfill_columns(cursor)
+    near_duplicates.setup_tables(cursor)
+    near_duplicates.index_missing(cursor)  # Signatures for rows stored before near-duplicate detection
+    worthiness.setup_rejected_posts(cursor)  # Negative examples for `python worthiness.py train`
+    llm_cache.setup_cache(cursor)
     conn.commit()
-    conn.close()
+    llm_cache.evict(db_name=DB_NAME)
     print(f"DBManager: Database '{DB_NAME}' checked/created successfully.")
 
+def _activity_db_values(activity_data: dict) -> dict:
+    values = {
+        "topic": activity_data.get("topic") or "נושא לא צוין (שגיאת ניתוח)",
+        "description": activity_data.get("description") or "תיאור לא נותח",
+        "games_and_methods": activity_data.get("games_and_methods", ""), # Full scraped text
+        "age_group": activity_data.get("age_group") or "לא ידוע",
+        "duration": activity_data.get("duration") or "לא ידוע",
+        "materials": json.dumps(activity_data.get("materials", []), ensure_ascii=False),
+        "tags": json.dumps(activity_data.get("tags", ["untagged"]), ensure_ascii=False),
+        "source_url": activity_data.get("source_url") or "no URL source" # Store the source URL
+    }
+    values.update(activity_attributes.normalized_columns(values["age_group"], values["duration"]))
+    return values
+
+INSERT_ACTIVITY_SQL = '''
+    INSERT {on_conflict}INTO scout_activities
+    (topic, description, games_and_methods, age_group, duration, materials, tags, source_url,
+     age_min, age_max, duration_minutes, attributes_parsed)
+    VALUES (:topic, :description, :games_and_methods, :age_group, :duration, :materials, :tags, :source_url,
+            :age_min, :age_max, :duration_minutes, :attributes_parsed)
+'''
+
 def add_activity_to_db(activity_data: dict):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    db_values = _activity_db_values(activity_data)
+    sig = near_duplicates.signature(db_values["games_and_methods"])
     try:
-        db_values = {
-            "topic": activity_data.get("topic") or "נושא לא צוין (שגיאת ניתוח)",
-            "description": activity_data.get("description") or "תיאור לא נותח",
-            "games_and_methods": activity_data.get("games_and_methods", ""), # Full scraped text
-            "age_group": activity_data.get("age_group") or "לא ידוע",
-            "duration": activity_data.get("duration") or "לא ידוע",
-            "materials": json.dumps(activity_data.get("materials", []), ensure_ascii=False),
-            "tags": json.dumps(activity_data.get("tags", ["untagged"]), ensure_ascii=False),
-            "source_url": activity_data.get("source_url") or "no URL source" # Store the source URL
-        }
-        cursor.execute('''
-            INSERT INTO scout_activities 
-            (topic, description, games_and_methods, age_group, duration, materials, tags, source_url)
-            VALUES (:topic, :description, :games_and_methods, :age_group, :duration, :materials, :tags, :source_url)
-        ''', db_values)
-        conn.commit()
-        print(f"DBManager: Activity (Topic: '{db_values['topic']}', URL: {db_values['source_url']}) added to the database.")
-        return True
+        with db.transaction(DB_NAME) as cursor:
+            duplicate = near_duplicates.find_near_duplicate(cursor, sig)
+            if duplicate is None:
+                cursor.execute(INSERT_ACTIVITY_SQL.format(on_conflict=""), db_values)  # Indexed by the FTS trigger
+                near_duplicates.store_signatures(cursor, {cursor.lastrowid: sig})
     except sqlite3.IntegrityError: # This will catch UNIQUE constraint violation for source_url
         print(f"DBManager: Activity from URL '{activity_data.get('source_url')}' already exists in the database.")
         return False
     except sqlite3.Error as e:
         print(f"DBManager: Database error: {e} for URL {activity_data.get('source_url')}")
         return False
-    finally:
-        conn.close()
+    if duplicate is not None:
+        print(f"DBManager: Activity from URL '{db_values['source_url']}' is a near-duplicate of activity "
+              f"#{duplicate[0]} (similarity {duplicate[1]:.2f}), not added.")
+        return False
+    print(f"DBManager: Activity (Topic: '{db_values['topic']}', URL: {db_values['source_url']}) added to the database.")
+    return True
+
+def add_activities_bulk(activities) -> dict:
+    """
+    Inserts many activities with one executemany in a single transaction (the FTS triggers index them in it).
+    Activities whose source_url is already stored are skipped, as are near-duplicates of a stored activity
+    or of an earlier activity in the same call. Returns {source_url: INSERT_ADDED / INSERT_DUPLICATE /
+    INSERT_FAILED}, so callers only mark as done what was stored or rightly rejected.
+    """
+    rows = [_activity_db_values(activity_data) for activity_data in activities]
+    if not rows:
+        return {}
+    statuses = {}
+    signatures = [near_duplicates.signature(row["games_and_methods"]) for row in rows]
+    batch_index = near_duplicates.NearDuplicateIndex()
+    try:
+        with db.transaction(DB_NAME) as cursor:
+            kept = {}
+            stored_duplicates = near_duplicates.find_near_duplicates(cursor, signatures)  # One lookup for the batch
+            for row, sig, duplicate in zip(rows, signatures, stored_duplicates):
+                if sig is not None:
+                    if duplicate is not None:
+                        duplicate = (f"activity #{duplicate[0]}", duplicate[1])
+                    else:
+                        duplicate = batch_index.find(sig)  # An earlier activity of this call, keyed by URL
+                    if duplicate is not None:
+                        print(f"DBManager: Activity from URL '{row['source_url']}' is a near-duplicate of "
+                              f"{duplicate[0]} (similarity {duplicate[1]:.2f}), skipped.")
+                        statuses[row["source_url"]] = INSERT_DUPLICATE
+                        continue
+                    batch_index.add(row["source_url"], sig)
+                kept[row["source_url"]] = (row, sig)
+            for url in _stored_ids_by_url(cursor, list(kept)):
+                statuses[url] = INSERT_DUPLICATE
+                del kept[url]
+            cursor.executemany(INSERT_ACTIVITY_SQL.format(on_conflict="OR IGNORE "), [row for row, _ in kept.values()])
+            ids_by_url = _stored_ids_by_url(cursor, list(kept))
+            near_duplicates.store_signatures(cursor, {activity_id: kept[url][1] for url, activity_id in ids_by_url.items()})
+    except sqlite3.Error as e:
+        print(f"DBManager: Database error during bulk insert of {len(rows)} activities: {e}")
+        return {row["source_url"]: INSERT_FAILED for row in rows}
+    statuses.update({url: INSERT_ADDED for url in ids_by_url})
+    print(f"DBManager: Bulk insert added {len(ids_by_url)} of {len(rows)} activities to the database.")
+    return statuses
+
+
+def _stored_ids_by_url(cursor, urls):
+    """{source_url: id} of the given URLs that are stored, queried in chunks under SQLite's variable limit."""
+    ids_by_url = {}
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        cursor.execute(f"SELECT id, source_url FROM scout_activities WHERE source_url IN "
+                       f"({','.join('?' * len(chunk))})", chunk)
+        ids_by_url.update({url: activity_id for activity_id, url in cursor.fetchall()})
+    return ids_by_url
+
+def get_known_source_urls():
+    """Returns the set of source URLs already stored, so callers can skip them before fetching/parsing."""
+    try:
+        cursor = db.get_connection(DB_NAME).cursor()
+        cursor.execute("SELECT source_url FROM scout_activities WHERE source_url IS NOT NULL")
+        return {row[0] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"DBManager: Could not load known source URLs: {e}")
+        return set()
+
+# --- AI Parsing Functions ---
+METADATA_KEYS_INSTRUCTIONS = '''    - "topic": (string) Concise activity title in Hebrew.
+    - "description": (string) Brief summary in Hebrew.
+    - "age_group": (string) e.g., "גילאי 9-11". Infer if not explicit.
+    - "duration": (string) e.g., "45 דקות". Sum timings or estimate.
+    - "materials": (LIST OF STRINGS) Materials in Hebrew/English. Infer if implied (e.g., "משחק כדורגל" -> "כדור"). Empty list [] if none.
+    - "tags": (list of strings) 3-5 English keywords (e.g., ["teamwork", "outdoors"]).
+
+    CRITICAL JSON FORMATTING: Ensure inner double quotes in strings are escaped (e.g., "a string with an \\"inner quote\\"").
+'''
+METADATA_KEYS = ("topic", "description", "age_group", "duration", "materials", "tags")
+
+
+def _strip_json_fences(response_text):
+    response_text = response_text.strip()
+    if response_text.startswith("```json"): response_text = response_text[7:]
+    if response_text.endswith("```"): response_text = response_text[:-3]
+    return response_text.strip()
 
-# --- AI Parsing Function ---
-def parse_activity_with_gemini(full_activity_input: str, source_url_for_context:str = "N/A") -> dict | None:
-    if not GEMINI_API_KEY:
+
+def parse_activity_with_gemini(full_activity_input: str, source_url_for_context:str = "N/A",
+                               check_cache: bool = True) -> dict | None:
+    if check_cache:
+        cached = llm_cache.get_cached_parse(PARSING_MODEL_NAME, PARSE_PROMPT_VERSION, full_activity_input,
+                                            db_name=DB_NAME)
+        if cached is not None:
+            print(f"DBManager: Using cached metadata for {source_url_for_context}.")
+            return cached
+    if not llm_provider.is_configured():
         print("DBManager: Error - GOOGLE_API_KEY not found.")
         return None
     try:
-        llm = Gemini(api_key=GEMINI_API_KEY, model_name="models/gemini-1.5-flash-latest")
+        llm = llm_provider.get_llm(PARSING_MODEL_NAME)
     except Exception as e:
         print(f"DBManager: Error initializing Gemini LLM: {e}")
         return None
@@ -80,15 +204,7 @@ def parse_activity_with_gemini(full_activity_input: str, source_url_for_context:
     Provide structured metadata. The activity plan itself (games_and_methods) will be stored from the raw input.
 
     Output ONLY as a single, VALID JSON object with keys: "topic", "description", "age_group", "duration", "materials", "tags".
-    - "topic": (string) Concise activity title in Hebrew.
-    - "description": (string) Brief summary in Hebrew.
-    - "age_group": (string) e.g., "גילאי 9-11". Infer if not explicit.
-    - "duration": (string) e.g., "45 דקות". Sum timings or estimate.
-    - "materials": (LIST OF STRINGS) Materials in Hebrew/English. Infer if implied (e.g., "משחק כדורגל" -> "כדור"). Empty list [] if none.
-    - "tags": (list of strings) 3-5 English keywords (e.g., ["teamwork", "outdoors"]).
-
-    CRITICAL JSON FORMATTING: Ensure inner double quotes in strings are escaped (e.g., "a string with an \\"inner quote\\"").
-
+{METADATA_KEYS_INSTRUCTIONS}
     Full Activity Plan Provided:
     ---
     {full_activity_input}
@@ -97,15 +213,15 @@ def parse_activity_with_gemini(full_activity_input: str, source_url_for_context:
     """
     print(f"DBManager: Sending activity from {source_url_for_context} to Gemini for parsing...")
     try:
-        response = llm.complete(prompt)
-        response_text = response.text.strip()
-        if response_text.startswith("```json"): response_text = response_text[7:]
-        if response_text.endswith("```"): response_text = response_text[:-3]
-        response_text = response_text.strip()
+        response = llm_scheduler.get_scheduler().complete(llm, prompt)
+        response_text = _strip_json_fences(response.text)
 
         # print(f"DBManager: Raw Gemini response for metadata:\n{response_text}") # For debugging
         parsed_data = json.loads(response_text)
         print("DBManager: Successfully parsed metadata from Gemini.")
+        if isinstance(parsed_data, dict):
+            llm_cache.store_parse(PARSING_MODEL_NAME, PARSE_PROMPT_VERSION, full_activity_input, parsed_data,
+                                  db_name=DB_NAME)
         return parsed_data
     except json.JSONDecodeError as e:
         print(f"DBManager: Error decoding JSON from Gemini for {source_url_for_context}: {e}")
@@ -115,6 +231,97 @@ def parse_activity_with_gemini(full_activity_input: str, source_url_for_context:
         print(f"DBManager: An error occurred with Gemini for {source_url_for_context}: {e}")
         return None
 
+def pack_activity_batches(items, token_budget=BATCH_PROMPT_TOKEN_BUDGET, max_items=MAX_ACTIVITIES_PER_BATCH):
+    """
+    Groups (source_url, activity_text) items into batches whose estimated tokens fit token_budget.
+    Works on any iterable (including a live stream) and yields each batch as soon as it is full.
+    An activity larger than the budget on its own is yielded as a batch of one.
+    """
+    batch, batch_tokens = [], 0
+    for item in items:
+        item_tokens = llm_scheduler.estimate_tokens(item[1])
+        if batch and (batch_tokens + item_tokens > token_budget or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += item_tokens
+    if batch:
+        yield batch
+
+
+def parse_activities_batch_with_gemini(items) -> dict:
+    """
+    Parses several activities with one Gemini request.
+    items: list of (source_url, full_activity_input). Returns {source_url: metadata dict or None}.
+    The model answers with a JSON array keyed by source_url; any item that is missing or malformed in the
+    answer (or every item, if the whole answer is not valid JSON) falls back to parse_activity_with_gemini.
+    Items with a cached parse are answered from the cache and left out of the request.
+    """
+    results = {}
+    for source_url, activity_text in items:
+        cached = llm_cache.get_cached_parse(PARSING_MODEL_NAME, PARSE_PROMPT_VERSION, activity_text, db_name=DB_NAME)
+        if cached is not None:
+            results[source_url] = cached
+    if results:
+        print(f"DBManager: Using cached metadata for {len(results)}/{len(items)} activities in the batch.")
+        items = [item for item in items if item[0] not in results]
+    if not items:
+        return results
+    if len(items) == 1:
+        source_url, activity_text = items[0]
+        results[source_url] = parse_activity_with_gemini(activity_text, source_url_for_context=source_url,
+                                                         check_cache=False)
+        return results
+    if not llm_provider.is_configured():
+        print("DBManager: Error - GOOGLE_API_KEY not found.")
+        results.update({source_url: None for source_url, _ in items})
+        return results
+
+    activities_block = "\n".join(
+        f"=== ACTIVITY source_url: {source_url} ===\n{activity_text}\n=== END ACTIVITY ===\n"
+        for source_url, activity_text in items)
+    prompt = f"""
+    You are an expert Scout activity planner. Analyze each of the following {len(items)} Scout activity plans.
+    Each plan starts with a line "=== ACTIVITY source_url: <url> ===" and ends with "=== END ACTIVITY ===".
+    Provide structured metadata for every plan. The activity plans themselves will be stored from the raw input.
+
+    Output ONLY a single, VALID JSON array with exactly one object per activity, in the same order.
+    Each object has the key "source_url" (copied exactly from the activity header) and the keys:
+{METADATA_KEYS_INSTRUCTIONS}
+    Activity Plans Provided:
+    {activities_block}
+    JSON Array Output (metadata only):
+    """
+    texts_by_url = dict(items)
+    batch_parsed = 0
+    print(f"DBManager: Sending a batch of {len(items)} activities to Gemini for parsing...")
+    try:
+        llm = llm_provider.get_llm(PARSING_MODEL_NAME)
+        response = llm_scheduler.get_scheduler().complete(llm, prompt)
+        parsed_list = json.loads(_strip_json_fences(response.text))
+        if not isinstance(parsed_list, list):
+            raise ValueError("batch response is not a JSON array")
+        for parsed in parsed_list:
+            if (isinstance(parsed, dict) and parsed.get("source_url") in texts_by_url
+                    and all(key in parsed for key in METADATA_KEYS)):
+                source_url = parsed.pop("source_url")
+                results[source_url] = parsed
+                batch_parsed += 1
+                llm_cache.store_parse(PARSING_MODEL_NAME, PARSE_PROMPT_VERSION, texts_by_url[source_url], parsed,
+                                      db_name=DB_NAME)
+        print(f"DBManager: Batch parse returned valid metadata for {batch_parsed}/{len(items)} activities.")
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"DBManager: Batch response from Gemini was malformed ({e}); parsing items one by one.")
+    except Exception as e:
+        print(f"DBManager: An error occurred with Gemini for a batch of {len(items)}: {e}; parsing items one by one.")
+
+    for source_url, activity_text in items:
+        if source_url not in results:
+            results[source_url] = parse_activity_with_gemini(activity_text, source_url_for_context=source_url,
+                                                             check_cache=False)
+    return results
+
+
 if __name__ == "__main__":
     print("Testing peula_db_manager.py functions...")
     setup_database()
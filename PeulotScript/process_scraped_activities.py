@@ -1,130 +1,224 @@
 import forum_scraper  # Assuming your refactored scraper is named forum_scraper.py
 import peula_db_manager  # Assuming your DB/Gemini script is peula_db_manager.py
-import time
-import re
+import vector_store
+import crawl_frontier
+import llm_scheduler
+import llm_cache
+import near_duplicates
+import worthiness  # Single-pass keyword/structure scorer with an optional trained model
+import queue
+import threading
 
 # --- Configuration for Orchestrator ---
 # How many pages of the forum to scrape (e.g., /forum/20, /forum/20/page/2, ...)
 # Be mindful of the number of topics per page and total API calls.
 MAX_FORUM_PAGES_TO_SCRAPE = 1  # Start with 1 for testing
 
-MIN_ACTIVITY_LENGTH = 100  # Characters, very basic filter
-MIN_LINES_FOR_ACTIVITY = 5  # Another basic filter
+# --- Pipeline ---
+PIPELINE_QUEUE_SIZE = 8  # Items buffered between stages; a full queue pauses the stage before it
+# Gemini concurrency, RPM/TPM budgets and 429 backoff are configured in llm_scheduler
 
 
-def is_activity_worthy(text, url="N/A"):
+def is_activity_worthy(text, url="N/A", db_name=None):
     """
-    A heuristic-based function to decide if the scraped text is likely an activity.
-    This will need tuning and won't be perfect.
+    Decides if the scraped text is likely an activity (worthiness.py: the trained model if one was saved,
+    otherwise keyword/structure rules). With db_name, rejected posts are recorded as training negatives.
     """
     if not text or not isinstance(text, str):
         return False
+    worthy, _, reason = worthiness.score(text)
+    if worthy:
+        print(f"Orchestrator: Content from {url} deemed worthy ({reason}).")
+    else:
+        print(f"Orchestrator: Content from {url} did not meet worthiness criteria ({reason}). Skipping.")
+        if db_name:
+            worthiness.record_rejected(url, text, reason, db_name=db_name)
+    return worthy
 
-    text_lower = text.lower()
 
-    # 1. Length checks
-    if len(text) < MIN_ACTIVITY_LENGTH:
-        print(f"Orchestrator: Content from {url} too short ({len(text)} chars), skipping.")
-        return False
-    if len(text.splitlines()) < MIN_LINES_FOR_ACTIVITY:
-        print(f"Orchestrator: Content from {url} has too few lines ({len(text.splitlines())}), skipping.")
-        return False
+_STAGE_DONE = object()  # Sentinel passed down the pipeline when a stage has no more items
+
 
-    # 2. Positive Keywords (Hebrew examples)
-    #    More weight if multiple keywords appear.
-    positive_keywords = [
-        "משחק", "פעילות", "מטרה", "חניכים", "מדריך", "דקות", "שלב",
-        "צ'ופר", "מהלך", "לוז", "לו\"ז", "הסבר", "הוראות", "ציוד",
-        "1.", "2.", "א.", "ב."  # Common list indicators
-    ]
-    positive_hits = sum(1 for keyword in positive_keywords if keyword in text)  # Check in original text for Hebrew
-
-    # 3. Negative Keywords (Hebrew examples - indicating questions or non-activity posts)
-    negative_keywords_exact = ["מישהו מכיר", "שאלה:", "מחפש/ת", "רעיון ל", "מה דעתכם", "דיון:"]
-    for neg_kw in negative_keywords_exact:
-        if neg_kw in text:
-            print(f"Orchestrator: Content from {url} contains negative keyword '{neg_kw}', skipping.")
-            return False
-
-    # Simple logic: needs some positive indicators.
-    # This is highly tunable.
-    if positive_hits >= 2:  # Require at least 2 positive keyword hits
-        print(f"Orchestrator: Content from {url} deemed worthy (positive hits: {positive_hits}).")
-        return True
-
-    # Check for common activity structures (e.g., lines starting with numbers/times)
-    lines_with_activity_structure = 0
-    for line in text.splitlines():
-        line_strip = line.strip()
-        if line_strip.startswith(("1.", "2.", "3.", "4.", "5.", "- ", "* ")) or \
-                re.match(r"^\d+דק", line_strip) or \
-                re.match(r"^\d{1,2}:\d{2}", line_strip):  # e.g., 10דק or 10:00
-            lines_with_activity_structure += 1
-
-    if lines_with_activity_structure >= 2 and positive_hits >= 1:  # Structure + at least one general keyword
-        print(
-            f"Orchestrator: Content from {url} deemed worthy by structure (lines: {lines_with_activity_structure}, positive: {positive_hits}).")
-        return True
-
-    print(
-        f"Orchestrator: Content from {url} did not meet worthiness criteria (positive hits: {positive_hits}, structured lines: {lines_with_activity_structure}). Skipping.")
-    return False
+def _iter_queue(in_queue):
+    """Yields items from in_queue until the stage-done sentinel."""
+    while True:
+        item = in_queue.get()
+        if item is _STAGE_DONE:
+            return
+        yield item
+
+
+def _run_stage(name, handle_item, in_queue, out_queue, workers=1):
+    """
+    Starts `workers` threads that take items from in_queue, call handle_item(item) and put any non-None
+    result on out_queue. When in_queue is exhausted the sentinel is forwarded to out_queue.
+    """
+    def worker():
+        while True:
+            item = in_queue.get()
+            if item is _STAGE_DONE:
+                in_queue.put(_STAGE_DONE)  # Let sibling workers see it too
+                return
+            try:
+                result = handle_item(item)
+            except Exception as e:
+                print(f"Orchestrator: Unexpected error in {name} stage: {e}")
+                result = None
+            if result is not None and out_queue is not None:
+                out_queue.put(result)
+
+    threads = [threading.Thread(target=worker, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    def close_stage():
+        for thread in threads:
+            thread.join()
+        if out_queue is not None:
+            out_queue.put(_STAGE_DONE)
+
+    closer = threading.Thread(target=close_stage, name=f"{name}-closer", daemon=True)
+    closer.start()
+    return closer
 
 
 def main_orchestrator():
+    """
+    Runs scrape -> worthiness filter -> batching -> Gemini parse -> DB insert as overlapping stages connected by
+    bounded queues, so rows land in the DB while the crawl is still running and memory holds only
+    the items in flight.
+    """
     print("Orchestrator: Starting process...")
 
     # 1. Setup Database (ensure table exists)
     peula_db_manager.setup_database()
-
-    # 2. Scrape activities from the forum
-    #    The scraper function now returns a list of (url, text)
-    scraped_items = forum_scraper.scrape_forum_for_activities(
-        start_forum_url=forum_scraper.FORUM_URL,
-        max_pages=MAX_FORUM_PAGES_TO_SCRAPE
-    )
-
-    if not scraped_items:
-        print("Orchestrator: No items were scraped from the forum. Exiting.")
-        return
-
-    print(f"\nOrchestrator: Scraped {len(scraped_items)} potential items. Now processing...")
-
-    successful_adds = 0
-    worthy_count = 0
-
-    for source_url, activity_text in scraped_items:
-        print(f"\nOrchestrator: --- Processing item from: {source_url} ---")
-
-        # 3. Check if the activity is "worthy"
-        if is_activity_worthy(activity_text, source_url):
-            worthy_count += 1
-            # 4. Parse with Gemini (pass the full scraped text)
-            # The 'activity_text' is the 'full_activity_input' for Gemini
-            parsed_metadata = peula_db_manager.parse_activity_with_gemini(activity_text,
-                                                                          source_url_for_context=source_url)
-
-            if parsed_metadata:
-                # 5. Prepare data for DB
-                # The full scraped text becomes the 'games_and_methods'
-                final_data_for_db = parsed_metadata.copy()
-                final_data_for_db["games_and_methods"] = activity_text
-                final_data_for_db["source_url"] = source_url  # Add source URL
-
-                # 6. Add to Database
-                if peula_db_manager.add_activity_to_db(final_data_for_db):
-                    successful_adds += 1
+    db_name = peula_db_manager.DB_NAME
+
+    # Topics already in the DB are dropped by the scraper before any fetch or Gemini call.
+    known_urls = peula_db_manager.get_known_source_urls()
+    print(f"Orchestrator: {len(known_urls)} source URLs already in the DB will be skipped.")
+
+    counts = {"scraped": 0, "worthy": 0, "near_duplicates": 0, "added": 0}
+    counts_lock = threading.Lock()
+
+    def count(key):
+        with counts_lock:
+            counts[key] += 1
+
+    scraped_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    worthy_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    batch_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    parsed_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    # 2. Scrape activities from the forum, resuming from the crawl frontier
+    def scrape_stage():
+        try:
+            for item in forum_scraper.iter_forum_activities(start_forum_url=forum_scraper.FORUM_URL,
+                                                            max_pages=MAX_FORUM_PAGES_TO_SCRAPE,
+                                                            known_urls=known_urls, db_name=db_name):
+                count("scraped")
+                scraped_queue.put(item)
+        except Exception as e:
+            print(f"Orchestrator: Scraping stopped with an error: {e}")
+        finally:
+            scraped_queue.put(_STAGE_DONE)
+
+    # 3. Check if the activity is "worthy", and not a repost of a stored (or earlier scraped) activity,
+    #    before any Gemini call is spent on it
+    crawl_index = near_duplicates.NearDuplicateIndex()
+
+    def filter_item(item):
+        source_url, activity_text = item
+        if not is_activity_worthy(activity_text, source_url, db_name=db_name):
+            crawl_frontier.mark_done(source_url, db_name=db_name)
+            return None
+        count("worthy")
+        sig = near_duplicates.signature(activity_text)
+        if sig is not None:
+            duplicate = near_duplicates.find_near_duplicate_in_db(sig, db_name)
+            if duplicate is not None:
+                duplicate = (f"activity #{duplicate[0]}", duplicate[1])
             else:
+                duplicate = crawl_index.find(sig)  # Scraped earlier in this run, keyed by URL
+            if duplicate is not None:
+                count("near_duplicates")
+                print(f"Orchestrator: Content from {source_url} is a near-duplicate of {duplicate[0]} "
+                      f"(similarity {duplicate[1]:.2f}). Skipping.")
+                crawl_frontier.mark_done(source_url, db_name=db_name)
+                return None
+            crawl_index.add(source_url, sig)
+        return item
+
+    # 4. Pack worthy items into token-budgeted batches, one Gemini request each
+    def batch_stage():
+        for batch in peula_db_manager.pack_activity_batches(_iter_queue(worthy_queue)):
+            batch_queue.put(batch)
+        batch_queue.put(_STAGE_DONE)
+
+    # 5. Parse with Gemini (the full scraped text is the 'full_activity_input')
+    def parse_batch(batch):
+        try:
+            parsed_by_url = peula_db_manager.parse_activities_batch_with_gemini(batch)
+        except Exception as e:
+            print(f"Orchestrator: Unexpected error in parse stage: {e}")
+            parsed_by_url = {}
+        final_items = []
+        for source_url, activity_text in batch:
+            parsed_metadata = parsed_by_url.get(source_url)
+            if not parsed_metadata:
                 print(f"Orchestrator: Gemini parsing failed for content from {source_url}. Not added to DB.")
-        else:
-            print(f"Orchestrator: Scraped content from {source_url} was NOT deemed worthy. Skipping DB insertion.")
-
-        time.sleep(1)  # Small delay between processing items, especially if Gemini is called
+                crawl_frontier.mark_failed(source_url, "gemini parsing failed", db_name=db_name)
+                continue
+            # The full scraped text becomes the 'games_and_methods'
+            final_data_for_db = parsed_metadata.copy()
+            final_data_for_db["games_and_methods"] = activity_text
+            final_data_for_db["source_url"] = source_url  # Add source URL
+            final_items.append(final_data_for_db)
+        return final_items
+
+    # Batches are parsed concurrently by the shared LLM scheduler and delivered in scrape order
+    def parse_stage():
+        try:
+            for final_items in llm_scheduler.get_scheduler().map(parse_batch, _iter_queue(batch_queue)):
+                parsed_queue.put(final_items)
+        finally:
+            parsed_queue.put(_STAGE_DONE)
+
+    # 6. Add to Database (single writer, one transaction per parsed batch)
+    #    Only stored or rejected-as-duplicate topics are marked done; a failed insert is retried on a later run
+    def insert_items(final_items):
+        statuses = peula_db_manager.add_activities_bulk(final_items)
+        for final_data_for_db in final_items:
+            source_url = final_data_for_db["source_url"]
+            status = statuses.get(source_url, peula_db_manager.INSERT_FAILED)
+            if status == peula_db_manager.INSERT_FAILED:
+                crawl_frontier.mark_failed(source_url, "db insert failed", db_name=db_name)
+                continue
+            if status == peula_db_manager.INSERT_ADDED:
+                count("added")
+            crawl_frontier.mark_done(source_url, db_name=db_name)
+
+    threading.Thread(target=scrape_stage, name="scrape", daemon=True).start()
+    _run_stage("filter", filter_item, scraped_queue, worthy_queue)
+    threading.Thread(target=batch_stage, name="batch", daemon=True).start()
+    threading.Thread(target=parse_stage, name="parse", daemon=True).start()
+    _run_stage("insert", insert_items, parsed_queue, None).join()
 
     print(f"\nOrchestrator: --- Summary ---")
-    print(f"Total items scraped: {len(scraped_items)}")
-    print(f"Items deemed worthy: {worthy_count}")
-    print(f"Items successfully added to DB: {successful_adds}")
+    print(f"Total items scraped: {counts['scraped']}")
+    print(f"Items deemed worthy: {counts['worthy']}")
+    print(f"Near-duplicates skipped before parsing: {counts['near_duplicates']}")
+    print(f"Items successfully added to DB: {counts['added']}")
+    cache_stats = llm_cache.get_stats(db_name)
+    print(f"Parse cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+
+    if counts["added"]:
+        # Embed only the new rows, and publish a new memory-mapped export for the app only if any changed
+        print("Orchestrator: Refreshing vector index...")
+        embedder = vector_store.get_embedder()
+        embedded, removed = vector_store.refresh_embeddings(embedder, db_name)
+        if embedded or removed or vector_store.read_index_manifest(embedder.model_name) is None:
+            vector_store.export_index_files(embedder.model_name, db_name)
     print("Orchestrator: Process finished.")
 
 
@@ -0,0 +1,141 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import db
+import activity_index
+import activity_attributes
+import vector_store
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+VECTOR_STORE_DIR = vector_store.VECTOR_STORE_DIR
+CANDIDATES_PER_RETRIEVER = 50  # Taken from each of the lexical and vector rankings before fusion
+RRF_K = 60  # Reciprocal rank fusion constant; larger values flatten the difference between ranks
+RETRIEVAL_LATENCY_BUDGET_MS = 300  # Whatever retrievers haven't answered by then are left out
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+_embedder = None
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+
+# --- Vector Index ---
+def get_vector_index(db_name=DB_NAME, directory=VECTOR_STORE_DIR):
+    """
+    Opens the memory-mapped vector index (vector_store.py export) so startup costs no embedding work
+    and the pages are shared by every Streamlit worker process. The export is built on first run, and
+    the index is reopened when `python vector_store.py refresh` publishes a newer one.
+    """
+    global _embedder, _vector_index
+    if not os.path.exists(db_name):
+        print("Retrieval: Database file not found. Cannot open vector index.")
+        return None
+    with _vector_index_lock:
+        if _embedder is None:
+            _embedder = vector_store.get_embedder()
+        manifest = vector_store.read_index_manifest(_embedder.model_name, directory)
+        if manifest is None:
+            print("Retrieval: No vector index export found, building it once...")
+            vector_store.refresh_embeddings(_embedder, db_name)
+            manifest = vector_store.export_index_files(_embedder.model_name, db_name, directory)
+        if _vector_index is None or _vector_index.manifest["version"] != manifest["version"]:
+            _vector_index = vector_store.VectorIndex.open_mmap(_embedder, directory)
+        return _vector_index
+
+
+def prepare_retrieval(db_name=DB_NAME):
+    """
+    Builds the full-text index and the normalized age/duration columns if the DB has none yet, and maps
+    the vector index; cheap on later calls.
+    """
+    if os.path.exists(db_name):
+        activity_index.ensure_index(db_name)
+        activity_attributes.backfill(db_name)
+    return get_vector_index(db_name)
+
+
+# --- Candidate Generation ---
+# Both retrievers apply the age/duration filter themselves (as indexed SQL conditions), so the
+# candidates they return already fit the request instead of being thinned out after fusion.
+
+def _lexical_candidates(user_prompt, db_name, filter_clause="", filter_params=()):
+    return [activity_id for _, activity_id in
+            activity_index.search_activity_ids(user_prompt, CANDIDATES_PER_RETRIEVER, db_name=db_name,
+                                               filter_clause=filter_clause, filter_params=filter_params)]
+
+
+def _allowed_ids(db_name, filter_clause, filter_params):
+    cursor = db.get_connection(db_name).cursor()
+    cursor.execute(f"SELECT a.id FROM scout_activities AS a WHERE {filter_clause}", list(filter_params))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _vector_candidates(user_prompt, db_name, filter_clause="", filter_params=()):
+    index = get_vector_index(db_name)
+    if index is None or not len(index):
+        return []
+    allowed_ids = _allowed_ids(db_name, filter_clause, filter_params) if filter_clause else None
+    return [activity_id for score, activity_id in
+            index.search(user_prompt, k=CANDIDATES_PER_RETRIEVER, allowed_ids=allowed_ids) if score > 0]
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """[[id, ...], ...] best-first rankings -> [(score, id)] best first, score = sum of 1 / (rrf_k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, activity_id in enumerate(ranking, start=1):
+            scores[activity_id] = scores.get(activity_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(((score, activity_id) for activity_id, score in scores.items()), key=lambda s: (-s[0], s[1]))
+
+
+def _fetch_activities(activity_ids, db_name):
+    if not activity_ids:
+        return {}
+    cursor = db.get_connection(db_name).cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(
+        f"SELECT id, topic, description, games_and_methods, age_group, duration, materials, tags, source_url "
+        f"FROM scout_activities WHERE id IN ({','.join('?' * len(activity_ids))})", list(activity_ids))
+    return {row["id"]: row for row in cursor.fetchall()}
+
+
+# --- Retrieval ---
+def _fused_candidates(user_prompt, db_name, filter_clause, filter_params, deadline):
+    futures = {_executor.submit(_lexical_candidates, user_prompt, db_name, filter_clause, filter_params): "lexical",
+               _executor.submit(_vector_candidates, user_prompt, db_name, filter_clause, filter_params): "vector"}
+    done, not_done = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+    rankings = []
+    for future in done:
+        try:
+            rankings.append(future.result())
+        except Exception as e:
+            print(f"Retrieval: {futures[future]} retriever failed: {e}")
+    for future in not_done:
+        future.cancel()
+        print(f"Retrieval: {futures[future]} retriever missed the latency budget, skipped.")
+    return [activity_id for _, activity_id in reciprocal_rank_fusion(rankings)]
+
+
+def retrieve(user_prompt, k=3, user_age_pref=None, user_duration_minutes=None, db_name=DB_NAME,
+             latency_budget_ms=RETRIEVAL_LATENCY_BUDGET_MS):
+    """
+    Hybrid retrieval: BM25 (FTS5) and embedding candidates are produced in parallel, each restricted to
+    the requested age group / duration via the indexed age_min/age_max/duration_minutes columns, and
+    merged with reciprocal rank fusion. A retriever that misses the latency budget is skipped rather
+    than waited for. Returns up to k sqlite3.Row activities, best first. If the filters exclude every
+    match, the unfiltered best matches are returned instead of nothing.
+    """
+    started = time.perf_counter()
+    deadline = started + latency_budget_ms / 1000
+    filter_clause, filter_params = activity_attributes.filter_sql(user_age_pref, user_duration_minutes, "a")
+    fused_ids = _fused_candidates(user_prompt, db_name, filter_clause, filter_params, deadline)
+    if not fused_ids and filter_clause:
+        print("Retrieval: No activity matches the age/duration filters, using unfiltered matches.")
+        fused_ids = _fused_candidates(user_prompt, db_name, "", (), deadline)
+    rows_by_id = _fetch_activities(fused_ids[:k], db_name)
+    ranked = [rows_by_id[activity_id] for activity_id in fused_ids[:k] if activity_id in rows_by_id]
+    print(f"Retrieval: {len(ranked)} activities from {len(fused_ids)} fused candidates in "
+          f"{(time.perf_counter() - started) * 1000:.1f}ms.")
+    return ranked
@@ -0,0 +1,104 @@
+import os
+import json
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Configuration ---
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+REQUEST_TIMEOUT_SECONDS = 20
+HTTP_POOL_SIZE = 10  # Keep-alive connections per host; should be >= the scraper's concurrency
+RETRY_TOTAL = 4
+RETRY_BACKOFF_FACTOR = 1.0  # Waits 0s, 2s, 4s, 8s between attempts (Retry-After is honored when sent)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+HTTP_CACHE_DIR = "http_cache"  # ETag/Last-Modified validators and bodies of fetched pages
+DEFAULT_ENCODING = "utf-8"  # Used when the response declares no charset (NodeBB always serves UTF-8)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# --- Session ---
+def get_session():
+    """
+    Returns the process-wide requests.Session. Its connection pool keeps TCP+TLS connections alive
+    across fetches, and its adapter retries 429/5xx responses with exponential backoff.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF_FACTOR,
+                              status_forcelist=RETRY_STATUS_CODES, allowed_methods=frozenset(["GET", "HEAD"]),
+                              respect_retry_after_header=True, raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.headers.update({'User-Agent': USER_AGENT})
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+# --- Conditional GET Cache ---
+def _cache_paths(url, cache_dir):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".json"), os.path.join(cache_dir, key + ".body")
+
+
+def _read_cache_entry(url, cache_dir):
+    meta_path, body_path = _cache_paths(url, cache_dir)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, encoding="utf-8") as f:
+            return meta, f.read()
+    except (OSError, json.JSONDecodeError):
+        return None, None
+
+
+def _write_cache_entry(url, cache_dir, meta, text):
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path, body_path = _cache_paths(url, cache_dir)
+    # Body first, then metadata: a crash in between leaves a body without validators, which is never used
+    for path, content in ((body_path, text), (meta_path, json.dumps(meta, ensure_ascii=False))):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def fetch_text(url, cache_dir=HTTP_CACHE_DIR, use_cache=True):
+    """
+    GETs url through the shared session and returns the decoded page text.
+    When the page was fetched before, its ETag/Last-Modified are sent as If-None-Match/If-Modified-Since,
+    and a 304 answer is served from the on-disk copy without downloading the body again.
+    Raises requests exceptions like a plain requests.get + raise_for_status would.
+    """
+    meta, cached_text = _read_cache_entry(url, cache_dir) if use_cache else (None, None)
+    headers = {}
+    if meta and cached_text is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+    if response.status_code == 304 and cached_text is not None:
+        print(f"HTTP: {url} not modified (304), using cached copy.")
+        return cached_text
+    response.raise_for_status()
+    # Trust the declared charset; charset detection (apparent_encoding) would scan the whole body.
+    # Without one, requests assumes ISO-8859-1 for text/*, which garbles Hebrew.
+    if "charset=" not in response.headers.get("Content-Type", "").lower():
+        response.encoding = DEFAULT_ENCODING
+    text = response.text
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if use_cache and (etag or last_modified):
+        _write_cache_entry(url, cache_dir, {"url": url, "etag": etag, "last_modified": last_modified}, text)
+    return text
@@ -0,0 +1,68 @@
+import pytest
+import activity_attributes
+import db
+
+
+@pytest.mark.parametrize("duration, expected", [
+    ("60 דקות", (60, 60)),
+    ("35-40 דקות", (35, 40)),
+    ("שעה עד שעה וחצי", (60, 90)),
+    ("2 שעות", (120, 120)),
+    ("1.5 שעות", (90, 90)),
+    ("1.5-2 שעות", (90, 120)),
+    ("1 שעה", (60, 60)),
+    ("2 שעות וחצי", (150, 150)),
+    ("כ-2 שעות (120 דקות)", (120, 120)),
+    ("1 או 2 שעות", (60, 120)),
+    ("45 דקות + 15 דקות הכנה", (60, 60)),
+    ("שעה + 20 דקות", (80, 80)),
+    ("שבוע", None),
+])
+def test_parse_duration_range(duration, expected):
+    assert activity_attributes.parse_duration_range(duration) == expected
+
+
+@pytest.mark.parametrize("age_group, expected", [
+    ("גילאי 10-14", (10, 14)),
+    ("כיתות ז-ח", (12, 13)),
+    ("כיתה ו", (11, 11)),
+    ("כיתה יא'", (16, 16)),
+    ("שכבה בוגרת", (16, 18)),
+    ("כל הגילאים", None),
+])
+def test_parse_age_range(age_group, expected):
+    assert activity_attributes.parse_age_range(age_group) == expected
+
+
+def test_backfill_skips_rows_it_already_tried(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    try:
+        with db.transaction(db_name) as cursor:
+            cursor.execute("CREATE TABLE scout_activities (id INTEGER PRIMARY KEY, age_group TEXT, duration TEXT)")
+            cursor.executemany("INSERT INTO scout_activities (age_group, duration) VALUES (?, ?)",
+                               [("גילאי 10-12", "60 דקות"), ("כל הגילאים", "זמן משתנה")])
+        assert activity_attributes.backfill(db_name) == 1
+        with db.transaction(db_name) as cursor:
+            assert activity_attributes.backfill_columns(cursor) == 0
+            cursor.execute("SELECT COUNT(*) FROM scout_activities WHERE attributes_parsed = ?",
+                           (activity_attributes.PARSER_VERSION,))
+            assert cursor.fetchone()[0] == 2
+            cursor.execute("INSERT INTO scout_activities (age_group, duration) VALUES ('כיתות ז-ח', NULL)")
+            assert activity_attributes.backfill_columns(cursor) == 1  # Only the new row is parsed
+    finally:
+        db.close_connection(db_name)
+
+
+def test_backfill_reparses_rows_from_an_older_parser(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    try:
+        with db.transaction(db_name) as cursor:
+            cursor.execute("CREATE TABLE scout_activities (id INTEGER PRIMARY KEY, age_group TEXT, duration TEXT)")
+            activity_attributes.setup_columns(cursor)
+            cursor.execute("INSERT INTO scout_activities (age_group, duration, duration_minutes, attributes_parsed) "
+                           "VALUES (NULL, '1 שעה', 30, 1)")  # Stored by the parser that read it as (1, 60)
+            assert activity_attributes.backfill_columns(cursor) == 1
+            cursor.execute("SELECT duration_minutes FROM scout_activities")
+            assert cursor.fetchone()[0] == 60
+    finally:
+        db.close_connection(db_name)
@@ -0,0 +1,36 @@
+import activity_index
+import db
+import peula_db_manager
+from benchmarks import synthetic_corpus
+
+
+def test_setup_index_leaves_an_unchanged_schema_alone(tmp_path, monkeypatch):
+    db_name = str(tmp_path / "activities.db")
+    monkeypatch.setattr(peula_db_manager, "DB_NAME", db_name)
+    peula_db_manager.setup_database()
+    try:
+        connection = db.get_connection(db_name)
+        schema_version = connection.execute("PRAGMA schema_version").fetchone()[0]
+        for _ in range(3):
+            activity_index.ensure_index(db_name)
+        assert connection.execute("PRAGMA schema_version").fetchone()[0] == schema_version
+    finally:
+        db.close_connection(db_name)
+
+
+def test_setup_index_replaces_an_outdated_update_trigger(tmp_path, monkeypatch):
+    db_name = str(tmp_path / "activities.db")
+    monkeypatch.setattr(peula_db_manager, "DB_NAME", db_name)
+    peula_db_manager.setup_database()
+    try:
+        peula_db_manager.add_activities_bulk([synthetic_corpus.activity(0)])
+        with db.transaction(db_name) as cursor:  # The pre-change trigger, which fired on any UPDATE
+            cursor.execute("DROP TRIGGER scout_activities_fts_update")
+            cursor.execute("CREATE TRIGGER scout_activities_fts_update AFTER UPDATE ON scout_activities BEGIN "
+                           "SELECT 1; END")
+        activity_index.ensure_index(db_name)
+        sql = db.get_connection(db_name).execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'scout_activities_fts_update'").fetchone()[0]
+        assert "AFTER UPDATE OF topic" in sql
+    finally:
+        db.close_connection(db_name)
@@ -0,0 +1,20 @@
+import pytest
+import context_builder
+import llm_scheduler
+from benchmarks import synthetic_corpus
+
+PROMPT = "פעולה על גיבוש ואמון בקבוצה"
+
+
+@pytest.mark.parametrize("token_budget", [40, 130, context_builder.CONTEXT_TOKEN_BUDGET])
+def test_pack_excerpts_stays_within_the_budget(token_budget):
+    texts = [item["games_and_methods"] for item in synthetic_corpus.activities(0, 3)]
+    excerpts = context_builder.pack_excerpts(PROMPT, texts, token_budget=token_budget)
+    assert len(excerpts) == len(texts)
+    max_chunk_tokens = max(1, min(context_builder.MAX_CHUNK_TOKENS, token_budget // len(texts)))
+    used = 0
+    for text, excerpt in zip(texts, excerpts):
+        assert excerpt  # Every activity gets at least its best chunk
+        chunks = context_builder.split_into_chunks(text, max_chunk_tokens)
+        used += sum(llm_scheduler.estimate_tokens(chunk) for chunk in chunks if chunk in excerpt)
+    assert 0 < used <= token_budget
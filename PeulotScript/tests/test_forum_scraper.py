@@ -0,0 +1,82 @@
+import json
+import pytest
+import db
+import crawl_frontier
+import forum_scraper
+import topic_extractor
+from benchmarks import fixture_server
+
+
+@pytest.fixture(autouse=True)
+def _no_politeness_delay(monkeypatch):
+    monkeypatch.setattr(forum_scraper, "REQUESTS_PER_SECOND_PER_HOST", 1e9)
+    monkeypatch.setattr(forum_scraper, "RATE_LIMIT_BURST", 1e9)
+    monkeypatch.setattr(forum_scraper, "_host_buckets", {})
+    monkeypatch.setattr(forum_scraper, "_api_unavailable_hosts", set())
+
+
+def _start(serve_api=True):
+    base_url, names, server = fixture_server.start(serve_api=serve_api)
+    return base_url, names, server, server.RequestHandlerClass
+
+
+@pytest.fixture
+def frontier_db(tmp_path):
+    db_name = str(tmp_path / "frontier.db")
+    yield db_name
+    db.close_connection(db_name)
+
+
+def test_category_listing_follows_pagination_next(frontier_db):
+    base_url, _, server, handler = _start()
+    try:
+        added = forum_scraper.discover_topics(f"{base_url}/category/20", max_pages=10, db_name=frontier_db)
+    finally:
+        server.shutdown()
+    assert added == fixture_server.CATEGORY_TOPICS
+    # Stops at the page whose pagination.next is inactive, without probing past it
+    assert handler.requested_paths == ["/api/category/20", "/api/category/20?page=2", "/api/category/20?page=3"]
+
+
+def test_topic_api_picks_the_post_named_by_main_pid():
+    base_url, names, server, handler = _start()
+    main_post = {"pid": 7, "content": "<p>פעולה: משחק שטח עם מפה ומצפן לכל הקבוצות, שלושה שלבים וסיכום</p>"}
+    reply = {"pid": 9, "content": "<p>תגובה: תודה רבה, נשתמש בזה בשבט</p>"}
+    page, _ = handler.fixtures[names[0]]
+    handler.fixtures[names[0]] = (page, json.dumps({"mainPid": 7, "posts": [reply, main_post]}).encode("utf-8"))
+    try:
+        text = forum_scraper.fetch_topic_activity(f"{base_url}/topic/1/{names[0]}")
+    finally:
+        server.shutdown()
+    assert text == topic_extractor.extract_post_content_text(main_post["content"])
+
+
+def test_falls_back_to_html_when_the_api_returns_404(frontier_db):
+    base_url, names, server, handler = _start(serve_api=False)
+    try:
+        text = forum_scraper.fetch_topic_activity(f"{base_url}/topic/1/{names[0]}")
+        added = forum_scraper.discover_topics(f"{base_url}/category/20", max_pages=10, db_name=frontier_db)
+    finally:
+        server.shutdown()
+    page, _ = handler.fixtures[names[0]]
+    assert text == topic_extractor.extract_first_post_text(page.decode("utf-8"))
+    assert added == fixture_server.CATEGORY_TOPICS
+    # One 404 switches the host to the HTML pages for the rest of the run
+    assert [path for path in handler.requested_paths if path.startswith("/api/")] == [f"/api/topic/1/{names[0]}"]
+
+
+def test_known_topics_left_pending_are_never_fetched(frontier_db):
+    base_url, names, server, handler = _start()
+    listed = f"{base_url}/topic/3/{names[3 % len(names)]}"  # Also on the category's first page
+    unlisted = f"{base_url}/topic/99/{names[0]}"
+    crawl_frontier.add_urls([listed, unlisted], crawl_frontier.KIND_TOPIC, db_name=frontier_db)
+    known_urls = ["https://forum.example/topic/3/other-slug", unlisted]  # Stored earlier, under any host/slug
+    try:
+        fetched = dict(forum_scraper.iter_forum_activities(f"{base_url}/category/20", max_pages=10,
+                                                           known_urls=known_urls, db_name=frontier_db))
+    finally:
+        server.shutdown()
+    assert listed not in fetched and unlisted not in fetched
+    assert len(fetched) == fixture_server.CATEGORY_TOPICS - 1
+    assert not [path for path in handler.requested_paths if path.startswith(("/api/topic/3/", "/api/topic/99/"))]
+    assert crawl_frontier.get_state(listed, frontier_db) == crawl_frontier.get_state(unlisted, frontier_db) == "done"
@@ -0,0 +1,27 @@
+import pytest
+import vector_store
+import generation_cache
+
+CHALLENGING = "פעולה על גיבוש לכיתה ז שתהיה מאתגרת"
+NOT_CHALLENGING = "פעולה על גיבוש לכיתה ז שלא תהיה מאתגרת"
+
+
+def test_exact_prompt_is_served_from_the_cache():
+    cache = generation_cache.GenerationCache()
+    cache.put(CHALLENGING, 60, "כיתה ז", "פעולה")
+    assert cache.get("  פעולה על גיבוש, לכיתה ז שתהיה מאתגרת! ", 60, "כיתה ז") == "פעולה"
+    assert cache.get(CHALLENGING, 90, "כיתה ז") is None
+
+
+def test_prompt_with_the_opposite_meaning_is_a_miss_by_default():
+    cache = generation_cache.GenerationCache()
+    cache.put(CHALLENGING, 60, None, "פעולה מאתגרת")
+    assert cache.get(NOT_CHALLENGING, 60, None) is None
+    assert cache.stats["near_hits"] == 0
+
+
+def test_near_duplicate_lookup_refuses_the_lexical_embedder():
+    with pytest.raises(ValueError):
+        generation_cache.GenerationCache(min_similarity=0.9)
+    with pytest.raises(ValueError):
+        generation_cache.GenerationCache(min_similarity=0.9, embedder=vector_store.HashingEmbedder())
@@ -0,0 +1,39 @@
+import pytest
+import llm_provider
+import generation_cache
+import generator_backend
+
+ACTIVITY = "פעולה על גיבוש. אם יש שגיאה בחידון, הקבוצה מתחילה מחדש."
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = generation_cache.GenerationCache()
+    monkeypatch.setattr(generation_cache, "get_generation_cache", lambda: cache)
+    yield cache
+    llm_provider.set_llm_backend(None)
+
+
+def _failing_responder(prompt):
+    raise RuntimeError("boom")
+
+
+def test_activity_mentioning_an_error_is_cached(fresh_cache):
+    llm_provider.use_fake_llm(lambda prompt: ACTIVITY)
+    result = generator_backend.generate_activity_with_llm_for_frontend("פעולה על גיבוש", 60)
+    assert not isinstance(result, generator_backend.GenerationError)
+    assert fresh_cache.get("פעולה על גיבוש", 60, None) == ACTIVITY
+
+    streamed = list(generator_backend.stream_activity_with_llm_for_frontend("פעולה על אמון", 45))
+    assert not any(isinstance(chunk, generator_backend.GenerationError) for chunk in streamed)
+    assert fresh_cache.get("פעולה על אמון", 45, None) == ACTIVITY
+
+
+def test_failed_generation_is_flagged_and_not_cached(fresh_cache):
+    llm_provider.use_fake_llm(_failing_responder)
+    result = generator_backend.generate_activity_with_llm_for_frontend("פעולה על גיבוש", 60)
+    assert isinstance(result, generator_backend.GenerationError)
+
+    streamed = list(generator_backend.stream_activity_with_llm_for_frontend("פעולה על גיבוש", 60))
+    assert isinstance(streamed[-1], generator_backend.GenerationError)
+    assert len(fresh_cache) == 0
@@ -0,0 +1,21 @@
+import db
+import llm_cache
+
+
+def _stored_hits(db_name):
+    cursor = db.get_connection(db_name).cursor()
+    cursor.execute("SELECT hits FROM llm_parse_cache")
+    return cursor.fetchone()[0]
+
+
+def test_lookups_batch_their_hit_updates(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    try:
+        llm_cache.store_parse("fake", "v1", "טקסט פעולה", {"topic": "גיבוש"}, db_name=db_name)
+        for _ in range(3):
+            assert llm_cache.get_cached_parse("fake", "v1", "טקסט פעולה", db_name=db_name) == {"topic": "גיבוש"}
+        assert not db.get_connection(db_name).in_transaction
+        assert _stored_hits(db_name) == 0  # Lookups didn't write
+        assert llm_cache.get_stats(db_name)["lifetime_hits"] == 3
+    finally:
+        db.close_connection(db_name)
@@ -0,0 +1,183 @@
+import time
+import threading
+import pytest
+import llm_provider
+import llm_scheduler
+from llm_provider import FakeLLM, FakeRateLimitError
+
+
+def _scheduler(**limits):
+    options = {"max_in_flight": 4, "requests_per_minute": None, "tokens_per_minute": None,
+               "backoff_base_seconds": 0.01, "backoff_max_seconds": 0.05}
+    options.update(limits)
+    return llm_scheduler.LLMScheduler(**options)
+
+
+class _FlakyCall:
+    """Raises `error` for the first `failures` calls, then answers."""
+
+    def __init__(self, failures, error=FakeRateLimitError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error()
+        return "ok"
+
+
+# --- map ---
+def test_map_yields_results_in_input_order_under_random_latency():
+    llm = FakeLLM(responder=lambda prompt: f"answer to {prompt}", latency_seconds=0.001,
+                  latency_jitter_seconds=0.02, seed=7)
+    scheduler = _scheduler()
+    try:
+        prompts = [f"prompt {i}" for i in range(40)]
+        results = list(scheduler.map(lambda prompt: scheduler.complete(llm, prompt).text, iter(prompts)))
+    finally:
+        scheduler.shutdown()
+    assert results == [f"answer to {prompt}" for prompt in prompts]
+    assert llm.calls == 40
+
+
+def test_callers_never_exceed_max_in_flight():
+    # More caller threads than the limit (map's own pool has exactly max_in_flight workers, so it can't
+    # show the scheduler's semaphore at work)
+    in_flight, peak = 0, 0
+    lock = threading.Lock()
+
+    def call():
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+
+    scheduler = _scheduler(max_in_flight=3)
+    callers = [threading.Thread(target=lambda: [scheduler.call(call) for _ in range(3)]) for _ in range(10)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert peak == 3
+
+
+# --- Budgets ---
+def test_requests_per_minute_budget_makes_callers_wait(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "RATE_WINDOW_SECONDS", 0.2)
+    scheduler = _scheduler(requests_per_minute=2)
+    started = time.monotonic()
+    for _ in range(3):
+        scheduler.call(lambda: None)
+    assert time.monotonic() - started >= 0.18  # The third request waited for the window to slide
+    assert scheduler.stats["requests"] == 3
+
+
+def test_tokens_per_minute_budget_makes_callers_wait(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "RATE_WINDOW_SECONDS", 0.2)
+    scheduler = _scheduler(tokens_per_minute=100)
+    started = time.monotonic()
+    scheduler.call(lambda: None, estimated_tokens=60)
+    assert time.monotonic() - started < 0.1
+    scheduler.call(lambda: None, estimated_tokens=60)  # 120 > 100: waits for the first to leave the window
+    assert time.monotonic() - started >= 0.18
+
+
+def test_oversized_request_still_goes_through_alone(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "RATE_WINDOW_SECONDS", 0.2)
+    scheduler = _scheduler(tokens_per_minute=100)
+    assert scheduler.call(lambda: "ok", estimated_tokens=500) == "ok"
+
+
+# --- Backoff and retries ---
+def test_rate_limited_call_is_retried_after_backoff():
+    scheduler = _scheduler(max_retries=5)
+    flaky = _FlakyCall(failures=2)
+    started = time.monotonic()
+    assert scheduler.call(flaky) == "ok"
+    assert flaky.calls == 3
+    assert scheduler.stats["rate_limited"] == 2
+    assert time.monotonic() - started >= 0.01  # At least the first backoff (base 0.01s, jitter >= 0.5)
+
+
+def test_retry_after_hint_sets_the_pause():
+    scheduler = _scheduler(max_retries=1)
+    flaky = _FlakyCall(failures=1, error=lambda: FakeRateLimitError(retry_after=0.1))
+    started = time.monotonic()
+    assert scheduler.call(flaky) == "ok"
+    assert time.monotonic() - started >= 0.1
+
+
+def test_gives_up_after_the_retry_limit():
+    scheduler = _scheduler(max_retries=2)
+    flaky = _FlakyCall(failures=10)
+    with pytest.raises(FakeRateLimitError):
+        scheduler.call(flaky)
+    assert flaky.calls == 3  # The first attempt plus max_retries
+    assert scheduler.stats["failed"] == 1
+
+
+def test_other_errors_are_not_retried():
+    scheduler = _scheduler(max_retries=5)
+    flaky = _FlakyCall(failures=1, error=lambda: ValueError("quota project not set"))
+    with pytest.raises(ValueError):
+        scheduler.call(flaky)
+    assert flaky.calls == 1
+
+
+def test_fake_llm_rate_limits_are_absorbed_by_retries():
+    llm = FakeLLM(responder=lambda prompt: prompt.upper(), rate_limit_rate=0.3, seed=3)
+    scheduler = _scheduler(max_retries=20)
+    try:
+        results = list(scheduler.map(lambda prompt: scheduler.complete(llm, prompt).text,
+                                     [f"p{i}" for i in range(20)]))
+    finally:
+        scheduler.shutdown()
+    assert results == [f"P{i}" for i in range(20)]
+    assert llm.rate_limited_calls > 0
+    assert scheduler.stats["rate_limited"] == llm.rate_limited_calls
+
+
+# --- Error classification ---
+class ResourceExhausted(Exception):  # Named like google.api_core.exceptions.ResourceExhausted
+    pass
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error, expected", [
+    (FakeRateLimitError(), True),
+    (_StatusError(429), True),
+    (ResourceExhausted("anything"), True),
+    (_StatusError(500), False),
+    (ValueError("API key not valid. Please check your quota settings."), False),
+    (RuntimeError("rate limit in the message only"), False),
+])
+def test_is_rate_limit_error(error, expected):
+    assert llm_scheduler.is_rate_limit_error(error) is expected
+
+
+def test_is_rate_limit_error_follows_wrapped_causes():
+    try:
+        try:
+            raise _StatusError(429)
+        except _StatusError as e:
+            raise RuntimeError("completion failed") from e
+    except RuntimeError as wrapped:
+        assert llm_scheduler.is_rate_limit_error(wrapped)
+
+
+def test_use_fake_llm_routes_get_llm_to_the_fake():
+    llm_provider.use_fake_llm(lambda prompt: "fake answer")
+    try:
+        assert llm_provider.get_llm("any-model").complete("hi").text == "fake answer"
+    finally:
+        llm_provider.set_llm_backend(None)
@@ -0,0 +1,62 @@
+import db
+import near_duplicates
+from benchmarks import synthetic_corpus
+
+
+def _store(db_name, texts):
+    with db.transaction(db_name) as cursor:
+        cursor.execute("CREATE TABLE scout_activities (id INTEGER PRIMARY KEY, games_and_methods TEXT)")
+        near_duplicates.setup_tables(cursor)
+        cursor.executemany("INSERT INTO scout_activities (id, games_and_methods) VALUES (?, ?)", enumerate(texts, 1))
+        near_duplicates.index_missing(cursor)
+
+
+def test_similarity_estimates_jaccard():
+    text = synthetic_corpus.activity(0)["games_and_methods"]
+    words = text.split()
+    edited = " ".join("שונה" if i % 40 == 0 else word for i, word in enumerate(words))
+    shingles_a, shingles_b = set(near_duplicates.shingles(text)), set(near_duplicates.shingles(edited))
+    exact = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+    estimate = near_duplicates.similarity(near_duplicates.signature(text), near_duplicates.signature(edited))
+    assert abs(estimate - exact) < 0.15
+
+
+def test_batch_lookup_matches_single_lookups(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    stored = [item["games_and_methods"] for item in synthetic_corpus.activities(0, 50)]
+    try:
+        _store(db_name, stored)
+        queries = stored[:3] + [item["games_and_methods"] for item in synthetic_corpus.activities(50, 3)] + [""]
+        signatures = [near_duplicates.signature(text) for text in queries]
+        cursor = db.get_connection(db_name).cursor()
+        found = near_duplicates.find_near_duplicates(cursor, signatures)
+        assert found == [near_duplicates.find_near_duplicate(cursor, sig) for sig in signatures]
+        assert found == [(1, 1.0), (2, 1.0), (3, 1.0), None, None, None, None]
+    finally:
+        db.close_connection(db_name)
+
+
+def test_signatures_from_another_hash_are_recomputed(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    try:
+        _store(db_name, [synthetic_corpus.activity(0)["games_and_methods"]])
+        with db.transaction(db_name) as cursor:
+            cursor.execute("UPDATE activity_lsh SET bucket = bucket + 1")
+            near_duplicates.setup_tables(cursor)
+            assert near_duplicates.index_missing(cursor) == 1
+    finally:
+        db.close_connection(db_name)
+
+
+def test_activities_without_words_are_not_reindexed(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    try:
+        _store(db_name, ["", synthetic_corpus.activity(0)["games_and_methods"]])
+        with db.transaction(db_name) as cursor:
+            near_duplicates.setup_tables(cursor)
+            assert near_duplicates.index_missing(cursor) == 0
+            cursor.execute("SELECT COUNT(*) FROM activity_minhash")
+            assert cursor.fetchone()[0] == 2
+            assert near_duplicates.find_near_duplicates(cursor, [near_duplicates.signature("פעולה")]) == [None]
+    finally:
+        db.close_connection(db_name)
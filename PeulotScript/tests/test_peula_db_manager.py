@@ -0,0 +1,35 @@
+import pytest
+import db
+import peula_db_manager
+from benchmarks import synthetic_corpus
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    db_name = str(tmp_path / "activities.db")
+    monkeypatch.setattr(peula_db_manager, "DB_NAME", db_name)
+    peula_db_manager.setup_database()
+    yield db_name
+    db.close_connection(db_name)
+
+
+def test_bulk_insert_reports_each_url(temp_db):
+    first, second, third = synthetic_corpus.activities(0, 3)
+    near_copy = dict(first, source_url="https://forum.example/topic/copy")
+    assert peula_db_manager.add_activities_bulk([first]) == {first["source_url"]: peula_db_manager.INSERT_ADDED}
+
+    statuses = peula_db_manager.add_activities_bulk([first, second, near_copy, third])
+    assert statuses == {
+        first["source_url"]: peula_db_manager.INSERT_DUPLICATE,
+        second["source_url"]: peula_db_manager.INSERT_ADDED,
+        near_copy["source_url"]: peula_db_manager.INSERT_DUPLICATE,
+        third["source_url"]: peula_db_manager.INSERT_ADDED,
+    }
+    count = db.get_connection(temp_db).execute("SELECT COUNT(*) FROM scout_activities").fetchone()[0]
+    assert count == 3
+
+
+def test_bulk_insert_reports_failure_on_database_error(temp_db):
+    db.get_connection(temp_db).execute("DROP TABLE activity_lsh")
+    item = synthetic_corpus.activity(0)
+    assert peula_db_manager.add_activities_bulk([item]) == {item["source_url"]: peula_db_manager.INSERT_FAILED}
@@ -0,0 +1,27 @@
+import os
+import glob
+import pytest
+import topic_extractor
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                         "benchmarks", "fixtures", "*.html")))
+
+
+def _page(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_fast_extractor_matches_bs4(path):
+    page = _page(path)
+    assert topic_extractor.extract_first_post_text(page, "fast") == topic_extractor.extract_first_post_text(page, "bs4")
+
+
+def test_implicitly_closed_tags_end_at_the_post_div():
+    page = ('<div class="content" component="post/content"><p>שלב ראשון: משחק פתיחה עם כדור<ul><li>עשר דקות'
+            '<li>חמש דקות</ul><blockquote data-username="u1"><p>ציטוט</blockquote><p>סיכום והסבר</div>'
+            '<li component="post"><div class="content" component="post/content"><p>תגובה</div></li>'
+            '<div class="sidebar">סרגל צד</div>')
+    assert topic_extractor.extract_segments_fast(page) == ["שלב ראשון: משחק פתיחה עם כדור", "עשר דקות",
+                                                           "חמש דקות", "סיכום והסבר"]
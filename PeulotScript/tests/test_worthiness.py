@@ -0,0 +1,27 @@
+import db
+import worthiness
+from benchmarks import synthetic_corpus
+
+QUESTION_POST = "מישהו מכיר פעולה טובה על אמון?\n" * 6
+LONG_CHAT_POST = "\n".join(["היה ערב נחמד בשבט אתמול, תודה לכל מי שהגיע ועזר בסידורים"] * 6)
+
+
+def test_only_posts_rejected_by_the_scorer_are_training_negatives(tmp_path):
+    db_name = str(tmp_path / "activities.db")
+    try:
+        with db.transaction(db_name) as cursor:
+            cursor.execute("CREATE TABLE scout_activities (id INTEGER PRIMARY KEY, games_and_methods TEXT)")
+            cursor.executemany("INSERT INTO scout_activities (games_and_methods) VALUES (?)",
+                               [(item["games_and_methods"],) for item in synthetic_corpus.activities(0, 20)])
+        worthiness.record_rejected("https://example.org/short", "קצר", "too short", db_name=db_name)
+        worthiness.record_rejected("https://example.org/question", QUESTION_POST, "negative keyword", db_name=db_name)
+        worthiness.record_rejected("https://example.org/chat", LONG_CHAT_POST, "positive hits: 0", db_name=db_name)
+        cursor = db.get_connection(db_name).cursor()
+        cursor.execute("SELECT source_url, stage FROM rejected_posts ORDER BY source_url")
+        assert cursor.fetchall() == [("https://example.org/chat", worthiness.STAGE_SCORER),
+                                     ("https://example.org/question", worthiness.STAGE_PRE_GATE),
+                                     ("https://example.org/short", worthiness.STAGE_PRE_GATE)]
+        model = worthiness.train_from_db(db_name, path=str(tmp_path / "model.json"))
+        assert model.trained_on["negatives"] == 1
+    finally:
+        db.close_connection(db_name)
@@ -0,0 +1,149 @@
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+# --- Configuration ---
+TOPIC_EXTRACTOR = "fast"  # "fast" (streaming, falls back to "bs4" when it finds no post) or "bs4"
+
+QUOTE_SELECTOR = 'blockquote.inline-quote, div.quote-container, blockquote[data-username]'
+SKIPPED_TEXT_ELEMENTS = frozenset(("script", "style", "template"))
+
+
+# --- Fast path ---
+class _FirstPostFound(Exception):
+    """Raised by the parser to stop reading the page once the first post's content has been collected."""
+
+
+class FirstPostParser(HTMLParser):
+    """
+    Streaming parser that collects the text segments of the first div.content[component="post/content"]
+    (quotes of other posts left out) and stops reading the page right after it, so the comments, sidebar
+    and the large inline JSON NodeBB appends are never parsed. No tree is built.
+    Only div tags are counted to find the end of the post: posts often leave <p> / <li> implicitly closed,
+    which would throw off a count over all tags.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.segments = None  # None until the post content element is found
+        self._div_depth = 0  # Open divs inside the post content, itself included
+        self._skip_tag = None  # Tag of the quote / script being skipped, while inside one
+        self._skip_nesting = 0  # Open elements with that tag name since the skip started
+
+    @staticmethod
+    def _is_post_content(tag, attrs):
+        if tag != "div":
+            return False
+        attributes = dict(attrs)
+        return (attributes.get("component") == "post/content"
+                and "content" in (attributes.get("class") or "").split())
+
+    @staticmethod
+    def _is_quote(tag, attrs):
+        attributes = dict(attrs)
+        classes = (attributes.get("class") or "").split()
+        return ((tag == "blockquote" and ("inline-quote" in classes or "data-username" in attributes))
+                or (tag == "div" and "quote-container" in classes))
+
+    def handle_starttag(self, tag, attrs):
+        if self.segments is None:
+            if self._is_post_content(tag, attrs):
+                self.segments = []
+                self._div_depth = 1
+            return
+        if tag == "div":
+            self._div_depth += 1
+        if self._skip_tag is None:
+            if tag in SKIPPED_TEXT_ELEMENTS or self._is_quote(tag, attrs):
+                self._skip_tag, self._skip_nesting = tag, 1
+        elif tag == self._skip_tag:
+            self._skip_nesting += 1
+
+    def handle_startendtag(self, tag, attrs):
+        pass  # <br/>, <img/>: no text and no nesting
+
+    def handle_endtag(self, tag):
+        if self.segments is None:
+            return
+        if tag == self._skip_tag:
+            self._skip_nesting -= 1
+            if self._skip_nesting == 0:
+                self._skip_tag = None
+        if tag == "div":
+            self._div_depth -= 1
+            if self._div_depth == 0:
+                raise _FirstPostFound()
+
+    def handle_data(self, data):
+        if self.segments is not None and self._skip_tag is None:
+            data = data.strip()
+            if data:
+                self.segments.append(data)
+
+
+def extract_segments_fast(page_html):
+    """Text segments of the first post via FirstPostParser, or None if the page has no post content element."""
+    parser = FirstPostParser()
+    try:
+        parser.feed(page_html)
+        parser.close()
+    except _FirstPostFound:
+        pass
+    return parser.segments
+
+
+# --- BeautifulSoup path ---
+def extract_segments_bs4(page_html):
+    """
+    Text segments of the first post from a full BeautifulSoup tree, trying the first post's li first and
+    looser selectors after it. Slower, but tolerant of layouts the fast path doesn't recognize.
+    """
+    soup = BeautifulSoup(page_html, "html.parser")
+    first_post_content_div = None
+    all_post_lis = soup.select('li[component="post"]')
+    if all_post_lis:
+        first_post_li = all_post_lis[0]
+        first_post_content_div = first_post_li.select_one('div.content[component="post/content"]')
+        if not first_post_content_div:
+            first_post_content_div = first_post_li.select_one('div.content')
+
+    if not first_post_content_div:
+        first_post_content_div = soup.select_one('div.content[component="post/content"]')
+    if not first_post_content_div:
+        first_post_content_div = soup.select_one('div.content')
+    if not first_post_content_div:
+        return None
+
+    for quote in first_post_content_div.select(QUOTE_SELECTOR):
+        quote.decompose()
+    return list(first_post_content_div.stripped_strings)
+
+
+EXTRACTORS = {"fast": extract_segments_fast, "bs4": extract_segments_bs4}
+
+
+# --- Extraction ---
+def _finish_text(segments):
+    activity_text = re.sub(r'\n\s*\n', '\n\n', "\n".join(segments)).strip()
+    if len(activity_text) < 50 and ("loading" in activity_text.lower() or "טוען" in activity_text.lower()):
+        return None
+    return activity_text
+
+
+def extract_post_content_text(content_html):
+    """Text of a post's rendered content HTML (e.g. the "content" field of NodeBB's topic JSON), quotes left out."""
+    return _finish_text(extract_segments_fast(f'<div class="content" component="post/content">{content_html}</div>'))
+
+
+def extract_first_post_text(page_html, extractor=None):
+    """
+    The first post's text of a NodeBB topic page, or None if the page has no post content (or only the
+    "loading" placeholder). The fast extractor falls back to BeautifulSoup when it finds no post.
+    """
+    extractor = extractor or TOPIC_EXTRACTOR
+    segments = EXTRACTORS[extractor](page_html)
+    if segments is None and extractor != "bs4":
+        segments = extract_segments_bs4(page_html)
+    if segments is None:
+        return None
+    return _finish_text(segments)
@@ -0,0 +1,353 @@
+import sqlite3
+import json
+import os
+import re
+import hashlib
+import time
+import argparse
+from functools import lru_cache
+from dotenv import load_dotenv
+import numpy as np
+import db
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")  # "hashing" (offline) or "gemini"
+GEMINI_EMBEDDING_MODEL_NAME = "models/embedding-001"
+HASHING_EMBEDDING_DIM = 512
+EMBED_BATCH_SIZE = 64
+EMBED_TEXT_MAX_CHARS = 8000  # Long activities are cut before embedding (API input limits)
+VECTOR_STORE_DIR = "vector_index"  # Memory-mapped sidecar files next to the DB
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float16")  # "float16" halves the file, "float32" is exact
+SCORE_BLOCK_ROWS = 65536  # Rows scored per block, bounds the temporary float32 copy of a float16/mmap matrix
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+
+# --- Embedders ---
+# An embedder has a `model_name`, a `dim` and `embed(texts) -> float32 array of shape (len(texts), dim)`
+# whose rows are L2-normalized, so cosine similarity is a plain dot product.
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+@lru_cache(maxsize=200000)
+def _hash_feature(feature):
+    """Stable 64-bit hash (Python's hash() is salted per process, so it can't be used for stored vectors)."""
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: signed feature hashing of word tokens and character n-grams.
+    Needs no network or model download, so retrieval works offline and gives the same vectors on every run.
+    Character n-grams give partial credit for Hebrew words with prefixes (e.g. "המשחק" vs "משחק").
+    """
+
+    def __init__(self, dim=HASHING_EMBEDDING_DIM, ngram_size=3):
+        self.dim = dim
+        self.ngram_size = ngram_size
+        self.model_name = f"hashing-{dim}-ngram{ngram_size}"
+
+    def _features(self, text):
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            yield "w:" + token
+            padded = f"<{token}>"
+            for i in range(len(padded) - self.ngram_size + 1):
+                yield "c:" + padded[i:i + self.ngram_size]
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter((_hash_feature(f) for f in self._features(text or "")), dtype=np.uint64)
+            if not len(hashes):
+                continue
+            signs = np.where(hashes >> np.uint64(63), 1.0, -1.0)
+            matrix[row] = np.bincount((hashes % np.uint64(self.dim)).astype(np.int64), weights=signs,
+                                      minlength=self.dim)
+        return normalize_rows(matrix)
+
+
+class GeminiEmbedder:
+    """Embeds with the Gemini embedding API (llama-index-embeddings-gemini)."""
+
+    def __init__(self, api_key=GEMINI_API_KEY, model_name=GEMINI_EMBEDDING_MODEL_NAME):
+        from llama_index.embeddings.gemini import GeminiEmbedding
+        self._model = GeminiEmbedding(api_key=api_key, model_name=model_name)
+        self.model_name = model_name
+        self.dim = None  # Known after the first call
+
+    def embed(self, texts):
+        vectors = np.asarray(self._model.get_text_embedding_batch(list(texts)), dtype=np.float32)
+        self.dim = vectors.shape[1]
+        return normalize_rows(vectors)
+
+
+def get_embedder(backend=EMBEDDING_BACKEND):
+    if backend == "gemini":
+        return GeminiEmbedder()
+    if backend == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def activity_embedding_text(activity):
+    """The text that represents an activity in vector space."""
+    tags = activity["tags"]
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags or "[]")
+        except json.JSONDecodeError:
+            tags = []
+    text = f"{activity['topic']}\n{activity['description']}\n{' '.join(tags or [])}\n{activity['games_and_methods']}"
+    return text[:EMBED_TEXT_MAX_CHARS]
+
+
+def activity_content_hash(embedding_text):
+    """Identifies the embedded content; a row is re-embedded only when this changes."""
+    return hashlib.sha256(embedding_text.encode("utf-8")).hexdigest()
+
+
+# --- Embedding Storage ---
+def setup_embeddings_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_embeddings (
+            activity_id INTEGER NOT NULL,
+            model_name TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,  -- float32, little-endian
+            PRIMARY KEY (activity_id, model_name)
+        )
+    ''')
+
+
+def refresh_embeddings(embedder, db_name=DB_NAME):
+    """
+    Embeds only activities that are new or whose content hash changed since they were last embedded,
+    and drops embeddings of deleted activities. Each batch is committed on its own, so an interrupted
+    refresh keeps what it already paid for. Returns (embedded_count, removed_count).
+    """
+    conn = db.get_connection(db_name)
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        setup_embeddings_table(cursor)
+        conn.commit()
+        cursor.execute("SELECT activity_id, content_hash FROM activity_embeddings WHERE model_name = ?",
+                       (embedder.model_name,))
+        stored_hashes = {row["activity_id"]: row["content_hash"] for row in cursor.fetchall()}
+
+        stale = []  # (activity_id, content_hash, embedding_text)
+        seen_ids = set()
+        cursor.execute("SELECT id, topic, description, games_and_methods, tags FROM scout_activities")
+        for row in cursor.fetchall():
+            seen_ids.add(row["id"])
+            text = activity_embedding_text(row)
+            content_hash = activity_content_hash(text)
+            if stored_hashes.get(row["id"]) != content_hash:
+                stale.append((row["id"], content_hash, text))
+
+        embedded = 0
+        for start in range(0, len(stale), EMBED_BATCH_SIZE):
+            batch = stale[start:start + EMBED_BATCH_SIZE]
+            vectors = embedder.embed([text for _, _, text in batch])
+            cursor.executemany('''
+                INSERT OR REPLACE INTO activity_embeddings (activity_id, model_name, content_hash, dim, vector)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(activity_id, embedder.model_name, content_hash, vectors.shape[1],
+                   vectors[i].astype("<f4").tobytes())
+                  for i, (activity_id, content_hash, _) in enumerate(batch)])
+            conn.commit()
+            embedded += len(batch)
+
+        removed_ids = [activity_id for activity_id in stored_hashes if activity_id not in seen_ids]
+        if removed_ids:
+            cursor.executemany("DELETE FROM activity_embeddings WHERE activity_id = ? AND model_name = ?",
+                               [(activity_id, embedder.model_name) for activity_id in removed_ids])
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if embedded or removed_ids:
+        print(f"VectorStore: Embedded {embedded} new/changed activities, removed {len(removed_ids)} "
+              f"('{embedder.model_name}').")
+    return embedded, len(removed_ids)
+
+
+# --- Vector Index ---
+class VectorIndex:
+    """
+    All activity embeddings in one contiguous matrix (row i belongs to ids[i]), read-only once built:
+    loaded from the DB, or memory-mapped from an export. A query is a single matrix-vector product
+    over the whole table. New rows reach the app through a new export (export_index_files).
+    """
+
+    def __init__(self, ids, matrix, embedder):
+        self.embedder = embedder
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load_from_db(cls, embedder, db_name=DB_NAME):
+        """Loads the stored embeddings of embedder.model_name without calling the embedder."""
+        with db.snapshot(db_name) as cursor:
+            setup_embeddings_table(cursor)
+            cursor.execute("SELECT COUNT(*), MAX(dim) FROM activity_embeddings WHERE model_name = ?",
+                           (embedder.model_name,))
+            total, dim = cursor.fetchone()
+            ids = np.empty(total, dtype=np.int64)
+            matrix = np.empty((total, dim or 0), dtype=np.float32)
+            cursor.execute("SELECT activity_id, vector FROM activity_embeddings WHERE model_name = ? "
+                           "ORDER BY activity_id", (embedder.model_name,))
+            for row, (activity_id, vector) in enumerate(cursor):
+                ids[row] = activity_id
+                matrix[row] = np.frombuffer(vector, dtype="<f4")
+        print(f"VectorStore: Loaded {total} stored embeddings for '{embedder.model_name}'.")
+        return cls(ids, matrix, embedder)
+
+    @classmethod
+    def build_from_db(cls, embedder, db_name=DB_NAME):
+        """Embeds whatever is missing or stale, then loads the stored embeddings."""
+        refresh_embeddings(embedder, db_name)
+        return cls.load_from_db(embedder, db_name)
+
+    def _top_k(self, scores, ids, k):
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), int(ids[i])) for i in top]
+
+    def _scores(self, matrix, query_vectors):
+        """Dot products of every row with the query vector(s), computed block by block."""
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        scores = np.empty((len(matrix),) + query_vectors.shape[1:], dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query_vectors
+        return scores
+
+    def search_vector(self, query_vector, k=3, allowed_ids=None):
+        """
+        Returns [(cosine_similarity, activity_id)] best first.
+        allowed_ids (e.g. the result of an indexed SQL filter) restricts the search to those activities.
+        """
+        if not len(self.ids):
+            return []
+        scores = self._scores(self.matrix, query_vector)
+        if allowed_ids is not None:
+            allowed = np.isin(self.ids, np.fromiter(allowed_ids, dtype=np.int64))
+            return self._top_k(scores[allowed], self.ids[allowed], k)
+        return self._top_k(scores, self.ids, k)
+
+    def search(self, query_text, k=3, allowed_ids=None):
+        return self.search_vector(self.embedder.embed([query_text])[0], k, allowed_ids)
+
+    @classmethod
+    def open_mmap(cls, embedder, directory=VECTOR_STORE_DIR):
+        """
+        Opens the exported index files read-only with np.load(mmap_mode='r'). Nothing is read up front:
+        pages are faulted in by the OS on the first search and shared between all processes that map them.
+        Returns None if no export exists for this embedder.
+        """
+        manifest = read_index_manifest(embedder.model_name, directory)
+        if manifest is None:
+            return None
+        ids = np.load(os.path.join(directory, manifest["ids_file"]), mmap_mode="r")
+        matrix = np.load(os.path.join(directory, manifest["vectors_file"]), mmap_mode="r")
+        index = cls.__new__(cls)
+        index.embedder = embedder
+        index.ids = ids
+        index.matrix = matrix
+        index.manifest = manifest
+        return index
+
+
+# --- Memory-Mapped Index Files ---
+def _index_file_prefix(model_name):
+    return re.sub(r"[^\w.-]", "_", model_name)
+
+
+def read_index_manifest(model_name, directory=VECTOR_STORE_DIR):
+    manifest_path = os.path.join(directory, _index_file_prefix(model_name) + ".json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def export_index_files(model_name, db_name=DB_NAME, directory=VECTOR_STORE_DIR, dtype=VECTOR_STORE_DTYPE):
+    """
+    Writes the stored embeddings of model_name as an .npy matrix plus an .npy int64 id array.
+    The matrix is streamed row by row into an on-disk memmap, so exporting doesn't need the corpus in RAM.
+    A new file pair is written for every export and a small JSON manifest is switched to it atomically,
+    so processes that already mapped the previous files keep working.
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = _index_file_prefix(model_name)
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{time.time_ns() % 1_000_000_000:09d}"
+    vectors_file = f"{prefix}.{version}.vectors.npy"
+    ids_file = f"{prefix}.{version}.ids.npy"
+
+    with db.snapshot(db_name) as cursor:
+        setup_embeddings_table(cursor)
+        cursor.execute("SELECT COUNT(*), MAX(dim) FROM activity_embeddings WHERE model_name = ?", (model_name,))
+        total, dim = cursor.fetchone()
+        vectors = np.lib.format.open_memmap(os.path.join(directory, vectors_file), mode="w+",
+                                            dtype=np.dtype(dtype), shape=(total, dim or 0))
+        ids = np.empty(total, dtype=np.int64)
+        cursor.execute("SELECT activity_id, vector FROM activity_embeddings WHERE model_name = ? "
+                       "ORDER BY activity_id", (model_name,))
+        for row, (activity_id, vector) in enumerate(cursor):
+            ids[row] = activity_id
+            vectors[row] = np.frombuffer(vector, dtype="<f4")
+        vectors.flush()
+        del vectors
+    with open(os.path.join(directory, ids_file), "wb") as f:
+        np.save(f, ids)
+
+    old_manifest = read_index_manifest(model_name, directory)
+    manifest = {"model_name": model_name, "vectors_file": vectors_file, "ids_file": ids_file,
+                "count": int(total), "dim": int(dim or 0), "dtype": str(np.dtype(dtype)), "version": version}
+    manifest_path = os.path.join(directory, prefix + ".json")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    if old_manifest and old_manifest["version"] != version:
+        for old_file in (old_manifest["vectors_file"], old_manifest["ids_file"]):
+            try:
+                os.remove(os.path.join(directory, old_file))
+            except OSError:
+                pass  # Still mapped by a running process (Windows); removed by a later export
+    print(f"VectorStore: Exported {total} embeddings to '{directory}' as {manifest['dtype']}.")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintains the activity embeddings used for vector retrieval.")
+    parser.add_argument("command", choices=["refresh", "search"], nargs="?", default="refresh")
+    parser.add_argument("--dtype", default=VECTOR_STORE_DTYPE, choices=["float16", "float32"])
+    parser.add_argument("--query", default="פעולה כיפית לגיבוש כיתה ז, שעה")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["hashing", "gemini"])
+    args = parser.parse_args()
+
+    cli_embedder = get_embedder(args.backend)
+    if args.command == "refresh":
+        refresh_embeddings(cli_embedder)
+        export_index_files(cli_embedder.model_name, dtype=args.dtype)
+    else:
+        cli_index = VectorIndex.open_mmap(cli_embedder) or VectorIndex.build_from_db(cli_embedder)
+        for score, activity_id in cli_index.search(args.query, k=5):
+            print(f"{score:.3f}  id={activity_id}")
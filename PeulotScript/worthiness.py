@@ -0,0 +1,294 @@
+import re
+import sys
+import threading
+import json
+import math
+import time
+import sqlite3
+import numpy as np
+import db
+
+# --- Configuration ---
+DB_NAME = "scout_activities.db"
+WORTHINESS_MODEL_FILE = "worthiness_model.json"  # Written by `python worthiness.py train`; optional
+MIN_ACTIVITY_LENGTH = 100  # Characters, very basic filter
+MIN_LINES_FOR_ACTIVITY = 5  # Another basic filter
+MIN_POSITIVE_HITS = 2  # Heuristic rule: this many distinct activity keywords...
+MIN_STRUCTURED_LINES = 2  # ...or this many list/timed lines plus one keyword
+WORTHINESS_THRESHOLD = 0.5  # Model probability at or above which a post is sent to Gemini
+TRAINING_EPOCHS = 500
+TRAINING_LEARNING_RATE = 0.5
+TRAINING_L2 = 0.01
+
+POSITIVE_KEYWORDS = (
+    "משחק", "פעילות", "מטרה", "חניכים", "מדריך", "דקות", "שלב",
+    "צ'ופר", "מהלך", "לוז", "לו\"ז", "הסבר", "הוראות", "ציוד",
+    "1.", "2.", "א.", "ב.",  # Common list indicators
+)
+# Stages at which a post is rejected: the pre-gates (length, line count, negative keyword) or the scorer
+STAGE_PRE_GATE = "pre_gate"
+STAGE_SCORER = "scorer"
+# Questions or non-activity posts
+NEGATIVE_KEYWORDS = ("מישהו מכיר", "שאלה:", "מחפש/ת", "רעיון ל", "מה דעתכם", "דיון:")
+
+# Lines that start a list item or a timed stage ("1.", "- ", "* ", "10דק", "10:00"), counted in one pass
+STRUCTURE_PATTERN = re.compile(r'^[ \t]*(?:[1-5]\.|- |\* |\d+דק|\d{1,2}:\d{2})', re.MULTILINE)
+
+# Inputs of the model; posts with a negative keyword are rejected before it, so that isn't one of them
+FEATURE_NAMES = ("log_length", "log_lines", "positive_keywords", "structured_lines", "timings", "questions_per_line")
+
+
+# --- Features ---
+# Features are computed in two stages, cheapest first: most posts are decided by length, line count and
+# keywords alone, and only the rest pay for the structure scan. Keyword presence uses str's C substring
+# search, which measured several times faster here than one big regex alternation (CPython's re tries
+# every alternative at every position; it has no Aho-Corasick automaton).
+
+def _keyword_features(text):
+    lines = text.count("\n") + 1 if text else 0
+    return {
+        "length": len(text),
+        "lines": lines,
+        "positive_keywords": sum(1 for keyword in POSITIVE_KEYWORDS if keyword in text),
+        "negative_keyword": next((keyword for keyword in NEGATIVE_KEYWORDS if keyword in text), None),
+    }
+
+
+def _count_timings(text):
+    """Mentions of a number of minutes ("15 דקות", "10דק"): finds "דק" and checks for a number before it."""
+    timings, position = 0, text.find("דק")
+    while position != -1:
+        before = text[max(0, position - 2):position].rstrip()
+        if before and before[-1].isdigit():
+            timings += 1
+        position = text.find("דק", position + 2)
+    return timings
+
+
+def _pre_gate_reason(features):
+    """Why a post is rejected before the model or heuristic rules see it, or None if it passes the pre-gates."""
+    if features["length"] < MIN_ACTIVITY_LENGTH:
+        return f"too short ({features['length']} chars)"
+    if features["lines"] < MIN_LINES_FOR_ACTIVITY:
+        return f"too few lines ({features['lines']})"
+    if features["negative_keyword"]:
+        return f"negative keyword '{features['negative_keyword']}'"
+    return None
+
+
+def passes_pre_gates(text):
+    return _pre_gate_reason(_keyword_features(text or "")) is None
+
+
+def _add_structure_features(text, features):
+    features["structured_lines"] = len(STRUCTURE_PATTERN.findall(text))
+    features["timings"] = _count_timings(text)
+    features["questions_per_line"] = text.count("?") / features["lines"] if features["lines"] else 0.0
+    features["log_length"] = math.log1p(features["length"])
+    features["log_lines"] = math.log1p(features["lines"])
+    return features
+
+
+def extract_features(text):
+    """All the features of a post (the heuristic rules' and the model's), plus its first negative keyword or None."""
+    text = text or ""
+    return _add_structure_features(text, _keyword_features(text))
+
+
+def _feature_matrix(features_list):
+    return np.array([[features[name] for name in FEATURE_NAMES] for features in features_list], dtype=np.float64)
+
+
+# --- Model ---
+class WorthinessModel:
+    """Logistic regression over the standardized FEATURE_NAMES, trained offline by train_model()."""
+
+    def __init__(self, weights, bias, means, scales, threshold=WORTHINESS_THRESHOLD, trained_on=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.threshold = threshold
+        self.trained_on = trained_on or {}
+
+    def predict_proba(self, matrix):
+        logits = ((matrix - self.means) / self.scales) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def save(self, path=WORTHINESS_MODEL_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"features": FEATURE_NAMES, "weights": self.weights.tolist(), "bias": self.bias,
+                       "means": self.means.tolist(), "scales": self.scales.tolist(),
+                       "threshold": self.threshold, "trained_on": self.trained_on}, f, indent=2)
+
+    @classmethod
+    def load(cls, path=WORTHINESS_MODEL_FILE):
+        """The saved model, or None if there is none (or it was trained on a different feature set)."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if tuple(data.get("features", ())) != FEATURE_NAMES:
+            print("Worthiness: Saved model uses other features, ignoring it (retrain with `python worthiness.py train`).")
+            return None
+        return cls(data["weights"], data["bias"], data["means"], data["scales"], data.get("threshold", WORTHINESS_THRESHOLD),
+                   data.get("trained_on"))
+
+
+_model = None
+_model_loaded = False
+
+
+def get_model():
+    """The trained model from WORTHINESS_MODEL_FILE, loaded once; None means the heuristic rules decide."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        _model = WorthinessModel.load()
+        _model_loaded = True
+    return _model
+
+
+def train_model(positive_texts, negative_texts, epochs=TRAINING_EPOCHS, learning_rate=TRAINING_LEARNING_RATE,
+                l2=TRAINING_L2):
+    """Fits the logistic regression with full-batch gradient descent (the data is a few thousand posts at most)."""
+    matrix = _feature_matrix([extract_features(text) for text in list(positive_texts) + list(negative_texts)])
+    labels = np.concatenate([np.ones(len(positive_texts)), np.zeros(len(negative_texts))])
+    means = matrix.mean(axis=0)
+    scales = matrix.std(axis=0)
+    scales[scales == 0] = 1.0
+    standardized = (matrix - means) / scales
+    # Class weights, so a DB with far more stored activities than rejected posts still learns the rejections
+    sample_weights = np.where(labels == 1, 0.5 / max(labels.sum(), 1), 0.5 / max((1 - labels).sum(), 1))
+    weights, bias = np.zeros(len(FEATURE_NAMES)), 0.0
+    for _ in range(epochs):
+        error = (1.0 / (1.0 + np.exp(-(standardized @ weights + bias))) - labels) * sample_weights
+        weights -= learning_rate * (standardized.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum()
+    return WorthinessModel(weights, bias, means, scales,
+                           trained_on={"positives": len(positive_texts), "negatives": len(negative_texts),
+                                       "trained_at": time.time()})
+
+
+# --- Scoring ---
+def _heuristic_verdict(text, features):
+    if features["positive_keywords"] >= MIN_POSITIVE_HITS:
+        return True, f"positive hits: {features['positive_keywords']}"
+    structured_lines = len(STRUCTURE_PATTERN.findall(text))
+    if structured_lines >= MIN_STRUCTURED_LINES and features["positive_keywords"] >= 1:
+        return True, f"structure (lines: {structured_lines}, positive: {features['positive_keywords']})"
+    return False, f"positive hits: {features['positive_keywords']}, structured lines: {structured_lines}"
+
+
+def score_many(texts, model=None):
+    """
+    Scores a batch of posts. Returns [(is_worthy, score, reason)] in input order: score is the model's
+    probability, or 1.0/0.0 for the heuristic rules when no model is trained. Posts that are too short
+    or contain a negative keyword are rejected before either. The model scores the whole batch with one
+    matrix product.
+    """
+    model = model or get_model()
+    results, for_model = [], []
+    for i, text in enumerate(texts):
+        text = text or ""
+        features = _keyword_features(text)
+        pre_gate_reason = _pre_gate_reason(features)
+        if pre_gate_reason:
+            results.append((False, 0.0, pre_gate_reason))
+        elif model is not None:
+            results.append(None)
+            for_model.append((i, _add_structure_features(text, features)))
+        else:
+            worthy, reason = _heuristic_verdict(text, features)
+            results.append((worthy, 1.0 if worthy else 0.0, reason))
+    if for_model:
+        probabilities = model.predict_proba(_feature_matrix([features for _, features in for_model]))
+        for (i, _), probability in zip(for_model, probabilities):
+            probability = float(probability)
+            results[i] = (probability >= model.threshold, probability, f"model probability {probability:.2f}")
+    return results
+
+
+def score(text, model=None):
+    return score_many([text], model)[0]
+
+
+# --- Training data ---
+# Posts the filter rejected are kept (text, reason and stage) as the negative examples for training. Only
+# the ones rejected by the scorer are used: the model never sees posts the pre-gates cut.
+
+_ready_dbs = set()  # DBs whose rejected_posts table was already created by this process
+_ready_lock = threading.Lock()
+
+
+def setup_rejected_posts(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rejected_posts (
+            source_url TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            reason TEXT,
+            rejected_at REAL NOT NULL,
+            stage TEXT
+        )
+    ''')
+    cursor.execute("PRAGMA table_info(rejected_posts)")
+    if "stage" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE rejected_posts ADD COLUMN stage TEXT")
+    # Rows recorded before the stage was stored get it from the current pre-gates
+    cursor.execute("SELECT source_url, text FROM rejected_posts WHERE stage IS NULL")
+    cursor.executemany("UPDATE rejected_posts SET stage = ? WHERE source_url = ?",
+                       [(STAGE_SCORER if passes_pre_gates(text) else STAGE_PRE_GATE, source_url)
+                        for source_url, text in cursor.fetchall()])
+
+
+def _connect(db_name):
+    conn = db.get_connection(db_name)
+    if db_name not in _ready_dbs:
+        with _ready_lock:
+            setup_rejected_posts(conn.cursor())
+            conn.commit()
+            _ready_dbs.add(db_name)
+    return conn
+
+
+def record_rejected(source_url, text, reason, db_name=DB_NAME):
+    stage = STAGE_SCORER if passes_pre_gates(text) else STAGE_PRE_GATE
+    try:
+        _connect(db_name)
+        with db.transaction(db_name) as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO rejected_posts (source_url, text, reason, rejected_at, stage)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (source_url, text or "", reason, time.time(), stage))
+    except sqlite3.Error as e:
+        print(f"Worthiness: Could not record rejected post {source_url}: {e}")
+
+
+def train_from_db(db_name=DB_NAME, path=WORTHINESS_MODEL_FILE):
+    """
+    Trains on stored activities (positives) vs posts the scorer rejected (negatives) and saves the model.
+    Both sides are limited to posts that pass the pre-gates, the only ones the model is ever asked about.
+    """
+    cursor = _connect(db_name).cursor()
+    cursor.execute("SELECT games_and_methods FROM scout_activities")
+    positives = [row[0] for row in cursor.fetchall() if passes_pre_gates(row[0])]
+    cursor.execute("SELECT text FROM rejected_posts WHERE stage = ?", (STAGE_SCORER,))
+    negatives = [row[0] for row in cursor.fetchall()]
+    if not positives or not negatives:
+        print(f"Worthiness: Need both stored activities ({len(positives)}) and rejected posts ({len(negatives)}) "
+              f"to train; the heuristic rules stay in use.")
+        return None
+    model = train_model(positives, negatives)
+    model.save(path)
+    predictions = score_many(positives + negatives, model)
+    accuracy = np.mean([worthy == (i < len(positives)) for i, (worthy, _, _) in enumerate(predictions)])
+    print(f"Worthiness: Trained on {len(positives)} activities and {len(negatives)} rejected posts "
+          f"(training accuracy {accuracy:.1%}), saved to {path}.")
+    return model
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["train"]:
+        train_from_db()
+    else:
+        print("Usage: python worthiness.py train")